@@ -0,0 +1,336 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime
+from Colors import Colors
+from ConnectionManager import ConnectionManager
+from FrameDecoder import FrameDecoder
+from OutboundQueue import OutboundQueue, QueueAction
+from ServerManager import ServerManager
+
+class AsyncConnection:
+    """
+    Conexão de um cliente no motor asyncio. Possui uma fila de saída limitada (OutboundQueue) e uma
+    tarefa de escrita própria que agrupa os frames pendentes em uma única escrita, e pode receber
+    mensagens de qualquer thread.
+    """
+    def __init__(self, loop, reader, writer, stats=None, queue_limits=None):
+        self.loop = loop
+        self.stats = stats
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+        self.compressor = None
+        self._decoder = FrameDecoder()
+
+        # O escritor é acordado por um evento do loop sempre que a fila recebe algo
+        self._ready = asyncio.Event()
+        self.queue = OutboundQueue(**(queue_limits or {}))
+        self.queue.on_ready = self._notify
+        if stats is not None:
+            stats.attach_queue(self, self.queue)
+        self._writer_task = loop.create_task(self._write_loop())
+
+    def getpeername(self):
+        return self.writer.get_extra_info("peername")
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _notify(self):
+        if self._in_loop():
+            self._ready.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._ready.set)
+
+    def send(self, message, key=None):
+        """
+        Enfileira uma mensagem para a tarefa de escrita. Pode ser chamada de dentro ou de fora do loop.
+
+        :param message: Mensagem a ser enviada, ou função que a gera no momento do envio.
+        :type message: str | bytes | callable
+        :param key: Chave do monitor, para amostras; None para mensagens de controle.
+        :return: True se a mensagem foi enfileirada, False se foi descartada ou a conexão já foi encerrada.
+        :rtype: bool
+        """
+        if self.closed:
+            return False
+        # Dentro do loop nunca se espera por espaço: isso travaria todas as conexões
+        return self.queue.put(message, key=key, can_block=not self._in_loop())
+
+    def enable_compression(self, announcement, level=6):
+        """
+        Enfileira o anúncio da compressão e ativa a compressão para as mensagens seguintes da fila.
+        """
+        if self.closed:
+            return False
+
+        def install():
+            self.compressor = zlib.compressobj(level)
+
+        # Como em send(): dentro do loop, a política block não pode esperar por espaço
+        can_block = not self._in_loop()
+        self.queue.put(announcement, can_block=can_block)
+        return self.queue.put_action(install, can_block=can_block)
+
+    async def receive(self):
+        """
+        Aguarda o próximo frame completo do cliente.
+
+        :return: Payload do frame ou None se a conexão foi encerrada.
+        """
+        try:
+            while not self._decoder.has_frames():
+                data = await self.reader.read(65536)
+                if not data:
+                    return None
+                self._decoder.feed(data)
+            return self._decoder.next_frame()
+        except ValueError as e:
+            Colors.error(f"Invalid frame received: {e}")
+            return None
+        except (ConnectionError, OSError):
+            return None
+
+    async def _write_loop(self):
+        """
+        Tarefa de escrita: espera por frames e envia todos os que estiverem pendentes de uma vez.
+        """
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                batch = self.queue.pop_batch()
+                if batch is None:
+                    break
+                if not batch:
+                    continue
+
+                frames = []
+                for message in batch:
+                    if isinstance(message, QueueAction):
+                        message.callback()
+                        continue
+                    if callable(message):
+                        try:
+                            message = message()
+                        except Exception as e:
+                            Colors.error(f"Error encoding message: {e}")
+                            continue
+                        if message is None:
+                            continue
+                    if self.compressor is not None:
+                        message = ConnectionManager.compress_payload(self.compressor, message)
+                    frames.append(FrameDecoder.encode(message))
+
+                # Ainda há itens (lote limitado): volta sem esperar por um novo aviso
+                if len(self.queue):
+                    self._ready.set()
+                if not frames:
+                    continue
+
+                # Os frames vão como estão (frames compartilhados sem cópia); o transporte junta o que for preciso
+                started = time.perf_counter()
+                self.writer.writelines(frames)
+                await self.writer.drain()
+                if self.stats is not None:
+                    size = sum(len(frame) for frame in frames)
+                    self.stats.record_send(self, size, len(frames), time.perf_counter() - started)
+        except (ConnectionError, OSError):
+            Colors.error("Error sending message: Connection is closed.")
+            self.queue.discard()
+        finally:
+            self.closed = True
+            self.writer.close()
+
+    def close(self):
+        """
+        Encerra a conexão após enviar os frames que ainda estão na fila.
+        """
+        self.queue.close()
+
+    def abort(self):
+        """
+        Derruba a conexão na hora, sem esperar pela fila de saída. Pode ser chamada de qualquer thread;
+        a leitura pendente recebe EOF e o atendimento do cliente termina.
+        """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.writer.transport.abort)
+
+    async def wait_closed(self):
+        await self._writer_task
+
+
+class AsyncServerManager(ServerManager):
+    """
+    Motor asyncio do servidor. Mantém a mesma API do ServerManager, mas aceita as conexões em um
+    event loop e atende cada cliente com uma coroutine, sem criar uma thread por conexão.
+    A função alvo passada para start deve ser uma coroutine function.
+    """
+    def __init__(self, host='0.0.0.0', port=8000):
+        super().__init__(host=host, port=port)
+        # O loop é criado antes do start para que outros componentes possam agendar tarefas nele
+        self.loop = asyncio.new_event_loop()
+        self._server = None
+        self._active_connections = 0
+        self._loop_thread = None
+        self._ready = threading.Event()
+
+    def start(self, target_function, args=()):
+        """
+        Inicia o event loop em uma thread própria e começa a aceitar conexões de clientes.
+
+        :param target_function: Coroutine function para lidar com conexões de clientes.
+        :param args: Argumentos adicionais para a função alvo.
+        :return: None
+        """
+        if not self.connection_limits:
+            Colors.error("Connection Limits must exists")
+            return
+        if self.connection_semaphore is None:
+            self.connection_semaphore = threading.Semaphore(self.connection_limits)
+
+        # O socket de escuta é o mesmo do motor com threads, repassado para o asyncio
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        host = (self.host, self.port)
+        self.socket.bind(host)
+        self.socket.listen(self.connection_limits)
+        self.socket.setblocking(False)
+
+        self.running = True
+
+        self._loop_thread = threading.Thread(target=self._run_loop, args=(target_function, args), name="AsyncEngine")
+        self._loop_thread.daemon = True
+        self._loop_thread.start()
+        self._ready.wait()
+        self.start_liveness()
+
+        print("Server started (asyncio engine)")
+        print(f"Listening on {host[0]}:{host[1]}...")
+
+    def _run_loop(self, target_function, args):
+        asyncio.set_event_loop(self.loop)
+
+        async def start_server():
+            handler = lambda reader, writer: self._handle_connection(target_function, args, reader, writer)
+            self._server = await asyncio.start_server(handler, sock=self.socket)
+
+        self.loop.run_until_complete(start_server())
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # Cancela as tarefas que ainda estão pendentes (conexões, agendador) antes de fechar o loop
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+
+    async def _handle_connection(self, target_function, args, reader, writer):
+        """
+        Atende uma nova conexão, respeitando o limite de conexões simultâneas.
+        """
+        connection = AsyncConnection(self.loop, reader, writer, self.stats, self.queue_limits)
+        client_address = connection.getpeername()
+
+        if not self.connection_semaphore.acquire(False):
+            self.stats.record_reject()
+            Colors.error(f"Rejected connection from {client_address}: too many connections")
+
+            # Envia mensagem de erro pro client
+            date = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]"
+            message = f"{date} Too many connections, connection closed."
+            connection.send(json.dumps({"status": "error", "message": message}))
+            connection.close()
+            await connection.wait_closed()
+            self.stats.forget_client(connection)
+            return
+
+        self.stats.record_accept()
+        self._active_connections += 1
+        self.track_liveness(connection, writer.get_extra_info("socket"))
+        try:
+            await target_function(connection, client_address, *args)
+        except Exception as e:
+            Colors.error(f"An error occurred on connection address {client_address}: {e}")
+        finally:
+            self._liveness.pop(connection, None)
+            self._active_connections -= 1
+            self.connection_semaphore.release()
+            connection.close()
+            await connection.wait_closed()
+            self.stats.forget_client(connection)
+
+    def send_data(self, message, target_socket=None, key=None):
+        """
+        Envia uma mensagem para uma conexão do motor asyncio.
+
+        :param message: Mensagem a ser enviada, ou função que a gera no momento do envio.
+        :param target_socket: AsyncConnection de destino.
+        :param key: Chave do monitor, para amostras; None para mensagens de controle.
+        :return: True se a mensagem foi enfileirada, False caso contrário.
+        """
+        if target_socket is None:
+            Colors.error("A target connection is required")
+            return False
+        return target_socket.send(message, key)
+
+    def send_batch(self, messages, target_socket=None):
+        if target_socket is None:
+            Colors.error("A target connection is required")
+            return False
+        for message in messages:
+            if not target_socket.send(message):
+                return False
+        return True
+
+    def enable_compression(self, announcement, target_socket=None, level=6):
+        """
+        Ativa a compressão zlib das mensagens enviadas para uma conexão do motor asyncio.
+        """
+        return target_socket.enable_compression(announcement, level)
+
+    async def receive_data(self, target_socket=None):
+        """
+        Recebe o próximo frame de uma conexão do motor asyncio.
+
+        :param target_socket: AsyncConnection de origem.
+        :return: Payload do frame ou None se a conexão foi encerrada.
+        """
+        frame = await target_socket.receive()
+        if frame:
+            self.mark_alive(target_socket)
+        return frame
+
+    def abort_connection(self, connection):
+        """
+        Derruba uma conexão do motor asyncio (chamado pela thread de heartbeats e timeouts).
+        """
+        connection.abort()
+
+    def list_active_threads(self):
+        """
+        Lista as threads ativas e a quantidade de conexões atendidas pelo event loop.
+        """
+        super().list_active_threads()
+        Colors.info(f"Connections on asyncio engine: {self._active_connections}")
+        Colors.info(f"Pending asyncio tasks: {len(asyncio.all_tasks(self.loop))}")
+
+    def shutdown(self):
+        """
+        Para de aceitar conexões e encerra o event loop.
+        """
+        self.running = False
+        if self.loop.is_running():
+            def stop():
+                if self._server:
+                    self._server.close()
+                self.loop.stop()
+            self.loop.call_soon_threadsafe(stop)
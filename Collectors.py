@@ -0,0 +1,478 @@
+import bisect
+import heapq
+import os
+import sys
+import threading
+import time
+from array import array
+import psutil
+from SampleCodec import CoreTimes, DiskRates, Memory, NetRates, ProcessUsage, Swap
+
+class PsutilBackend:
+    """
+    Backend de coleta portátil: cada amostra é lida pelo psutil.
+
+    Disco, rede e processos guardam os contadores da leitura anterior no estado do grupo
+    e publicam taxas por segundo calculadas pela diferença entre as duas leituras.
+    """
+    name = "psutil"
+
+    # Processos cujos tempos de CPU são relidos por disparo do /top; os demais mantêm a taxa da última leitura
+    TOP_BUDGET = 512
+    # Processos publicados em cada amostra do /top
+    TOP_COUNT = 10
+
+    @staticmethod
+    def cpu_busy_percent(previous, current):
+        """
+        Calcula o percentual de uso da CPU entre duas leituras de psutil.cpu_times, sem bloquear.
+        """
+        def total_and_busy(times):
+            total = sum(times)
+            # Tempo de guest já está contabilizado em user/nice no Linux
+            total -= getattr(times, "guest", 0) + getattr(times, "guest_nice", 0)
+            busy = total - times.idle - getattr(times, "iowait", 0)
+            return total, busy
+
+        total_before, busy_before = total_and_busy(previous)
+        total_after, busy_after = total_and_busy(current)
+        return PsutilBackend.busy_percent(total_before, busy_before, total_after, busy_after)
+
+    @staticmethod
+    def busy_percent(total_before, busy_before, total_after, busy_after):
+        if total_after <= total_before:
+            return 0.0
+        percent = (busy_after - busy_before) / (total_after - total_before) * 100
+        return round(min(max(percent, 0.0), 100.0), 1)
+
+    def cpu(self, state):
+        """
+        Coleta as informações de CPU usadas pelos modos básico e avançado.
+        O uso é calculado a partir da leitura anterior guardada em state.
+
+        :param state: Estado da coleta, mantido entre os disparos do grupo.
+        :type state: dict
+        """
+        cpu_times = psutil.cpu_times()
+        previous = state.get("cpu_times")
+        state["cpu_times"] = cpu_times
+
+        return {
+            "cpu_percent": self.cpu_busy_percent(previous, cpu_times) if previous else 0.0,
+            "cpu_times_per_core": psutil.cpu_times(percpu=True),
+            "load_avg": psutil.getloadavg(),
+        }
+
+    def mem(self, state):
+        """
+        Coleta as informações de memória e swap usadas pelos modos básico e avançado.
+
+        :param state: Estado da coleta (não utilizado pela memória).
+        :type state: dict
+        """
+        return {
+            "memory": psutil.virtual_memory(),
+            "swap": psutil.swap_memory(),
+        }
+
+    @staticmethod
+    def counter_rates(previous, current, elapsed, fields):
+        """
+        Taxas por segundo dos contadores entre duas leituras. Um contador que voltou (ex.: dispositivo
+        recriado) conta como zero em vez de gerar uma taxa negativa.
+        """
+        return [max(getattr(current, field) - getattr(previous, field), 0) / elapsed for field in fields]
+
+    def disk(self, state):
+        """
+        Coleta as taxas de leitura e escrita dos discos a partir de psutil.disk_io_counters.
+        Os totais somam só os discos inteiros (as partições já estão contidas neles); o percentual
+        de ocupação é o do disco mais ocupado.
+
+        :param state: Estado da coleta, mantido entre os disparos do grupo.
+        :type state: dict
+        """
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+        now = time.monotonic()
+        previous = state.get("disk")
+        state["disk"] = (now, counters)
+
+        # Discos inteiros com alguma atividade desde o boot, recalculados só quando a lista de dispositivos muda
+        names = state.get("disk_names")
+        if names is None or names[0] != counters.keys():
+            whole = [
+                name for name in sorted(counters)
+                if not any(name != base and name.startswith(base) for base in counters)
+                and counters[name].read_count + counters[name].write_count > 0
+            ]
+            names = state["disk_names"] = (counters.keys(), whole)
+
+        totals = [0.0, 0.0, 0.0, 0.0]
+        busy = 0.0
+        disks = []
+        elapsed = now - previous[0] if previous else 0.0
+        if elapsed > 0:
+            for name in names[1]:
+                before = previous[1].get(name)
+                if before is None:
+                    continue
+                current = counters[name]
+                rates = self.counter_rates(before, current, elapsed, ("read_bytes", "write_bytes", "read_count", "write_count"))
+                # busy_time é o tempo, em ms, em que o disco teve requisições em andamento
+                device_busy = min(max(getattr(current, "busy_time", 0) - getattr(before, "busy_time", 0), 0) / (elapsed * 10), 100.0)
+                for index, rate in enumerate(rates):
+                    totals[index] += rate
+                busy = max(busy, device_busy)
+                disks.append(DiskRates(name, rates[0], rates[1], round(device_busy, 1)))
+
+        return {
+            "read_bytes": totals[0],
+            "write_bytes": totals[1],
+            "read_count": totals[2],
+            "write_count": totals[3],
+            "busy_percent": round(busy, 1),
+            "disks": disks,
+        }
+
+    def net(self, state):
+        """
+        Coleta as taxas de tráfego das interfaces de rede a partir de psutil.net_io_counters.
+        Os totais não incluem a interface de loopback, que aparece só na lista por interface.
+
+        :param state: Estado da coleta, mantido entre os disparos do grupo.
+        :type state: dict
+        """
+        counters = psutil.net_io_counters(pernic=True) or {}
+        now = time.monotonic()
+        previous = state.get("net")
+        state["net"] = (now, counters)
+
+        totals = [0.0] * 6
+        interfaces = []
+        elapsed = now - previous[0] if previous else 0.0
+        if elapsed > 0:
+            for name in sorted(counters):
+                before = previous[1].get(name)
+                current = counters[name]
+                if before is None or current.bytes_sent + current.bytes_recv == 0:
+                    continue
+                rates = self.counter_rates(before, current, elapsed, ("bytes_sent", "bytes_recv", "packets_sent", "packets_recv", "errin", "errout", "dropin", "dropout"))
+                interfaces.append(NetRates(name, rates[0], rates[1]))
+                if name == "lo":
+                    continue
+                for index, rate in enumerate(rates[:4]):
+                    totals[index] += rate
+                totals[4] += rates[4] + rates[5]
+                totals[5] += rates[6] + rates[7]
+
+        return {
+            "bytes_sent": totals[0],
+            "bytes_recv": totals[1],
+            "packets_sent": totals[2],
+            "packets_recv": totals[3],
+            "errors": totals[4],
+            "drops": totals[5],
+            "interfaces": interfaces,
+        }
+
+    def top(self, state):
+        """
+        Coleta os processos que mais usam CPU, com custo limitado por disparo.
+
+        O estado guarda, por PID, o psutil.Process e os tempos de CPU da última leitura. A cada disparo
+        só os TOP_BUDGET processos seguintes do rodízio (em ordem de PID) e os líderes do disparo anterior
+        têm os tempos relidos; os outros mantêm a taxa calculada na última leitura. Os TOP_COUNT maiores
+        são escolhidos com heapq.nlargest, sem ordenar todos, e só eles têm nome e memória lidos.
+        O percentual é relativo a um núcleo (um processo com duas threads ocupadas chega a 200%).
+
+        :param state: Estado da coleta, mantido entre os disparos do grupo.
+        :type state: dict
+        """
+        # PID -> [psutil.Process ou None até a primeira leitura, tempo de CPU, instante da leitura, % de CPU, nome]
+        processes = state.setdefault("processes", {})
+        pids = psutil.pids()
+        alive = set(pids)
+        for pid in [pid for pid in processes if pid not in alive]:
+            del processes[pid]
+        for pid in pids:
+            if pid not in processes:
+                processes[pid] = [None, None, 0.0, 0.0, None]
+
+        # Rodízio: continua a partir do último PID lido, voltando ao início da lista
+        start = bisect.bisect_right(pids, state.get("cursor", -1))
+        batch = pids[start:start + self.TOP_BUDGET]
+        if len(batch) < self.TOP_BUDGET:
+            batch += pids[:min(start, self.TOP_BUDGET - len(batch))]
+        if batch:
+            state["cursor"] = batch[-1]
+
+        for pid in set(batch).union(state.get("leaders", ())):
+            entry = processes.get(pid)
+            if entry is not None:
+                self._refresh_process(processes, pid, entry)
+
+        # Só entram os processos já lidos ao menos uma vez
+        candidates = (item for item in processes.items() if item[1][0] is not None)
+        leaders = heapq.nlargest(self.TOP_COUNT, candidates, key=lambda item: item[1][3])
+        state["leaders"] = [pid for pid, _ in leaders]
+
+        top = []
+        for pid, entry in leaders:
+            try:
+                if entry[4] is None:
+                    entry[4] = entry[0].name()
+                top.append(ProcessUsage(pid, entry[4], round(entry[3], 1), entry[0].memory_info().rss))
+            except psutil.NoSuchProcess:
+                processes.pop(pid, None)
+            except psutil.Error:
+                top.append(ProcessUsage(pid, "?", round(entry[3], 1), 0))
+
+        return {"processes": top, "total": len(processes)}
+
+    @staticmethod
+    def _refresh_process(processes, pid, entry):
+        """
+        Relê os tempos de CPU de um processo do /top e atualiza a sua taxa de uso.
+        """
+        try:
+            if entry[0] is None:
+                entry[0] = psutil.Process(pid)
+            times = entry[0].cpu_times()
+        except psutil.NoSuchProcess:
+            del processes[pid]
+            return
+        except psutil.Error:
+            # Sem permissão: o processo continua na lista, sem uso de CPU
+            return
+
+        total = times.user + times.system
+        now = time.monotonic()
+        if entry[1] is not None and now > entry[2]:
+            if total >= entry[1]:
+                entry[3] = (total - entry[1]) / (now - entry[2]) * 100
+            else:
+                # Tempo menor que o anterior: o PID foi reaproveitado por outro processo
+                entry[3] = 0.0
+                entry[4] = None
+        entry[1] = total
+        entry[2] = now
+
+    def close(self):
+        pass
+
+
+class CoreTimesView:
+    """
+    Tempos por núcleo (user, system, idle) guardados em um único array de doubles. Os CoreTimes só
+    são criados quando alguém lê os núcleos (modo avançado); no modo básico só o tamanho é usado.
+    """
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values) // 3
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("core index out of range")
+        return CoreTimes(*self.values[3 * index:3 * index + 3])
+
+    def __iter__(self):
+        values = self.values
+        for offset in range(0, len(values), 3):
+            yield CoreTimes(values[offset], values[offset + 1], values[offset + 2])
+
+    def __reduce__(self):
+        return CoreTimesView, (self.values,)
+
+
+class ProcBackend(PsutilBackend):
+    """
+    Backend de coleta do Linux que lê CPU e memória do /proc diretamente, sem o psutil.
+
+    Os arquivos /proc/stat, /proc/meminfo e /proc/loadavg ficam abertos; cada coleta faz um pread
+    no início do arquivo para um buffer reutilizado e interpreta só os campos usados pelas amostras.
+    Os tempos por núcleo vão para um array de doubles pré-alocado, copiado uma vez por amostra.
+    Os valores seguem as mesmas regras do psutil (ex.: used = total - available).
+    Disco, rede e processos são herdados do PsutilBackend.
+    """
+    name = "proc"
+
+    MEMINFO_KEYS = (b"MemTotal:", b"MemFree:", b"MemAvailable:", b"Buffers:", b"Cached:", b"SReclaimable:", b"Shmem:", b"SwapTotal:", b"SwapFree:")
+
+    def __init__(self, procfs="/proc"):
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.cores = os.cpu_count() or 1
+
+        # nome -> [descritor, buffer]
+        self._files = {}
+        try:
+            for name, size in (("stat", 128 * (self.cores + 2)), ("meminfo", 4096), ("loadavg", 128)):
+                self._files[name] = [os.open(f"{procfs}/{name}", os.O_RDONLY), bytearray(size)]
+        except OSError:
+            self.close()
+            raise
+
+        # Tempos por núcleo (user, system, idle), em segundos
+        self._core_times = array("d", bytes(8 * 3 * self.cores))
+        # Chave do meminfo -> índice da linha, descoberto na primeira leitura
+        self._meminfo_lines = None
+        # Os buffers são compartilhados: o sampler também coleta ao inscrever um grupo novo, fora da thread do agendador
+        self._lock = threading.Lock()
+
+    def _pread(self, name, complete=True):
+        """
+        Lê o início do arquivo para o buffer reutilizado. Se o conteúdo não couber, o buffer cresce
+        e a leitura é repetida, a não ser que só o começo do arquivo interesse (complete=False).
+
+        :return: (bytes lidos, True se o arquivo inteiro coube no buffer).
+        :rtype: tuple
+        """
+        entry = self._files[name]
+        while True:
+            size = os.preadv(entry[0], [entry[1]], 0)
+            if size < len(entry[1]) or not complete:
+                return entry[1][:size], size < len(entry[1])
+            entry[1] = bytearray(len(entry[1]) * 2)
+
+    def cpu(self, state):
+        """
+        Coleta a CPU a partir das linhas 'cpu' e 'cpuN' do /proc/stat e do /proc/loadavg.
+
+        :param state: Estado da coleta, mantido entre os disparos do grupo.
+        :type state: dict
+        """
+        with self._lock:
+            return self._read_cpu(state)
+
+    def _read_cpu(self, state):
+        # Só as linhas de CPU, no começo do /proc/stat, são lidas; o buffer cresce se elas não couberem
+        while True:
+            data, whole = self._pread("stat", complete=False)
+            lines = data.split(b"\n")
+            cpu_lines = 0
+            while cpu_lines < len(lines) and lines[cpu_lines].startswith(b"cpu"):
+                cpu_lines += 1
+            # A linha seguinte às de CPU precisa ter chegado, ao menos em parte, para saber que elas acabaram
+            if whole or (cpu_lines < len(lines) - 1) or (cpu_lines == len(lines) - 1 and len(lines[-1]) >= 3):
+                break
+            self._files["stat"][1] = bytearray(len(self._files["stat"][1]) * 2)
+        lines = lines[:cpu_lines]
+
+        fields = lines[0].split()
+        # user, nice, system, idle, iowait, irq, softirq, steal (guest já está em user/nice)
+        ticks = [int(value) for value in fields[1:9]]
+        total = sum(ticks)
+        busy = total - ticks[3] - ticks[4]
+        previous = state.get("cpu_ticks")
+        state["cpu_ticks"] = (total, busy)
+
+        core_times = self._core_times
+        scale = 1 / self.clock_ticks
+        cores = 0
+        for line in lines[1:]:
+            fields = line.split(None, 5)
+            if cores == len(core_times) // 3:
+                # Um núcleo a mais que o esperado (CPU colocada online)
+                core_times.extend((0.0, 0.0, 0.0))
+            offset = 3 * cores
+            core_times[offset] = int(fields[1]) * scale
+            core_times[offset + 1] = int(fields[3]) * scale
+            core_times[offset + 2] = int(fields[4]) * scale
+            cores += 1
+
+        load = self._pread("loadavg")[0].split(b" ", 3)
+        return {
+            "cpu_percent": PsutilBackend.busy_percent(previous[0], previous[1], total, busy) if previous else 0.0,
+            "cpu_times_per_core": CoreTimesView(core_times[:3 * cores]),
+            "load_avg": (float(load[0]), float(load[1]), float(load[2])),
+        }
+
+    def _meminfo(self):
+        """
+        Valores do /proc/meminfo usados pela memória e pelo swap, em bytes, na ordem de MEMINFO_KEYS.
+        As chaves ficam sempre nas mesmas linhas, então só essas linhas são convertidas.
+        """
+        data = self._pread("meminfo")[0]
+        if self._meminfo_lines is not None:
+            lines = data.split(b"\n", self._meminfo_lines[1] + 1)
+            values = []
+            for key, index in zip(self.MEMINFO_KEYS, self._meminfo_lines[0]):
+                if index is None:
+                    values.append(None)
+                    continue
+                line = lines[index]
+                if not line.startswith(key):
+                    break
+                # 'MemTotal:        8045128 kB'
+                values.append(int(line[len(key):-2]) * 1024)
+            else:
+                return values
+
+        # Primeira leitura (ou o layout mudou): localiza as linhas de cada chave
+        positions = {}
+        lines = data.split(b"\n")
+        for index, line in enumerate(lines):
+            key = line.split(b" ", 1)[0]
+            if key in self.MEMINFO_KEYS:
+                positions[bytes(key)] = index
+        indexes = [positions.get(key) for key in self.MEMINFO_KEYS]
+        self._meminfo_lines = (indexes, max(index for index in indexes if index is not None))
+        return [int(lines[index][len(key):-2]) * 1024 if index is not None else None for key, index in zip(self.MEMINFO_KEYS, indexes)]
+
+    def mem(self, state):
+        """
+        Coleta a memória e o swap a partir do /proc/meminfo.
+
+        :param state: Estado da coleta (não utilizado pela memória).
+        :type state: dict
+        """
+        with self._lock:
+            values = self._meminfo()
+        total, free, available, buffers, cached, reclaimable, shared, swap_total, swap_free = (value or 0 for value in values)
+        cached += reclaimable
+        if not available:
+            # Kernels sem MemAvailable
+            available = free + buffers + cached
+        available = min(available, total)
+        swap_used = swap_total - swap_free
+
+        return {
+            "memory": Memory(round((total - available) / total * 100, 1) if total else 0.0, available, total - available, free, buffers, cached, shared),
+            "swap": Swap(round(swap_used / swap_total * 100, 1) if swap_total else 0.0, swap_total, swap_used, swap_free),
+        }
+
+    def close(self):
+        for entry in self._files.values():
+            os.close(entry[0])
+        self._files.clear()
+
+
+BACKENDS = ("auto", "proc", "psutil")
+
+
+def create_backend(name="auto"):
+    """
+    Cria o backend de coleta: 'proc' (Linux), 'psutil' ou 'auto' (proc quando disponível).
+
+    :rtype: ProcBackend | PsutilBackend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Collector backend must be in {list(BACKENDS)}")
+    if name == "psutil":
+        return PsutilBackend()
+
+    available = sys.platform.startswith("linux") and hasattr(os, "preadv")
+    if name == "proc" and not available:
+        raise ValueError("The proc collector backend needs Linux")
+    if available:
+        try:
+            return ProcBackend()
+        except OSError:
+            if name == "proc":
+                raise
+    return PsutilBackend()
@@ -0,0 +1,101 @@
+import re
+
+class Command:
+    """
+    Comando do cliente já interpretado: nome, argumentos posicionais e opções.
+
+    Exemplo: '#7 /cpu -t=100ms -m=advanced -on-change' vira
+    name='/cpu', request_id='7', options={'t': '100ms', 'm': 'advanced', 'on-change': True}.
+    """
+    __slots__ = ("request_id", "name", "arguments", "options", "tokens", "text", "error")
+
+    def __init__(self, request_id=None, name="", arguments=(), options=None, tokens=(), text="", error=None):
+        """
+        :param request_id: ID escolhido pelo cliente, devolvido nas respostas (None se o comando não tem ID).
+        :param name: Nome do comando em minúsculas (ex.: '/cpu').
+        :param arguments: Argumentos posicionais, na ordem.
+        :param options: Opções por nome: o valor depois de '=' (ou do operador, ex.: '>90'), ou True para opções sem valor.
+        :param tokens: Opções como foram escritas, na ordem (opções repetidas, como -alert, aparecem todas).
+        :param text: Linha do comando sem o ID.
+        :param error: Mensagem de erro, se a linha não pôde ser interpretada.
+        """
+        self.request_id = request_id
+        self.name = name
+        self.arguments = list(arguments)
+        self.options = options or {}
+        self.tokens = list(tokens)
+        self.text = text
+        self.error = error
+
+    def option(self, name, default=None):
+        """
+        Valor de uma opção que exige valor (ex.: -t=2).
+
+        :raises ValueError: Se a opção foi usada sem valor (ex.: -t).
+        """
+        value = self.options.get(name, default)
+        if value is True:
+            raise ValueError(f"Option -{name} needs a value (e.g. -{name}=<value>).")
+        return value
+
+
+class CommandParser:
+    """
+    Interpretação dos frames de comando do cliente.
+
+    Um frame pode trazer vários comandos, um por linha (pipelining). Cada linha pode começar com
+    '#<id>': o ID é devolvido no campo 'request_id' de todas as respostas daquele comando, para que
+    o cliente relacione as respostas aos pedidos sem esperar cada uma.
+
+        #1 /cpu -t=1
+        #2 /mem -t=500ms -m=advanced
+        #3 /monitors
+    """
+    REQUEST_ID = re.compile(r"^#([A-Za-z0-9_.:-]{1,64})$")
+    OPTION = re.compile(r"^-([a-zA-Z][a-zA-Z-]*)(.*)$")
+
+    @staticmethod
+    def parse_frame(payload):
+        """
+        Separa e interpreta os comandos de um frame. Linhas vazias são ignoradas.
+
+        :param payload: Conteúdo do frame, já decodificado.
+        :type payload: str
+        :rtype: list[Command]
+        """
+        return [CommandParser.parse(line) for line in payload.splitlines() if line.strip()]
+
+    @staticmethod
+    def parse(line):
+        """
+        Interpreta uma linha de comando.
+
+        :rtype: Command
+        """
+        parts = line.split()
+        request_id = None
+        if parts and parts[0].startswith("#"):
+            match = CommandParser.REQUEST_ID.match(parts[0])
+            if match is None:
+                return Command(text=line.strip(), error="Request IDs must be 1-64 letters, digits or '_.:-' (e.g. #42).")
+            request_id = match.group(1)
+            parts = parts[1:]
+
+        text = " ".join(parts)
+        if not parts or not parts[0].startswith("/"):
+            return Command(request_id, text=text, error="Unknown command. Use /help to see available commands.")
+
+        arguments = []
+        options = {}
+        tokens = []
+        for part in parts[1:]:
+            match = CommandParser.OPTION.match(part)
+            if match is None:
+                arguments.append(part)
+                continue
+            name, rest = match.groups()
+            # '-t=2' -> '2'; '-alert>90' -> '>90'; '-on-change' -> True
+            options[name.lower()] = rest[1:] if rest.startswith("=") else (rest or True)
+            tokens.append(part)
+
+        return Command(request_id, parts[0].lower(), arguments, options, tokens, text)
@@ -1,14 +1,127 @@
 import socket
+import threading
+import time
+import zlib
 from abc import ABC, abstractmethod
 from Colors import Colors
+from FrameDecoder import EncodedFrame, FrameDecoder
 
 class ConnectionManager(ABC):
+    # Máximo de buffers por chamada de sendmsg (o IOV_MAX do Linux é 1024)
+    MAX_BUFFERS = 1024
+
     def __init__(self, host='127.0.0.1', port=8000):
         self.host = host
         self.port = port
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.running = False
 
+        # Estado de framing por socket: decodificador de leitura e lock de escrita
+        self._decoders = {}
+        self._send_locks = {}
+        self._state_lock = threading.Lock()
+
+        # Compressão zlib por conexão, com contexto persistente entre as mensagens
+        self._compressors = {}
+        self._decompressors = {}
+
+        # Instrumentação opcional (ServerStats), usada pelo servidor
+        self.stats = None
+
+    def _get_decoder(self, sock):
+        decoder = self._decoders.get(sock)
+        if decoder is None:
+            with self._state_lock:
+                decoder = self._decoders.setdefault(sock, FrameDecoder())
+        return decoder
+
+    def _get_send_lock(self, sock):
+        lock = self._send_locks.get(sock)
+        if lock is None:
+            with self._state_lock:
+                lock = self._send_locks.setdefault(sock, threading.Lock())
+        return lock
+
+    def forget_socket(self, sock):
+        """
+        Descarta o estado de framing associado a um socket que foi encerrado.
+
+        :param sock: Socket encerrado.
+        """
+        with self._state_lock:
+            self._decoders.pop(sock, None)
+            self._send_locks.pop(sock, None)
+            self._compressors.pop(sock, None)
+            self._decompressors.pop(sock, None)
+        if self.stats is not None:
+            self.stats.forget_client(sock)
+
+    @staticmethod
+    def send_buffers(sock, buffers):
+        """
+        Envia vários buffers em ordem com scatter/gather (sendmsg), sem concatená-los antes.
+        Envios parciais continuam do ponto em que pararam.
+
+        :param buffers: Frames já montados.
+        :type buffers: list[bytes]
+        """
+        if not hasattr(sock, "sendmsg"):
+            sock.sendall(b"".join(buffers))
+            return
+
+        views = [memoryview(buffer) for buffer in buffers]
+        start = 0
+        while start < len(views):
+            sent = sock.sendmsg(views[start:start + ConnectionManager.MAX_BUFFERS])
+            # Pula os buffers enviados por inteiro e corta o que sobrou do último
+            while sent and sent >= len(views[start]):
+                sent -= len(views[start])
+                start += 1
+            if sent:
+                views[start] = views[start][sent:]
+
+    @staticmethod
+    def compress_payload(compressor, message):
+        """
+        Comprime uma mensagem com o contexto da conexão. O flush síncrono permite que cada frame
+        seja descomprimido assim que chega, mantendo o dicionário entre as mensagens.
+        """
+        if isinstance(message, EncodedFrame):
+            # Frame compartilhado: comprime o payload, que é uma visão do buffer, sem copiá-lo
+            message = message.payload
+        elif isinstance(message, str):
+            message = message.encode("utf-8")
+        return compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def enable_compression(self, announcement, target_socket=None, level=6):
+        """
+        Envia o anúncio da compressão sem comprimir e, a partir dele, comprime todas as mensagens
+        enviadas para o socket. As duas coisas acontecem sob o lock de escrita, para que nenhuma
+        outra thread envie algo entre o anúncio e a ativação.
+
+        :param announcement: Mensagem que avisa o outro lado que a compressão foi ativada.
+        :param target_socket: Socket específico. Se None, usa o socket padrão.
+        :param level: Nível de compressão do zlib.
+        :return: True se o anúncio foi enviado, False caso contrário.
+        """
+        socket_to_use = target_socket or self.socket
+        try:
+            with self._get_send_lock(socket_to_use):
+                socket_to_use.sendall(FrameDecoder.encode(announcement))
+                self._compressors[socket_to_use] = zlib.compressobj(level)
+            return True
+        except OSError:
+            Colors.error(f"Error sending message: Connection is closed.")
+            return False
+
+    def enable_decompression(self, target_socket=None):
+        """
+        Passa a descomprimir todos os frames recebidos a partir do próximo.
+
+        :param target_socket: Socket específico. Se None, usa o socket padrão.
+        """
+        self._decompressors[target_socket or self.socket] = zlib.decompressobj()
+
     def send_data(self, message, target_socket=None):
         """
         Envia dados através do socket especificado ou do socket padrão.
@@ -17,6 +130,16 @@ class ConnectionManager(ABC):
         :param target_socket: Socket específico para enviar a mensagem. Se None, usa o socket padrão.
         :return: True se a mensagem foi enviada com sucesso, False caso contrário.
         """
+        return self.send_batch([message], target_socket)
+
+    def send_batch(self, messages, target_socket=None):
+        """
+        Envia várias mensagens, cada uma em seu próprio frame, com uma única chamada de sistema.
+
+        :param messages: Lista de mensagens (str ou bytes) a serem enviadas.
+        :param target_socket: Socket específico para enviar as mensagens. Se None, usa o socket padrão.
+        :return: True se as mensagens foram enviadas com sucesso, False caso contrário.
+        """
         socket_to_use = target_socket or self.socket
         # Pra definir se vai ser como um socket do servidor ou passado como parametro
         
@@ -25,10 +148,27 @@ class ConnectionManager(ABC):
             return False
         
         try:
-            socket_to_use.send(message.encode("utf-8"))
+            # Várias threads podem escrever no mesmo socket, então o frame inteiro é enviado sob o lock
+            with self._get_send_lock(socket_to_use):
+                compressor = self._compressors.get(socket_to_use)
+                if compressor is not None:
+                    # A compressão acontece sob o lock para que a ordem no contexto seja a mesma do envio
+                    messages = [self.compress_payload(compressor, message) for message in messages]
+                # Cada frame vira um buffer próprio: frames compartilhados (EncodedFrame) vão como estão, sem cópia
+                buffers = [FrameDecoder.encode(message) for message in messages]
+                started = time.perf_counter()
+                self.send_buffers(socket_to_use, buffers)
+            if self.stats is not None:
+                size = sum(len(buffer) for buffer in buffers)
+                self.stats.record_send(socket_to_use, size, len(messages), time.perf_counter() - started)
             return True
         except (BrokenPipeError, ConnectionResetError, OSError) as e:
             Colors.error(f"Error sending message: Connection is closed.")
+            try:
+                # O shutdown acorda a thread bloqueada no recv do mesmo socket, o que o close sozinho não faz
+                socket_to_use.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             try:
                 socket_to_use.close()
                 print("close")
@@ -41,17 +181,35 @@ class ConnectionManager(ABC):
     
     def receive_data(self, target_socket=None):
         """
-        Recebe dados através do socket especificado ou do socket padrão.
+        Recebe o próximo frame completo através do socket especificado ou do socket padrão.
+        Lê do socket quantas vezes forem necessárias até completar um frame; frames extras
+        recebidos na mesma leitura ficam guardados para as próximas chamadas.
         
         :param target_socket: Socket específico para receber a mensagem. Se None, usa o socket padrão.
-        :return: Dados recebidos ou None em caso de erro.
+        :return: Payload do frame recebido ou None em caso de erro.
         """
         socket_to_use = target_socket or self.socket
         if not self.running and not target_socket:
             Colors.error("Not connected to server")
             return False
+        decoder = self._get_decoder(socket_to_use)
         try:
-            return socket_to_use.recv(4096)
+            while not decoder.has_frames():
+                data = socket_to_use.recv(65536)
+                if not data:
+                    return None
+                decoder.feed(data)
+            frame = decoder.next_frame()
+            decompressor = self._decompressors.get(socket_to_use)
+            if decompressor is not None:
+                frame = decompressor.decompress(frame)
+            return frame
+        except ValueError as e:
+            Colors.error(f"Invalid frame received: {e}")
+            return None
+        except zlib.error as e:
+            Colors.error(f"Invalid compressed frame received: {e}")
+            return None
         except ConnectionResetError:
             Colors.error("Connection ended by remote host.")
             return None
@@ -69,6 +227,7 @@ class ConnectionManager(ABC):
         Fecha a conexão do socket.
         """
         self.running = False
+        self.forget_socket(self.socket)
         try:
             self.socket.close()
         except:
@@ -0,0 +1,105 @@
+import struct
+from collections import deque
+
+class EncodedFrame:
+    """
+    Frame montado uma única vez e compartilhado, sem cópias, por todas as conexões que enviam a mesma
+    mensagem (ex.: a amostra de um disparo para todos os inscritos). O frame completo (cabeçalho + payload)
+    é enviado como está; o payload, uma visão do mesmo buffer, é usado pelas conexões com compressão.
+    """
+    __slots__ = ("frame", "payload")
+
+    def __init__(self, payload):
+        """
+        :param payload: Conteúdo do frame. Strings são codificadas em UTF-8.
+        :type payload: str | bytes
+        """
+        self.frame = FrameDecoder.encode(payload)
+        self.payload = memoryview(self.frame)[FrameDecoder.HEADER.size:]
+
+    def __len__(self):
+        return len(self.frame)
+
+
+class FrameDecoder:
+    """
+    Decodificador incremental de frames com prefixo de tamanho.
+
+    Cada frame é formado por um cabeçalho de 4 bytes (unsigned int big-endian) com o tamanho
+    do payload, seguido do payload. Os bytes recebidos do socket são acumulados em um buffer
+    e os frames completos ficam disponíveis em ordem de chegada.
+    """
+    HEADER = struct.Struct("!I")
+    MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._frames = deque()
+
+    @staticmethod
+    def encode(payload):
+        """
+        Monta um frame a partir de um payload.
+
+        :param payload: Conteúdo do frame. Strings são codificadas em UTF-8; frames já montados são usados como estão.
+        :type payload: str | bytes | EncodedFrame
+        :return: Frame pronto para ser enviado.
+        :rtype: bytes
+        """
+        if isinstance(payload, EncodedFrame):
+            return payload.frame
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if len(payload) > FrameDecoder.MAX_FRAME_SIZE:
+            raise ValueError(f"Frame too large: {len(payload)} bytes")
+        return FrameDecoder.HEADER.pack(len(payload)) + payload
+
+    @staticmethod
+    def encode_many(payloads):
+        """
+        Monta vários frames em um único buffer, para serem enviados com uma só chamada de sistema.
+
+        :param payloads: Lista de payloads.
+        :type payloads: list[str | bytes | EncodedFrame]
+        :return: Buffer com todos os frames concatenados.
+        :rtype: bytes
+        """
+        return b"".join(FrameDecoder.encode(payload) for payload in payloads)
+
+    def feed(self, data):
+        """
+        Adiciona bytes recebidos ao buffer e extrai todos os frames completos.
+
+        :param data: Bytes lidos do socket.
+        :type data: bytes
+        :return: Quantidade de frames completos disponíveis.
+        :rtype: int
+        """
+        self._buffer.extend(data)
+        header_size = self.HEADER.size
+        offset = 0
+        while len(self._buffer) - offset >= header_size:
+            (size,) = self.HEADER.unpack_from(self._buffer, offset)
+            if size > self.MAX_FRAME_SIZE:
+                raise ValueError(f"Frame too large: {size} bytes")
+            end = offset + header_size + size
+            if len(self._buffer) < end:
+                break
+            self._frames.append(bytes(self._buffer[offset + header_size:end]))
+            offset = end
+
+        # Remove do buffer apenas os bytes já consumidos, de uma só vez
+        if offset:
+            del self._buffer[:offset]
+        return len(self._frames)
+
+    def next_frame(self):
+        """
+        Retorna o próximo frame completo, ou None se não houver nenhum.
+        """
+        if self._frames:
+            return self._frames.popleft()
+        return None
+
+    def has_frames(self):
+        return bool(self._frames)
@@ -0,0 +1,151 @@
+import threading
+from array import array
+
+class RingBuffer:
+    """
+    Buffer circular de tamanho fixo para uma métrica. Os valores ficam em arrays de doubles
+    pré-alocados (um para os timestamps e um por campo), então gravar uma amostra não aloca objetos.
+    """
+    __slots__ = ("fields", "capacity", "timestamps", "values", "index", "count", "lock")
+
+    def __init__(self, fields, capacity):
+        self.fields = fields
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.values = [array("d", bytes(8 * capacity)) for _ in fields]
+        self.index = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, values):
+        with self.lock:
+            position = self.index
+            self.timestamps[position] = timestamp
+            for column, value in zip(self.values, values):
+                column[position] = value
+            self.index = (position + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+
+    def downsample(self, since, resolution):
+        """
+        Agrupa as amostras a partir de 'since' em buckets de 'resolution' segundos.
+
+        :return: Lista de buckets (início, quantidade, [(min, max, avg) por campo]), em ordem de tempo.
+        :rtype: list
+        """
+        buckets = {}
+        field_count = len(self.fields)
+        with self.lock:
+            start = (self.index - self.count) % self.capacity
+            for offset in range(self.count):
+                position = (start + offset) % self.capacity
+                timestamp = self.timestamps[position]
+                if timestamp < since:
+                    continue
+
+                # Buckets alinhados a múltiplos da resolução, para que consultas seguidas coincidam
+                bucket_start = (timestamp // resolution) * resolution
+                bucket = buckets.get(bucket_start)
+                if bucket is None:
+                    # [quantidade, min..., max..., soma...]
+                    bucket = buckets[bucket_start] = [0] + [float("inf")] * field_count + [float("-inf")] * field_count + [0.0] * field_count
+
+                bucket[0] += 1
+                for field in range(field_count):
+                    value = self.values[field][position]
+                    if value < bucket[1 + field]:
+                        bucket[1 + field] = value
+                    if value > bucket[1 + field_count + field]:
+                        bucket[1 + field_count + field] = value
+                    bucket[1 + 2 * field_count + field] += value
+
+        result = []
+        for bucket_start in sorted(buckets):
+            bucket = buckets[bucket_start]
+            count = bucket[0]
+            stats = [
+                (bucket[1 + field], bucket[1 + field_count + field], bucket[1 + 2 * field_count + field] / count)
+                for field in range(field_count)
+            ]
+            result.append((bucket_start, count, stats))
+        return result
+
+
+class MetricHistory:
+    """
+    Histórico recente das métricas no servidor, com orçamento de memória fixo:
+    um RingBuffer por métrica, alimentado pelo sampler compartilhado.
+    """
+    FIELDS = {
+        "cpu": ("cpu_percent", "load_1m"),
+        "mem": ("percent", "used", "available"),
+    }
+
+    def __init__(self, interval=1, capacity=3600):
+        """
+        :param interval: Intervalo de coleta do histórico, em segundos.
+        :type interval: int
+        :param capacity: Quantidade de amostras guardadas por métrica.
+        :type capacity: int
+        """
+        self.interval = interval
+        self.capacity = capacity
+        self.buffers = {metric: RingBuffer(fields, capacity) for metric, fields in self.FIELDS.items()}
+
+    def memory_budget(self):
+        """
+        Memória ocupada pelos buffers, em bytes.
+        """
+        return sum((len(buffer.fields) + 1) * buffer.capacity * 8 for buffer in self.buffers.values())
+
+    def retention(self):
+        """
+        Janela de tempo coberta pelo histórico, em segundos.
+        """
+        return self.interval * self.capacity
+
+    def record(self, metric, sample):
+        """
+        Grava uma amostra do sampler no buffer da métrica.
+
+        :param metric: Nome da métrica ('cpu' ou 'mem').
+        :type metric: str
+        :param sample: Amostra coletada pelo sampler.
+        :type sample: dict
+        """
+        self.buffers[metric].append(sample["timestamp"], self.values(metric, sample))
+
+    @staticmethod
+    def values(metric, sample):
+        """
+        Extrai de uma amostra os valores dos campos em FIELDS, na mesma ordem.
+
+        :rtype: tuple
+        """
+        if metric == "cpu":
+            return (sample["cpu_percent"], sample["load_avg"][0])
+        memory = sample["memory"]
+        return (memory.percent, memory.used, memory.available)
+
+    def query(self, metric, since, resolution):
+        """
+        Consulta o histórico de uma métrica agrupado em buckets com mínimo, máximo e média.
+
+        :param metric: Nome da métrica ('cpu' ou 'mem').
+        :param since: Timestamp (epoch) do início da janela.
+        :param resolution: Largura de cada bucket, em segundos.
+        :return: Dicionário com os campos e os buckets.
+        :rtype: dict
+        """
+        buffer = self.buffers[metric]
+        buckets = buffer.downsample(since, resolution)
+        return {
+            "metric": metric,
+            "fields": list(buffer.fields),
+            "resolution": resolution,
+            "buckets": [
+                {"start": start, "count": count, "min": [stat[0] for stat in stats], "max": [stat[1] for stat in stats], "avg": [stat[2] for stat in stats]}
+                for start, count, stats in buckets
+            ],
+        }
@@ -0,0 +1,338 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import partial
+from Colors import Colors
+from MetricHistory import MetricHistory
+
+class MetricLogWriter:
+    """
+    Log persistente das métricas: arquivos de segmento append-only com registros de tamanho fixo,
+    um por métrica e por janela de tempo, com um índice esparso por segmento.
+
+    - Segmento '<métrica>-<início em ms>.seg': cabeçalho (magic, versão, quantidade de campos, início)
+      seguido dos registros (timestamp, valores dos campos de MetricHistory.FIELDS).
+    - Índice '<métrica>-<início em ms>.idx': (timestamp, número do registro) a cada 'index_every' registros.
+
+    O callback do sampler só enfileira a amostra; uma thread escritora grava o que acumulou a cada
+    'flush_interval' com um único write por segmento, então o disco nunca atrasa o envio ao vivo.
+    Um segmento novo é aberto a cada 'segment_seconds' e os segmentos mais antigos que 'retention'
+    segundos são apagados.
+    """
+    MAGIC = b"SMLG"
+    VERSION = 1
+    HEADER = struct.Struct("<4sIId12x")
+    INDEX = struct.Struct("<dQ")
+
+    def __init__(self, directory, segment_seconds=3600, retention=7 * 86400, flush_interval=1.0, index_every=64, fields=MetricHistory.FIELDS):
+        """
+        :param directory: Diretório dos segmentos (criado se não existir).
+        :param segment_seconds: Janela de tempo coberta por cada segmento.
+        :param retention: Idade máxima dos dados mantidos, em segundos.
+        :param flush_interval: Intervalo entre as gravações em lote, em segundos.
+        :param index_every: Registros entre duas entradas do índice esparso.
+        """
+        if segment_seconds <= 0 or retention <= 0 or flush_interval <= 0 or index_every <= 0:
+            raise ValueError("Log options must be greater than 0")
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self.index_every = index_every
+        self.fields = fields
+        self.records = {metric: self.record_struct(len(names)) for metric, names in fields.items()}
+        os.makedirs(directory, exist_ok=True)
+
+        # métrica -> {"start", "data", "index", "count"} do segmento aberto
+        self._segments = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.running = False
+        self.written = 0
+        self._thread = None
+
+    @staticmethod
+    def record_struct(field_count):
+        return struct.Struct(f"<d{field_count}d")
+
+    @staticmethod
+    def segment_name(metric, start):
+        return f"{metric}-{int(start * 1000)}"
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="MetricLog-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def subscribe(self, sampler, interval):
+        """
+        Inscreve o log no sampler para todas as métricas.
+        """
+        for metric in self.fields:
+            sampler.subscribe(metric, interval, ("log", metric), partial(self.record, metric))
+
+    def record(self, metric, sample):
+        """
+        Callback do sampler: só guarda a amostra para a próxima gravação em lote.
+        """
+        values = MetricHistory.values(metric, sample)
+        with self._lock:
+            self._pending.append((metric, sample["timestamp"], values))
+
+    def _run(self):
+        while self.running:
+            self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                Colors.error(f"Error writing metric log: {e}")
+
+    def flush(self):
+        """
+        Grava as amostras pendentes: um write por segmento para os registros e outro para o índice.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        # métrica -> (segmento, registros, entradas do índice)
+        writes = {}
+        for metric, timestamp, values in pending:
+            segment = self._segments.get(metric)
+            if segment is None or timestamp - segment["start"] >= self.segment_seconds:
+                segment = self._rotate(metric, timestamp, writes)
+
+            _, records, index = writes.setdefault(metric, (segment, [], []))
+            if segment["count"] % self.index_every == 0:
+                index.append(self.INDEX.pack(timestamp, segment["count"]))
+            records.append(self.records[metric].pack(timestamp, *values))
+            segment["count"] += 1
+
+        for segment, records, index in writes.values():
+            os.write(segment["data"], b"".join(records))
+            if index:
+                os.write(segment["index"], b"".join(index))
+        self.written += len(pending)
+
+    def _rotate(self, metric, timestamp, writes):
+        """
+        Fecha o segmento atual da métrica (gravando o que ainda está no lote) e abre um novo.
+        """
+        current = self._segments.get(metric)
+        if current is not None:
+            batch = writes.pop(metric, None)
+            if batch is not None:
+                os.write(current["data"], b"".join(batch[1]))
+                if batch[2]:
+                    os.write(current["index"], b"".join(batch[2]))
+            os.close(current["data"])
+            os.close(current["index"])
+
+        base = os.path.join(self.directory, self.segment_name(metric, timestamp))
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        segment = {
+            "start": timestamp,
+            "data": os.open(f"{base}.seg", flags, 0o644),
+            "index": os.open(f"{base}.idx", flags, 0o644),
+            "count": 0,
+        }
+        os.write(segment["data"], self.HEADER.pack(self.MAGIC, self.VERSION, len(self.fields[metric]), timestamp))
+        self._segments[metric] = segment
+        self._expire(metric, timestamp)
+        return segment
+
+    def _expire(self, metric, now):
+        """
+        Apaga os segmentos da métrica que terminam antes da janela de retenção.
+        """
+        segments = MetricLogReader.list_segments(self.directory, metric)
+        cutoff = now - self.retention
+        # Um segmento termina onde o seguinte começa; o último é o aberto agora
+        for (_, path), (next_start, _) in zip(segments, segments[1:]):
+            if next_start > cutoff:
+                break
+            for suffix in (".seg", ".idx"):
+                try:
+                    os.unlink(path + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        """
+        Para a thread escritora, grava o que estiver pendente e fecha os segmentos.
+        """
+        self.running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(2)
+        try:
+            self.flush()
+        except OSError as e:
+            Colors.error(f"Error writing metric log: {e}")
+        for segment in self._segments.values():
+            os.close(segment["data"])
+            os.close(segment["index"])
+        self._segments.clear()
+
+
+class MetricLogReader:
+    """
+    Leitura por intervalo de tempo dos segmentos gravados por MetricLogWriter. Só depende dos arquivos,
+    então funciona em outro processo (ex.: os workers) enquanto o escritor continua gravando.
+    """
+    def __init__(self, directory, fields=MetricHistory.FIELDS):
+        self.directory = directory
+        self.fields = fields
+
+    @staticmethod
+    def list_segments(directory, metric):
+        """
+        Segmentos de uma métrica, em ordem de tempo.
+
+        :return: Lista de (início, caminho sem extensão).
+        :rtype: list
+        """
+        segments = []
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return segments
+        prefix = f"{metric}-"
+        for name in names:
+            if name.startswith(prefix) and name.endswith(".seg") and name[len(prefix):-4].isdigit():
+                segments.append((int(name[len(prefix):-4]) / 1000, os.path.join(directory, name[:-4])))
+        segments.sort()
+        return segments
+
+    def read(self, metric, since, until):
+        """
+        Percorre os registros de uma métrica com timestamp entre 'since' e 'until'.
+
+        Só são abertos os segmentos que cobrem o intervalo; em cada um, o índice esparso leva
+        direto ao primeiro bloco de registros e a leitura é feita sobre um mmap do arquivo.
+
+        :return: Gerador de (timestamp, valores).
+        """
+        segments = self.list_segments(self.directory, metric)
+        record = MetricLogWriter.record_struct(len(self.fields[metric]))
+
+        for position, (start, path) in enumerate(segments):
+            end = segments[position + 1][0] if position + 1 < len(segments) else float("inf")
+            if end < since or start > until:
+                continue
+            yield from self._read_segment(path, record, since, until)
+
+    @staticmethod
+    def _load_index(path):
+        try:
+            with open(f"{path}.idx", "rb") as index_file:
+                data = index_file.read()
+        except FileNotFoundError:
+            return [], []
+        # Uma entrada incompleta no fim (gravação em andamento) é ignorada
+        entries = list(MetricLogWriter.INDEX.iter_unpack(data[:len(data) - len(data) % MetricLogWriter.INDEX.size]))
+        return [entry[0] for entry in entries], [entry[1] for entry in entries]
+
+    def _read_segment(self, path, record, since, until):
+        try:
+            segment_file = open(f"{path}.seg", "rb")
+        except FileNotFoundError:
+            # Removido pela retenção depois da listagem
+            return
+        with segment_file:
+            header = MetricLogWriter.HEADER.size
+            count = (os.fstat(segment_file.fileno()).st_size - header) // record.size
+            if count <= 0:
+                return
+            buffer = mmap.mmap(segment_file.fileno(), header + count * record.size, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, _, _ = MetricLogWriter.HEADER.unpack_from(buffer, 0)
+            if magic != MetricLogWriter.MAGIC or version != MetricLogWriter.VERSION:
+                return
+
+            # Última entrada do índice com timestamp <= since
+            timestamps, positions = self._load_index(path)
+            entry = bisect.bisect_right(timestamps, since) - 1
+            first = positions[entry] if entry >= 0 else 0
+
+            for number in range(first, count):
+                timestamp, *values = record.unpack_from(buffer, header + number * record.size)
+                if timestamp > until:
+                    break
+                if timestamp >= since:
+                    yield timestamp, values
+        finally:
+            buffer.close()
+
+    def oldest(self, metric):
+        """
+        Início do segmento mais antigo da métrica, ou None se não há dados.
+        """
+        segments = self.list_segments(self.directory, metric)
+        return segments[0][0] if segments else None
+
+
+class LogReplay:
+    """
+    Reprodução de um intervalo do log para um cliente, respeitando o espaçamento original das amostras
+    dividido pela velocidade. Roda em uma thread própria e pode ser interrompida a qualquer momento.
+    """
+    TICK = 0.05
+    MAX_LINES = 500
+
+    def __init__(self, records, speed, send, done):
+        """
+        :param records: Iterável de (timestamp, valores), em ordem de tempo.
+        :param speed: Fator de velocidade (2 = duas vezes mais rápido).
+        :param send: Função chamada com a lista de registros de cada envio.
+        :param done: Função chamada no fim, com a quantidade de registros enviados e se foi interrompida.
+        """
+        self.records = records
+        self.speed = speed
+        self.send = send
+        self.done = done
+        self.stopped = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="Replay")
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        sent = 0
+        started = None
+        first = None
+        batch = []
+        try:
+            for record in self.records:
+                if self.stopped.is_set():
+                    break
+                if started is None:
+                    started, first = time.monotonic(), record[0]
+
+                # Espera até a hora do registro na escala da reprodução, enviando o lote acumulado
+                delay = started + (record[0] - first) / self.speed - time.monotonic()
+                if (delay > self.TICK and batch) or len(batch) >= self.MAX_LINES:
+                    self.send(batch)
+                    sent += len(batch)
+                    batch = []
+                if delay > self.TICK and self.stopped.wait(delay):
+                    break
+                batch.append(record)
+
+            if batch and not self.stopped.is_set():
+                self.send(batch)
+                sent += len(batch)
+        except Exception as e:
+            Colors.error(f"Error replaying metric log: {e}")
+        self.done(sent, self.stopped.is_set())
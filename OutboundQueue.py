@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import deque
+from FrameDecoder import EncodedFrame
+
+class QueueAction:
+    """
+    Ação executada pelo escritor da conexão na ordem da fila (ex.: ativar a compressão
+    exatamente depois do anúncio). Nunca é descartada.
+    """
+    __slots__ = ("callback",)
+
+    def __init__(self, callback):
+        self.callback = callback
+
+
+class OutboundQueue:
+    """
+    Fila de saída limitada de uma conexão, consumida por um único escritor.
+
+    Os limites são em mensagens e em bytes. Quando a fila está cheia, a política define o que acontece:
+    - block: as respostas da própria conexão esperam por espaço (até block_timeout), segurando a leitura
+      dos comandos desse cliente; amostras que não cabem são descartadas, pois o sampler nunca espera.
+    - drop_oldest: as amostras mais antigas da fila são descartadas para abrir espaço.
+    - coalesce: se já houver uma amostra do mesmo monitor na fila, ela é substituída pela mais recente;
+      se ainda faltar espaço, as mais antigas são descartadas.
+
+    Mensagens de controle (sem chave de monitor) nunca são descartadas. O payload pode ser uma
+    função sem argumentos, chamada só no momento do envio (ex.: codificação delta).
+    """
+    POLICIES = ("block", "drop_oldest", "coalesce")
+
+    def __init__(self, max_messages=1024, max_bytes=4 * 1024 * 1024, policy="drop_oldest", block_timeout=1.0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Policy must be in {list(self.POLICIES)}")
+        if max_messages <= 0 or max_bytes <= 0:
+            raise ValueError("Queue limits must be greater than 0")
+
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        # Itens: [chave, payload, tamanho]
+        self._items = deque()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        self.bytes = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.closed = False
+
+        # Chamado sempre que há algo novo na fila (usado pelo escritor do motor asyncio)
+        self.on_ready = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def _has_room(self, size):
+        return len(self._items) < self.max_messages and self.bytes + size <= self.max_bytes
+
+    def _drop_oldest_sample(self):
+        """
+        Descarta a amostra mais antiga da fila. Deve ser chamado com o lock.
+        """
+        for index, item in enumerate(self._items):
+            if item[0] is not None:
+                del self._items[index]
+                self.bytes -= item[2]
+                if self._latest.get(item[0]) is item:
+                    del self._latest[item[0]]
+                self.dropped += 1
+                return True
+        return False
+
+    def put(self, payload, key=None, size=None, can_block=True):
+        """
+        Enfileira uma mensagem.
+
+        :param payload: Mensagem (str, bytes ou EncodedFrame), função que gera a mensagem no envio, ou QueueAction.
+        :param key: Chave do monitor para amostras; None para mensagens de controle.
+        :param size: Tamanho estimado, para payloads gerados no envio.
+        :param can_block: False quando o produtor não pode esperar (ex.: dentro do event loop).
+        :return: True se a mensagem foi enfileirada, False se foi descartada ou a fila está fechada.
+        :rtype: bool
+        """
+        if size is None:
+            size = len(payload) if isinstance(payload, (str, bytes, EncodedFrame)) else 64
+
+        with self._lock:
+            if self.closed:
+                return False
+
+            if not self._has_room(size):
+                if key is None:
+                    # Mensagens de controle nunca são descartadas; na política block, o produtor
+                    # (a própria conexão) espera por espaço antes de enfileirar
+                    if self.policy == "block" and can_block:
+                        self._wait_for_room(size)
+                        if self.closed:
+                            return False
+                elif self.policy == "coalesce" and key in self._latest:
+                    # Substitui a amostra pendente do mesmo monitor pela mais recente
+                    item = self._latest[key]
+                    self.bytes += size - item[2]
+                    item[1] = payload
+                    item[2] = size
+                    self.coalesced += 1
+                    return True
+                elif self.policy == "block":
+                    # Amostras vêm do sampler compartilhado, que nunca espera por um cliente lento
+                    self.dropped += 1
+                    return False
+                else:
+                    while not self._has_room(size) and self._drop_oldest_sample():
+                        pass
+                    if not self._has_room(size):
+                        self.dropped += 1
+                        return False
+
+            item = [key, payload, size]
+            self._items.append(item)
+            self.bytes += size
+            if key is not None and self.policy == "coalesce":
+                self._latest[key] = item
+            self._not_empty.notify()
+
+        if self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    def _wait_for_room(self, size):
+        """
+        Espera até haver espaço, a fila ser fechada ou block_timeout expirar. Deve ser chamado com o lock.
+        """
+        deadline = time.monotonic() + self.block_timeout
+        while not self.closed and not self._has_room(size):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._not_full.wait(remaining)
+
+    def put_action(self, callback, can_block=True):
+        """
+        Enfileira uma ação para ser executada pelo escritor na ordem da fila.
+
+        :param can_block: False quando o produtor não pode esperar (ex.: dentro do event loop).
+        """
+        return self.put(QueueAction(callback), size=0, can_block=can_block)
+
+    def _take(self, max_items):
+        """
+        Retira até max_items itens da fila. Deve ser chamado com o lock.
+        """
+        batch = []
+        while self._items and len(batch) < max_items:
+            item = self._items.popleft()
+            self.bytes -= item[2]
+            if item[0] is not None and self._latest.get(item[0]) is item:
+                del self._latest[item[0]]
+            batch.append(item[1])
+        if batch:
+            self._not_full.notify_all()
+        return batch
+
+    def get_batch(self, max_items=256, timeout=None):
+        """
+        Espera por mensagens e retira todas as pendentes (até max_items), para um único envio.
+
+        :return: Lista de payloads; lista vazia no timeout; None se a fila foi fechada e esvaziada.
+        """
+        with self._lock:
+            if not self._items and not self.closed:
+                self._not_empty.wait(timeout)
+            if not self._items and self.closed:
+                return None
+            return self._take(max_items)
+
+    def pop_batch(self, max_items=256):
+        """
+        Retira as mensagens pendentes sem esperar.
+
+        :return: Lista de payloads; None se a fila foi fechada e esvaziada.
+        """
+        with self._lock:
+            if not self._items and self.closed:
+                return None
+            return self._take(max_items)
+
+    def close(self):
+        """
+        Fecha a fila: novas mensagens são recusadas e o escritor termina depois de enviar as pendentes.
+        """
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if self.on_ready is not None:
+            self.on_ready()
+
+    def discard(self):
+        """
+        Fecha a fila descartando tudo o que estava pendente (ex.: conexão perdida).
+        """
+        with self._lock:
+            self.closed = True
+            self._items.clear()
+            self._latest.clear()
+            self.bytes = 0
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if self.on_ready is not None:
+            self.on_ready()
+
+    def snapshot(self):
+        """
+        Profundidade atual e contadores da fila.
+        """
+        return {
+            "policy": self.policy,
+            "depth": len(self._items),
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
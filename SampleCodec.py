@@ -0,0 +1,549 @@
+import struct
+import time
+from collections import namedtuple
+
+CoreTimes = namedtuple("CoreTimes", ["user", "system", "idle"])
+Memory = namedtuple("Memory", ["percent", "available", "used", "free", "buffers", "cached", "shared"])
+Swap = namedtuple("Swap", ["percent", "total", "used", "free"])
+DiskRates = namedtuple("DiskRates", ["name", "read_bytes", "write_bytes", "busy_percent"])
+NetRates = namedtuple("NetRates", ["name", "bytes_sent", "bytes_recv"])
+ProcessUsage = namedtuple("ProcessUsage", ["pid", "name", "cpu_percent", "rss"])
+
+class SampleCodec:
+    """
+    Codificação binária compacta das amostras de CPU, memória, disco, rede e processos.
+
+    Cada registro começa com um cabeçalho fixo (magic, versão do schema, métrica, modo, ID do monitor
+    e timestamp) seguido dos valores numéricos brutos em little-endian. O magic nunca coincide com o
+    início de uma mensagem JSON ('{'), então o cliente distingue os dois formatos pelo primeiro byte.
+    """
+    MAGIC = 0xB5
+    DELTA_MAGIC = 0xB6
+    BATCH_MAGIC = 0xB7
+    VERSION = 1
+
+    # Tipos de registro no modo delta
+    KEYFRAME = 0
+    DELTA = 1
+
+    # Escalas usadas para quantizar os valores em inteiros no modo delta
+    PERCENT_SCALE = 10
+    SECONDS_SCALE = 100
+    RATE_SCALE = 10
+
+    METRICS = {"cpu": 1, "mem": 2, "disk": 3, "net": 4, "top": 5}
+    METRIC_NAMES = {value: name for name, value in METRICS.items()}
+
+    # magic, versão, métrica, modo, ID do monitor, timestamp
+    HEADER = struct.Struct("<BBBBId")
+
+    # CPU: uso (%), quantidade de núcleos; no modo avançado, load average e (user, system, idle) por núcleo
+    CPU_BASIC = struct.Struct("<fH")
+    CPU_LOAD = struct.Struct("<3f")
+
+    # Memória: uso (%), available, used, free; no modo avançado, buffers, cached, shared e swap
+    MEM_BASIC = struct.Struct("<f3Q")
+    MEM_ADVANCED = struct.Struct("<3Qf3Q")
+
+    # Disco (por segundo): bytes lidos, bytes escritos, leituras, escritas e ocupação (%); no modo avançado, os discos
+    DISK_BASIC = struct.Struct("<4df")
+    DISK_DEVICE = struct.Struct("<2df")
+
+    # Rede (por segundo): bytes enviados e recebidos, pacotes enviados e recebidos, erros e descartes; no modo avançado, as interfaces
+    NET_BASIC = struct.Struct("<6d")
+    NET_INTERFACE = struct.Struct("<2d")
+
+    # Processos: total de processos e quantidade publicada, seguidos de (PID, CPU %, RSS, nome) de cada um
+    TOP_BASIC = struct.Struct("<IH")
+    TOP_PROCESS = struct.Struct("<IfQ")
+
+    # Listas de tamanho variável: quantidade de itens; nomes: tamanho (u8) seguido do UTF-8
+    COUNT = struct.Struct("<H")
+
+    # Lote: magic, versão, quantidade de registros; cada registro vem precedido do seu tamanho
+    BATCH_HEADER = struct.Struct("<BBH")
+    BATCH_LENGTH = struct.Struct("<H")
+
+    @staticmethod
+    def schema():
+        """
+        Descrição dos registros binários, enviada ao cliente quando o formato é negociado.
+
+        :rtype: dict
+        """
+        return {
+            "version": SampleCodec.VERSION,
+            "magic": SampleCodec.MAGIC,
+            "header": ["magic:u8", "version:u8", "metric:u8", "mode:u8", "monitor_id:u32", "timestamp:f64"],
+            "delta": {
+                "magic": SampleCodec.DELTA_MAGIC,
+                "body": ["kind:u8 (0=keyframe, 1=delta)", "count:varint", "values:count*zigzag_varint"],
+                "scales": {"percent": SampleCodec.PERCENT_SCALE, "seconds": SampleCodec.SECONDS_SCALE, "rate": SampleCodec.RATE_SCALE},
+                "metrics": ["cpu", "mem", "disk (basic)", "net (basic)"],
+            },
+            "batch": {
+                "magic": SampleCodec.BATCH_MAGIC,
+                "header": ["magic:u8", "version:u8", "count:u16"],
+                "records": "count*(length:u16, record)",
+            },
+            "metrics": {
+                "cpu": {
+                    "id": SampleCodec.METRICS["cpu"],
+                    "basic": ["cpu_percent:f32", "cores:u16"],
+                    "advanced": ["load_avg:3*f32", "cpu_times_per_core:cores*(user:f32,system:f32,idle:f32)"],
+                },
+                "mem": {
+                    "id": SampleCodec.METRICS["mem"],
+                    "basic": ["percent:f32", "available:u64", "used:u64", "free:u64"],
+                    "advanced": ["buffers:u64", "cached:u64", "shared:u64", "swap_percent:f32", "swap_total:u64", "swap_used:u64", "swap_free:u64"],
+                },
+                "disk": {
+                    "id": SampleCodec.METRICS["disk"],
+                    "basic": ["read_bytes:f64", "write_bytes:f64", "read_count:f64", "write_count:f64", "busy_percent:f32"],
+                    "advanced": ["count:u16", "disks:count*(name:str8,read_bytes:f64,write_bytes:f64,busy_percent:f32)"],
+                },
+                "net": {
+                    "id": SampleCodec.METRICS["net"],
+                    "basic": ["bytes_sent:f64", "bytes_recv:f64", "packets_sent:f64", "packets_recv:f64", "errors:f64", "drops:f64"],
+                    "advanced": ["count:u16", "interfaces:count*(name:str8,bytes_sent:f64,bytes_recv:f64)"],
+                },
+                "top": {
+                    "id": SampleCodec.METRICS["top"],
+                    "basic": ["total:u32", "count:u16", "processes:count*(pid:u32,cpu_percent:f32,rss:u64,name:str8)"],
+                    "advanced": [],
+                },
+            },
+        }
+
+    @staticmethod
+    def is_binary(payload):
+        """
+        Indica se um payload recebido é um registro binário (absoluto, delta ou lote).
+        """
+        return len(payload) > 0 and payload[0] in (SampleCodec.MAGIC, SampleCodec.DELTA_MAGIC, SampleCodec.BATCH_MAGIC)
+
+    @staticmethod
+    def encode_header(metric, mode, monitor_id, timestamp=None):
+        """
+        Monta o cabeçalho de um registro.
+
+        :param metric: Nome da métrica (ex.: 'cpu', 'mem', 'top').
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :param monitor_id: ID do monitor no cliente.
+        :param timestamp: Horário da amostra (epoch). Se None, usa o horário atual.
+        :rtype: bytes
+        """
+        return SampleCodec.HEADER.pack(
+            SampleCodec.MAGIC,
+            SampleCodec.VERSION,
+            SampleCodec.METRICS[metric],
+            mode,
+            int(monitor_id),
+            timestamp if timestamp is not None else time.time()
+        )
+
+    @staticmethod
+    def encode_body(metric, mode, sample):
+        """
+        Empacota os valores de uma amostra, sem o cabeçalho.
+
+        :param metric: Nome da métrica (ex.: 'cpu', 'mem', 'top').
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :param sample: Amostra coletada pelo Sampler.
+        :rtype: bytes
+        """
+        if metric == "disk":
+            body = bytearray(SampleCodec.DISK_BASIC.pack(
+                sample["read_bytes"], sample["write_bytes"], sample["read_count"], sample["write_count"], sample["busy_percent"]
+            ))
+            if mode == 1:
+                body += SampleCodec.COUNT.pack(len(sample["disks"]))
+                for disk in sample["disks"]:
+                    SampleCodec._write_name(disk.name, body)
+                    body += SampleCodec.DISK_DEVICE.pack(disk.read_bytes, disk.write_bytes, disk.busy_percent)
+            return bytes(body)
+
+        if metric == "net":
+            body = bytearray(SampleCodec.NET_BASIC.pack(
+                sample["bytes_sent"], sample["bytes_recv"], sample["packets_sent"], sample["packets_recv"], sample["errors"], sample["drops"]
+            ))
+            if mode == 1:
+                body += SampleCodec.COUNT.pack(len(sample["interfaces"]))
+                for interface in sample["interfaces"]:
+                    SampleCodec._write_name(interface.name, body)
+                    body += SampleCodec.NET_INTERFACE.pack(interface.bytes_sent, interface.bytes_recv)
+            return bytes(body)
+
+        if metric == "top":
+            body = bytearray(SampleCodec.TOP_BASIC.pack(sample["total"], len(sample["processes"])))
+            for process in sample["processes"]:
+                body += SampleCodec.TOP_PROCESS.pack(process.pid, process.cpu_percent, process.rss)
+                SampleCodec._write_name(process.name, body)
+            return bytes(body)
+
+        if metric == "cpu":
+            cores = sample["cpu_times_per_core"]
+            body = SampleCodec.CPU_BASIC.pack(sample["cpu_percent"], len(cores))
+            if mode == 1:
+                values = []
+                for core in cores:
+                    values.extend((core.user, core.system, core.idle))
+                body += SampleCodec.CPU_LOAD.pack(*sample["load_avg"])
+                body += struct.pack(f"<{len(values)}f", *values)
+            return body
+
+        mem = sample["memory"]
+        body = SampleCodec.MEM_BASIC.pack(mem.percent, mem.available, mem.used, mem.free)
+        if mode == 1:
+            swap = sample["swap"]
+            body += SampleCodec.MEM_ADVANCED.pack(
+                getattr(mem, "buffers", 0), getattr(mem, "cached", 0), getattr(mem, "shared", 0),
+                swap.percent, swap.total, swap.used, swap.free
+            )
+        return body
+
+    @staticmethod
+    def _write_name(name, output):
+        """
+        Escreve um nome (disco, interface ou processo) como tamanho u8 seguido do UTF-8, cortado em 255 bytes.
+        """
+        encoded = name.encode("utf-8", "replace")[:255]
+        output.append(len(encoded))
+        output += encoded
+
+    @staticmethod
+    def _read_name(payload, offset):
+        length = payload[offset]
+        return bytes(payload[offset + 1:offset + 1 + length]).decode("utf-8", "replace"), offset + 1 + length
+
+    @staticmethod
+    def encode_batch(records):
+        """
+        Agrupa vários registros (absolutos ou delta) em uma única mensagem.
+
+        :param records: Registros já codificados, em ordem.
+        :type records: list[bytes]
+        :rtype: bytes
+        """
+        output = bytearray(SampleCodec.BATCH_HEADER.pack(SampleCodec.BATCH_MAGIC, SampleCodec.VERSION, len(records)))
+        for record in records:
+            output += SampleCodec.BATCH_LENGTH.pack(len(record))
+            output += record
+        return bytes(output)
+
+    @staticmethod
+    def split_batch(payload):
+        """
+        Separa os registros de um lote.
+
+        :return: Lista de registros, na ordem em que foram agrupados.
+        :rtype: list[bytes]
+        """
+        magic, version, count = SampleCodec.BATCH_HEADER.unpack_from(payload, 0)
+        if version != SampleCodec.VERSION:
+            raise ValueError(f"Unsupported sample schema version {version}")
+
+        records = []
+        offset = SampleCodec.BATCH_HEADER.size
+        for _ in range(count):
+            (length,) = SampleCodec.BATCH_LENGTH.unpack_from(payload, offset)
+            offset += SampleCodec.BATCH_LENGTH.size
+            records.append(payload[offset:offset + length])
+            offset += length
+        return records
+
+    @staticmethod
+    def monitor_id(payload):
+        """
+        ID do monitor de um registro (ou do primeiro registro de um lote), sem decodificar os valores.
+        """
+        if payload[0] == SampleCodec.BATCH_MAGIC:
+            payload = SampleCodec.split_batch(payload)[0]
+        return SampleCodec.HEADER.unpack_from(payload, 0)[4]
+
+    @staticmethod
+    def retag(payload, monitor_id):
+        """
+        Copia um registro (ou todos os registros de um lote) trocando o ID do monitor.
+        Usado pelo relay para repassar a mesma amostra com o ID de cada cliente.
+
+        :rtype: bytes
+        """
+        if payload[0] == SampleCodec.BATCH_MAGIC:
+            return SampleCodec.encode_batch([SampleCodec.retag(record, monitor_id) for record in SampleCodec.split_batch(payload)])
+        return payload[:4] + struct.pack("<I", int(monitor_id)) + payload[8:]
+
+    @staticmethod
+    def decode(payload, delta_state=None):
+        """
+        Decodifica um registro binário.
+
+        :param payload: Registro recebido.
+        :type payload: bytes
+        :param delta_state: Estado do decodificador delta (último vetor por monitor e métrica), obrigatório para registros delta.
+        :type delta_state: dict
+        :return: Dicionário com metric, mode, monitor_id, timestamp e sample (no mesmo formato do Sampler),
+            ou None se um delta chegou antes do primeiro keyframe do monitor.
+        :rtype: dict
+        """
+        if payload[0] == SampleCodec.DELTA_MAGIC:
+            return SampleCodec.decode_delta(payload, delta_state if delta_state is not None else {})
+
+        magic, version, metric_id, mode, monitor_id, timestamp = SampleCodec.HEADER.unpack_from(payload, 0)
+        if magic != SampleCodec.MAGIC:
+            raise ValueError("Not a binary sample")
+        if version != SampleCodec.VERSION:
+            raise ValueError(f"Unsupported sample schema version {version}")
+
+        metric = SampleCodec.METRIC_NAMES[metric_id]
+        offset = SampleCodec.HEADER.size
+
+        if metric == "disk":
+            *totals, busy = SampleCodec.DISK_BASIC.unpack_from(payload, offset)
+            offset += SampleCodec.DISK_BASIC.size
+            sample = dict(zip(("read_bytes", "write_bytes", "read_count", "write_count"), totals), busy_percent=busy, disks=[])
+            if mode == 1:
+                (count,) = SampleCodec.COUNT.unpack_from(payload, offset)
+                offset += SampleCodec.COUNT.size
+                for _ in range(count):
+                    name, offset = SampleCodec._read_name(payload, offset)
+                    sample["disks"].append(DiskRates(name, *SampleCodec.DISK_DEVICE.unpack_from(payload, offset)))
+                    offset += SampleCodec.DISK_DEVICE.size
+        elif metric == "net":
+            totals = SampleCodec.NET_BASIC.unpack_from(payload, offset)
+            offset += SampleCodec.NET_BASIC.size
+            sample = dict(zip(("bytes_sent", "bytes_recv", "packets_sent", "packets_recv", "errors", "drops"), totals), interfaces=[])
+            if mode == 1:
+                (count,) = SampleCodec.COUNT.unpack_from(payload, offset)
+                offset += SampleCodec.COUNT.size
+                for _ in range(count):
+                    name, offset = SampleCodec._read_name(payload, offset)
+                    sample["interfaces"].append(NetRates(name, *SampleCodec.NET_INTERFACE.unpack_from(payload, offset)))
+                    offset += SampleCodec.NET_INTERFACE.size
+        elif metric == "top":
+            total, count = SampleCodec.TOP_BASIC.unpack_from(payload, offset)
+            offset += SampleCodec.TOP_BASIC.size
+            sample = {"processes": [], "total": total}
+            for _ in range(count):
+                pid, cpu_percent, rss = SampleCodec.TOP_PROCESS.unpack_from(payload, offset)
+                name, offset = SampleCodec._read_name(payload, offset + SampleCodec.TOP_PROCESS.size)
+                sample["processes"].append(ProcessUsage(pid, name, cpu_percent, rss))
+        elif metric == "cpu":
+            cpu_percent, cores = SampleCodec.CPU_BASIC.unpack_from(payload, offset)
+            offset += SampleCodec.CPU_BASIC.size
+            sample = {"cpu_percent": cpu_percent, "cpu_times_per_core": [], "load_avg": (0.0, 0.0, 0.0)}
+            if mode == 1:
+                sample["load_avg"] = SampleCodec.CPU_LOAD.unpack_from(payload, offset)
+                offset += SampleCodec.CPU_LOAD.size
+                values = struct.unpack_from(f"<{cores * 3}f", payload, offset)
+                sample["cpu_times_per_core"] = [CoreTimes(*values[i:i + 3]) for i in range(0, len(values), 3)]
+        else:
+            percent, available, used, free = SampleCodec.MEM_BASIC.unpack_from(payload, offset)
+            offset += SampleCodec.MEM_BASIC.size
+            buffers = cached = shared = 0
+            swap = Swap(0.0, 0, 0, 0)
+            if mode == 1:
+                buffers, cached, shared, *swap_values = SampleCodec.MEM_ADVANCED.unpack_from(payload, offset)
+                swap = Swap(*swap_values)
+            sample = {
+                "memory": Memory(percent, available, used, free, buffers, cached, shared),
+                "swap": swap,
+            }
+
+        return {
+            "metric": metric,
+            "mode": mode,
+            "monitor_id": monitor_id,
+            "timestamp": timestamp,
+            "sample": sample,
+        }
+
+    @staticmethod
+    def supports_delta(metric, mode):
+        """
+        Indica se a métrica tem vetor de tamanho fixo para o modo delta. As listas com nomes (discos e
+        interfaces no modo avançado, processos do /top) são sempre enviadas como registros absolutos.
+        """
+        return metric in ("cpu", "mem") or (metric in ("disk", "net") and mode == 0)
+
+    @staticmethod
+    def to_vector(metric, mode, sample):
+        """
+        Converte uma amostra em um vetor de inteiros (valores quantizados), base do modo delta.
+
+        :rtype: list[int]
+        """
+        percent_scale = SampleCodec.PERCENT_SCALE
+        seconds_scale = SampleCodec.SECONDS_SCALE
+        rate_scale = SampleCodec.RATE_SCALE
+
+        if metric == "disk":
+            return [
+                round(sample["read_bytes"]), round(sample["write_bytes"]),
+                round(sample["read_count"] * rate_scale), round(sample["write_count"] * rate_scale),
+                round(sample["busy_percent"] * percent_scale),
+            ]
+
+        if metric == "net":
+            return [round(sample["bytes_sent"]), round(sample["bytes_recv"])] + [
+                round(sample[field] * rate_scale) for field in ("packets_sent", "packets_recv", "errors", "drops")
+            ]
+
+        if metric == "cpu":
+            cores = sample["cpu_times_per_core"]
+            vector = [round(sample["cpu_percent"] * percent_scale), len(cores)]
+            if mode == 1:
+                vector.extend(round(load * seconds_scale) for load in sample["load_avg"])
+                for core in cores:
+                    vector.extend((round(core.user * seconds_scale), round(core.system * seconds_scale), round(core.idle * seconds_scale)))
+            return vector
+
+        mem = sample["memory"]
+        vector = [round(mem.percent * percent_scale), mem.available, mem.used, mem.free]
+        if mode == 1:
+            swap = sample["swap"]
+            vector.extend((
+                getattr(mem, "buffers", 0), getattr(mem, "cached", 0), getattr(mem, "shared", 0),
+                round(swap.percent * percent_scale), swap.total, swap.used, swap.free
+            ))
+        return vector
+
+    @staticmethod
+    def from_vector(metric, mode, vector):
+        """
+        Reconstrói uma amostra a partir do vetor de inteiros do modo delta.
+
+        :rtype: dict
+        """
+        percent_scale = SampleCodec.PERCENT_SCALE
+        seconds_scale = SampleCodec.SECONDS_SCALE
+        rate_scale = SampleCodec.RATE_SCALE
+
+        if metric == "disk":
+            return {
+                "read_bytes": float(vector[0]), "write_bytes": float(vector[1]),
+                "read_count": vector[2] / rate_scale, "write_count": vector[3] / rate_scale,
+                "busy_percent": vector[4] / percent_scale, "disks": [],
+            }
+
+        if metric == "net":
+            sample = {"bytes_sent": float(vector[0]), "bytes_recv": float(vector[1]), "interfaces": []}
+            for field, value in zip(("packets_sent", "packets_recv", "errors", "drops"), vector[2:]):
+                sample[field] = value / rate_scale
+            return sample
+
+        if metric == "cpu":
+            sample = {"cpu_percent": vector[0] / percent_scale, "cpu_times_per_core": [], "load_avg": (0.0, 0.0, 0.0)}
+            if mode == 1:
+                sample["load_avg"] = tuple(value / seconds_scale for value in vector[2:5])
+                times = vector[5:]
+                sample["cpu_times_per_core"] = [
+                    CoreTimes(times[i] / seconds_scale, times[i + 1] / seconds_scale, times[i + 2] / seconds_scale)
+                    for i in range(0, len(times), 3)
+                ]
+            return sample
+
+        buffers = cached = shared = 0
+        swap = Swap(0.0, 0, 0, 0)
+        if mode == 1:
+            buffers, cached, shared = vector[4:7]
+            swap = Swap(vector[7] / percent_scale, *vector[8:11])
+        return {
+            "memory": Memory(vector[0] / percent_scale, vector[1], vector[2], vector[3], buffers, cached, shared),
+            "swap": swap,
+        }
+
+    @staticmethod
+    def _write_varints(values, output):
+        """
+        Escreve inteiros com sinal como varints zigzag (valores pequenos ocupam 1 byte).
+        """
+        for value in values:
+            value = (value << 1) ^ (value >> 63)
+            while value > 0x7F:
+                output.append((value & 0x7F) | 0x80)
+                value >>= 7
+            output.append(value)
+
+    @staticmethod
+    def _read_varints(payload, offset, count):
+        values = []
+        for _ in range(count):
+            shift = 0
+            value = 0
+            while True:
+                byte = payload[offset]
+                offset += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            values.append((value >> 1) ^ -(value & 1))
+        return values, offset
+
+    @staticmethod
+    def encode_delta(metric, mode, monitor_id, timestamp, vector, previous=None):
+        """
+        Monta um registro do modo delta: um keyframe com os valores absolutos, ou as diferenças
+        em relação ao vetor anterior do mesmo monitor.
+
+        :param vector: Vetor atual, gerado por to_vector.
+        :param previous: Vetor enviado no registro anterior. Se None (ou de tamanho diferente), gera um keyframe.
+        :rtype: bytes
+        """
+        output = bytearray(SampleCodec.HEADER.pack(
+            SampleCodec.DELTA_MAGIC,
+            SampleCodec.VERSION,
+            SampleCodec.METRICS[metric],
+            mode,
+            int(monitor_id),
+            timestamp
+        ))
+
+        if previous is None or len(previous) != len(vector):
+            output.append(SampleCodec.KEYFRAME)
+            values = vector
+        else:
+            output.append(SampleCodec.DELTA)
+            values = [current - last for current, last in zip(vector, previous)]
+
+        SampleCodec._write_varints((len(values),), output)
+        SampleCodec._write_varints(values, output)
+        return bytes(output)
+
+    @staticmethod
+    def decode_delta(payload, delta_state):
+        """
+        Decodifica um registro do modo delta, atualizando o último vetor conhecido do monitor.
+
+        :param delta_state: Último vetor por (ID do monitor, métrica); uma assinatura tem uma cadeia por métrica.
+        :type delta_state: dict
+        :rtype: dict | None
+        """
+        magic, version, metric_id, mode, monitor_id, timestamp = SampleCodec.HEADER.unpack_from(payload, 0)
+        if version != SampleCodec.VERSION:
+            raise ValueError(f"Unsupported sample schema version {version}")
+
+        metric = SampleCodec.METRIC_NAMES[metric_id]
+        offset = SampleCodec.HEADER.size
+        kind = payload[offset]
+        (count,), offset = SampleCodec._read_varints(payload, offset + 1, 1)
+        values, offset = SampleCodec._read_varints(payload, offset, count)
+
+        if kind == SampleCodec.KEYFRAME:
+            vector = values
+        else:
+            previous = delta_state.get((monitor_id, metric_id))
+            if previous is None or len(previous) != len(values):
+                # Sem base para aplicar o delta: aguarda o próximo keyframe
+                return None
+            vector = [last + diff for last, diff in zip(previous, values)]
+
+        delta_state[(monitor_id, metric_id)] = vector
+        return {
+            "metric": metric,
+            "mode": mode,
+            "monitor_id": monitor_id,
+            "timestamp": timestamp,
+            "sample": SampleCodec.from_vector(metric, mode, vector),
+        }
@@ -0,0 +1,150 @@
+import re
+from MetricHistory import MetricHistory
+
+class SampleFilter:
+    """
+    Filtro de entrega de um monitor, avaliado no caminho do sampler antes de qualquer formatação:
+    amostras descartadas nunca são formatadas nem codificadas.
+
+    O valor observado de cada métrica é o primeiro campo de MetricHistory.FIELDS (uso de CPU ou de memória, em %).
+    Uma amostra é enviada quando:
+    - on-change: o valor se afastou mais que 'deadband' pontos do último valor enviado;
+    - alerta: o valor cruzou um limite (ex.: >90), nos dois sentidos;
+    - heartbeat: nada foi enviado nos últimos 'heartbeat' segundos.
+    """
+    __slots__ = ("on_change", "deadband", "alerts", "heartbeat", "last_values", "last_sent", "active", "suppressed")
+
+    ALERT = re.compile(r"^-alert(?:=([a-z]+))?([<>])(\d+(?:\.\d+)?)%?$")
+    DEFAULT_HEARTBEAT = 30
+
+    def __init__(self, on_change=False, deadband=0.0, alerts=(), heartbeat=DEFAULT_HEARTBEAT):
+        """
+        :param on_change: Envia só quando o valor muda mais que o deadband.
+        :param deadband: Variação mínima, em pontos percentuais, para contar como mudança.
+        :param alerts: Lista de (métrica ou None para todas, '<' ou '>', limite).
+        :param heartbeat: Segundos sem envio depois dos quais uma amostra é enviada mesmo sem mudança.
+        """
+        self.on_change = on_change
+        self.deadband = deadband
+        self.alerts = list(alerts)
+        self.heartbeat = heartbeat
+
+        self.last_values = {}
+        self.last_sent = None
+        # Índices dos alertas cujo limite está ultrapassado
+        self.active = set()
+        self.suppressed = 0
+
+    @classmethod
+    def from_request(cls, tokens, metrics):
+        """
+        Extrai as opções de filtro de um comando (-on-change, -deadband=, -alert>N, -alert=<métrica><N, -heartbeat=).
+
+        :param tokens: Opções do comando, como foram escritas (Command.tokens).
+        :param metrics: Métricas do monitor.
+        :return: O filtro, ou None se o comando não usa nenhuma opção de filtro.
+        :rtype: SampleFilter | None
+        """
+        on_change = False
+        deadband = None
+        alerts = []
+        heartbeat = None
+
+        for part in tokens:
+            if part == "-on-change":
+                on_change = True
+            elif part.startswith("-deadband="):
+                value = part[len("-deadband="):].removesuffix("%")
+                try:
+                    deadband = float(value)
+                except ValueError:
+                    deadband = -1
+                if deadband < 0:
+                    raise ValueError("Deadband must be a non-negative number of percentage points (e.g. -deadband=2%).")
+            elif part.startswith("-alert"):
+                match = cls.ALERT.match(part.lower())
+                if match is None:
+                    raise ValueError("Alerts must look like -alert>90 or -alert=mem<10.")
+                metric, operator, limit = match.groups()
+                if metric is not None and metric not in metrics:
+                    raise ValueError(f"Alert metric must be in {list(metrics)}.")
+                alerts.append((metric, operator, float(limit)))
+            elif part.startswith("-heartbeat="):
+                value = part[len("-heartbeat="):]
+                try:
+                    heartbeat = float(value)
+                except ValueError:
+                    heartbeat = 0
+                if heartbeat <= 0:
+                    raise ValueError("Heartbeat must be a positive number of seconds.")
+
+        if deadband is not None:
+            on_change = True
+        if not on_change and not alerts:
+            if heartbeat is not None:
+                raise ValueError("-heartbeat= needs -on-change, -deadband= or -alert.")
+            return None
+        if not set(metrics) <= set(MetricHistory.FIELDS):
+            raise ValueError(f"Filters are only available for {list(MetricHistory.FIELDS)}.")
+        return cls(on_change, deadband or 0.0, alerts, heartbeat or cls.DEFAULT_HEARTBEAT)
+
+    def evaluate(self, timestamp, samples):
+        """
+        Decide se a amostra deve ser enviada.
+
+        :param timestamp: Timestamp da coleta.
+        :param samples: Amostras do disparo, por métrica.
+        :type samples: dict
+        :return: None se a amostra deve ser descartada; senão, a lista de alertas que mudaram de estado
+                 (vazia quando o envio é por mudança ou heartbeat).
+        :rtype: list | None
+        """
+        values = {metric: MetricHistory.values(metric, sample)[0] for metric, sample in samples.items()}
+
+        # Os alertas são avaliados em todas as amostras, para que nenhum cruzamento seja perdido
+        crossed = []
+        for index, (metric, operator, limit) in enumerate(self.alerts):
+            for name, value in values.items():
+                if metric is not None and name != metric:
+                    continue
+                above = value > limit if operator == ">" else value < limit
+                key = (index, name)
+                if above != (key in self.active):
+                    if above:
+                        self.active.add(key)
+                    else:
+                        self.active.discard(key)
+                    crossed.append((name, operator, limit, value, above))
+
+        send = bool(crossed) or self.last_sent is None or timestamp - self.last_sent >= self.heartbeat
+        if not send and self.on_change:
+            send = any(abs(value - self.last_values.get(name, value)) > self.deadband for name, value in values.items())
+
+        if not send:
+            self.suppressed += 1
+            return None
+        self.last_sent = timestamp
+        self.last_values = values
+        return crossed
+
+    @staticmethod
+    def describe_alert(alert):
+        """
+        Texto de um alerta que mudou de estado, mostrado antes da amostra no formato texto.
+        """
+        name, operator, limit, value, above = alert
+        field = MetricHistory.FIELDS[name][0]
+        state = "ALERT" if above else "CLEARED"
+        return f"{state}: {name} {field} {value:.1f} {operator if above else 'no longer ' + operator} {limit:g}"
+
+    def describe(self):
+        """
+        Resumo das opções do filtro, para /monitors.
+        """
+        parts = []
+        if self.on_change:
+            parts.append(f"on-change (deadband {self.deadband:g})")
+        for metric, operator, limit in self.alerts:
+            parts.append(f"alert {metric + ' ' if metric else ''}{operator}{limit:g}")
+        parts.append(f"heartbeat {self.heartbeat:g}s, {self.suppressed} suppressed")
+        return ", ".join(parts)
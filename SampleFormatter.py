@@ -0,0 +1,174 @@
+class SampleFormatter:
+    """
+    Formatação das amostras em texto legível. Usada pelo servidor no formato texto
+    e pelo cliente para renderizar as amostras recebidas no formato binário.
+    """
+    @staticmethod
+    def format(metric, sample, mode):
+        """
+        Formata uma amostra de qualquer métrica em texto.
+
+        :param metric: Nome da métrica ('cpu', 'mem', 'disk', 'net' ou 'top').
+        :type metric: str
+        """
+        formatters = {
+            "cpu": SampleFormatter.format_cpu,
+            "mem": SampleFormatter.format_mem,
+            "disk": SampleFormatter.format_disk,
+            "net": SampleFormatter.format_net,
+            "top": SampleFormatter.format_top,
+        }
+        return formatters[metric](sample, mode)
+
+    @staticmethod
+    def format_rate(value):
+        """
+        Formata uma taxa em bytes por segundo com a unidade mais legível.
+        """
+        for unit in ("B/s", "KB/s", "MB/s"):
+            if value < 1024:
+                return f"{value:.1f} {unit}"
+            value /= 1024
+        return f"{value:.2f} GB/s"
+
+    @staticmethod
+    def format_mem(sample, mode):
+        """
+        Formata uma amostra de memória em texto.
+        
+        :param sample: Amostra coletada pelo Sampler ou decodificada por SampleCodec.
+        :type sample: dict
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :type mode: int
+        :return: Mensagem formatada.
+        :rtype: str
+        """
+        mem = sample["memory"]
+        swap = sample["swap"]
+        msg_lines = []
+        msg_lines.append(f"💾 Memory Usage: {mem.percent:.1f}%")
+        msg_lines.append(f"📊 Available: {mem.available / (1024**3):.2f} GB")
+        msg_lines.append(f"📈 Used: {mem.used / (1024**3):.2f} GB")
+        msg_lines.append(f"📉 Free: {mem.free / (1024**3):.2f} GB")
+        
+        if mode == 1:  # advanced
+            msg_lines.append(f"🔄 Swap Usage: {swap.percent:.1f}%")
+            msg_lines.append(f"↔️ Swap Total: {swap.total / (1024**3):.2f} GB")
+            msg_lines.append(f"⬆️ Swap Used: {swap.used / (1024**3):.2f} GB")
+            msg_lines.append(f"⬇️ Swap Free: {swap.free / (1024**3):.2f} GB")
+            msg_lines.append(f"🧠 Buffers: {getattr(mem, 'buffers', 0) / (1024**2):.2f} MB")
+            msg_lines.append(f"🗄️ Cached: {getattr(mem, 'cached', 0) / (1024**2):.2f} MB")
+            msg_lines.append(f"🔁 Shared: {getattr(mem, 'shared', 0) / (1024**2):.2f} MB")
+
+        return "\n".join(msg_lines)
+
+    @staticmethod
+    def format_cpu(sample, mode):
+        """
+        Formata uma amostra de CPU em texto.
+
+        :param sample: Amostra coletada pelo Sampler ou decodificada por SampleCodec.
+        :type sample: dict
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :type mode: int
+        :return: Mensagem formatada.
+        :rtype: str
+        """
+        cpu_percent = sample["cpu_percent"]
+        cpu_times_per_core = sample["cpu_times_per_core"]
+        load_avg = sample["load_avg"]
+
+        msg_lines = []
+        msg_lines.append(f"📊 CPU Usage: {cpu_percent:.1f}%")
+        
+        if mode == 1:  # advanced
+            msg_lines.append("🖥️  CPU Times per Core:")
+            for i, core_time in enumerate(cpu_times_per_core, start=1):
+                msg_lines.append(
+                    f"   Core {i}: user={core_time.user:.2f}s, "
+                    f"system={core_time.system:.2f}s, "
+                    f"idle={core_time.idle:.2f}s"
+                )
+            msg_lines.append(
+                f"📈 Load Average (1m, 5m, 15m): "
+                f"{load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}"
+            )
+
+        return "\n".join(msg_lines)
+
+    @staticmethod
+    def format_disk(sample, mode):
+        """
+        Formata uma amostra de disco em texto.
+
+        :param sample: Amostra coletada pelo Sampler ou decodificada por SampleCodec.
+        :type sample: dict
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :type mode: int
+        :return: Mensagem formatada.
+        :rtype: str
+        """
+        rate = SampleFormatter.format_rate
+        msg_lines = []
+        msg_lines.append(f"📥 Disk Read: {rate(sample['read_bytes'])} ({sample['read_count']:.1f} ops/s)")
+        msg_lines.append(f"📤 Disk Write: {rate(sample['write_bytes'])} ({sample['write_count']:.1f} ops/s)")
+        msg_lines.append(f"⏳ Disk Busy: {sample['busy_percent']:.1f}%")
+
+        if mode == 1:  # advanced
+            msg_lines.append("💽 Disks:")
+            for disk in sample["disks"]:
+                msg_lines.append(
+                    f"   {disk.name}: read={rate(disk.read_bytes)}, "
+                    f"write={rate(disk.write_bytes)}, "
+                    f"busy={disk.busy_percent:.1f}%"
+                )
+
+        return "\n".join(msg_lines)
+
+    @staticmethod
+    def format_net(sample, mode):
+        """
+        Formata uma amostra de rede em texto.
+
+        :param sample: Amostra coletada pelo Sampler ou decodificada por SampleCodec.
+        :type sample: dict
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :type mode: int
+        :return: Mensagem formatada.
+        :rtype: str
+        """
+        rate = SampleFormatter.format_rate
+        msg_lines = []
+        msg_lines.append(f"⬆️ Network Sent: {rate(sample['bytes_sent'])} ({sample['packets_sent']:.1f} packets/s)")
+        msg_lines.append(f"⬇️ Network Received: {rate(sample['bytes_recv'])} ({sample['packets_recv']:.1f} packets/s)")
+        msg_lines.append(f"⚠️ Errors: {sample['errors']:.1f}/s, Drops: {sample['drops']:.1f}/s")
+
+        if mode == 1:  # advanced
+            msg_lines.append("🌐 Interfaces:")
+            for interface in sample["interfaces"]:
+                msg_lines.append(f"   {interface.name}: sent={rate(interface.bytes_sent)}, received={rate(interface.bytes_recv)}")
+
+        return "\n".join(msg_lines)
+
+    @staticmethod
+    def format_top(sample, mode):
+        """
+        Formata uma amostra dos processos que mais usam CPU em texto. Os dois modos mostram o mesmo conteúdo.
+
+        :param sample: Amostra coletada pelo Sampler ou decodificada por SampleCodec.
+        :type sample: dict
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :type mode: int
+        :return: Mensagem formatada.
+        :rtype: str
+        """
+        msg_lines = []
+        msg_lines.append(f"🔝 Top Processes ({len(sample['processes'])} of {sample['total']}):")
+        for process in sample["processes"]:
+            msg_lines.append(
+                f"   {process.pid:>7} {process.name[:20]:<20} "
+                f"cpu={process.cpu_percent:5.1f}% "
+                f"rss={process.rss / (1024**2):.1f} MB"
+            )
+
+        return "\n".join(msg_lines)
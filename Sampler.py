@@ -0,0 +1,149 @@
+import threading
+import time
+from functools import partial
+from Colors import Colors
+from Collectors import create_backend
+from Scheduler import Scheduler
+
+class Sampler:
+    """
+    Motor de amostragem compartilhado. Cada métrica é coletada uma única vez por intervalo distinto
+    e a mesma amostra é distribuída para todos os monitores inscritos naquele (métrica, intervalo).
+    Os grupos de coleta são tarefas de um único Scheduler, e não threads próprias.
+    """
+    def __init__(self, stats=None, backend=None):
+        """
+        :param stats: Instrumentação opcional (ServerStats): duração de cada coleta.
+        :param backend: Backend de coleta (Collectors.ProcBackend ou PsutilBackend); por padrão, o mais rápido disponível.
+        """
+        self.stats = stats
+        self.backend = backend or create_backend()
+
+        # (métrica, intervalo) -> {"subscribers": {chave: callback}, "state": dict, "job": ScheduledJob}
+        self._groups = {}
+        self.lock = threading.Lock()
+
+        self.scheduler = Scheduler()
+
+        self.collectors = {
+            "cpu": self.backend.cpu,
+            "mem": self.backend.mem,
+            "disk": self.backend.disk,
+            "net": self.backend.net,
+            "top": self.backend.top,
+        }
+
+        # Atraso máximo até a primeira amostra: CPU, disco, rede e processos precisam de uma janela para calcular as taxas
+        self.first_delay = {
+            "cpu": 1.0,
+            "disk": 1.0,
+            "net": 1.0,
+            "top": 1.0,
+        }
+
+    def attach_loop(self, loop):
+        """
+        Faz o agendador rodar como coroutine no event loop do motor asyncio, em vez de uma thread.
+
+        :param loop: Event loop do motor asyncio.
+        :type loop: asyncio.AbstractEventLoop
+        """
+        self.scheduler.start_async(loop)
+
+    def subscribe(self, metric, interval, key, callback):
+        """
+        Inscreve um monitor para receber as amostras de uma métrica.
+
+        :param metric: Nome da métrica (ex.: 'cpu', 'mem', 'top'), ou tupla de métricas coletadas juntas no mesmo disparo.
+        :type metric: str | tuple
+        :param interval: Intervalo de tempo entre as coletas, em segundos.
+        :type interval: int | float
+        :param key: Identificador único do inscrito, por exemplo (client_id, task_id).
+        :type key: tuple
+        :param callback: Função chamada com cada amostra coletada.
+        :type callback: callable
+        """
+        names = metric if isinstance(metric, tuple) else (metric,)
+        for name in names:
+            if name not in self.collectors:
+                raise ValueError(f"Unknown metric '{name}'")
+
+        # Sem event loop associado, o agendador roda em uma thread própria
+        self.scheduler.start()
+
+        with self.lock:
+            group = self._groups.get((metric, interval))
+            if group is None:
+                group = {"subscribers": {}, "state": {}, "job": None}
+                self._groups[(metric, interval)] = group
+
+                # Prepara o estado da coleta (ex.: tempos de CPU de referência) antes do primeiro disparo
+                if isinstance(metric, tuple):
+                    group["state"] = {name: {} for name in metric}
+                    for name in metric:
+                        self.collectors[name](group["state"][name])
+                else:
+                    self.collectors[metric](group["state"])
+                first_delay = min(interval, max(self.first_delay.get(name, 0.0) for name in names))
+                group["job"] = self.scheduler.schedule(
+                    interval,
+                    partial(self._run_group, metric, group),
+                    first_delay=first_delay,
+                    name=f"{'+'.join(names)}-{interval}"
+                )
+
+            group["subscribers"][key] = callback
+
+    def unsubscribe(self, metric, interval, key):
+        """
+        Remove a inscrição de um monitor. Quando o grupo fica vazio, a tarefa de coleta é cancelada na hora.
+
+        :return: True se o inscrito existia, False caso contrário.
+        :rtype: bool
+        """
+        with self.lock:
+            group = self._groups.get((metric, interval))
+            if group is None or key not in group["subscribers"]:
+                return False
+
+            del group["subscribers"][key]
+            if not group["subscribers"]:
+                self.scheduler.cancel(group["job"])
+                del self._groups[(metric, interval)]
+            return True
+
+    def active_groups(self):
+        """
+        Retorna a quantidade de inscritos por (métrica, intervalo).
+        """
+        with self.lock:
+            return {group_key: len(group["subscribers"]) for group_key, group in self._groups.items()}
+
+    def _run_group(self, metric, group):
+        """
+        Disparo de um grupo (métrica, intervalo): coleta uma vez e entrega para todos os inscritos.
+        """
+        started = time.perf_counter()
+        if isinstance(metric, tuple):
+            # Assinatura: todas as métricas coletadas no mesmo disparo, com um único timestamp
+            sample = {"metrics": {name: self.collectors[name](group["state"][name]) for name in metric}}
+            timestamp = time.time()
+            for metric_sample in sample["metrics"].values():
+                metric_sample["timestamp"] = timestamp
+            metric = "+".join(metric)
+        else:
+            sample = self.collectors[metric](group["state"])
+            timestamp = time.time()
+        if self.stats is not None:
+            self.stats.record_sampling(metric, time.perf_counter() - started)
+        sample["timestamp"] = timestamp
+
+        # Copia os inscritos para não segurar o lock durante o envio
+        with self.lock:
+            subscribers = list(group["subscribers"].values())
+
+        for callback in subscribers:
+            try:
+                callback(sample)
+            except Exception as e:
+                Colors.error(f"Error delivering {metric} sample: {e}")
@@ -0,0 +1,225 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from Colors import Colors
+
+class ScheduledJob:
+    """
+    Tarefa periódica registrada no Scheduler.
+    """
+    __slots__ = ("interval", "callback", "name", "deadline", "cancelled")
+
+    def __init__(self, interval, callback, name, deadline):
+        self.interval = interval
+        self.callback = callback
+        self.name = name
+        self.deadline = deadline
+        self.cancelled = False
+
+
+class Scheduler:
+    """
+    Agendador central de tarefas periódicas. As tarefas ficam em uma heap ordenada pelo próximo
+    deadline (relógio monotônico); a cada despertar, todas as tarefas vencidas são disparadas em lote.
+    O próximo deadline é calculado a partir do deadline anterior, e não do horário do disparo,
+    então atrasos de um ciclo não se acumulam nos seguintes.
+    """
+    JITTER_WINDOW = 1024
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self.running = False
+
+        # Driver assíncrono (quando o agendador roda dentro de um event loop)
+        self.loop = None
+        self._wakeup = None
+
+        # Atraso (em segundos) entre o deadline e o disparo efetivo de cada ciclo
+        self._jitter = deque(maxlen=self.JITTER_WINDOW)
+        self._jitter_max = 0.0
+        self._ticks = 0
+
+    def start(self):
+        """
+        Inicia o agendador em uma thread dedicada.
+        """
+        if self.running:
+            return
+        self.running = True
+        thread = threading.Thread(target=self._run, name="Scheduler")
+        thread.daemon = True
+        thread.start()
+
+    def start_async(self, loop):
+        """
+        Inicia o agendador como uma coroutine no event loop informado.
+
+        :param loop: Event loop onde as tarefas serão disparadas.
+        :type loop: asyncio.AbstractEventLoop
+        """
+        if self.running:
+            return
+        self.running = True
+        self.loop = loop
+        asyncio.run_coroutine_threadsafe(self._run_async(), loop)
+
+    def stop(self):
+        self.running = False
+        self._notify()
+
+    def schedule(self, interval, callback, first_delay=0.0, name=None):
+        """
+        Agenda uma tarefa periódica.
+
+        :param interval: Período da tarefa, em segundos.
+        :type interval: float
+        :param callback: Função chamada a cada disparo.
+        :type callback: callable
+        :param first_delay: Atraso até o primeiro disparo, em segundos.
+        :type first_delay: float
+        :param name: Nome da tarefa, usado nas mensagens de erro.
+        :type name: str
+        :return: A tarefa agendada, usada para cancelá-la.
+        :rtype: ScheduledJob
+        """
+        if interval <= 0:
+            raise ValueError("Interval must be greater than 0")
+
+        job = ScheduledJob(interval, callback, name or repr(callback), time.monotonic() + first_delay)
+        with self._lock:
+            heapq.heappush(self._heap, (job.deadline, next(self._counter), job))
+        self._notify()
+        return job
+
+    def cancel(self, job):
+        """
+        Cancela uma tarefa. Ela não é disparada novamente, mesmo que já esteja vencida.
+
+        :param job: Tarefa retornada por schedule.
+        :type job: ScheduledJob
+        """
+        job.cancelled = True
+        self._notify()
+
+    def jitter_stats(self):
+        """
+        Estatísticas do atraso de disparo por ciclo, em milissegundos.
+
+        :return: Dicionário com ticks, last, mean, p99 e max.
+        :rtype: dict
+        """
+        with self._lock:
+            samples = sorted(self._jitter)
+            last = self._jitter[-1] if self._jitter else 0.0
+            ticks = self._ticks
+            jitter_max = self._jitter_max
+
+        if not samples:
+            return {"ticks": ticks, "last": 0.0, "mean": 0.0, "p99": 0.0, "max": 0.0}
+
+        p99 = samples[min(len(samples) - 1, math.ceil(len(samples) * 0.99) - 1)]
+        return {
+            "ticks": ticks,
+            "last": last * 1000,
+            "mean": sum(samples) / len(samples) * 1000,
+            "p99": p99 * 1000,
+            "max": jitter_max * 1000,
+        }
+
+    def _notify(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wakeup_set)
+        else:
+            with self._condition:
+                self._condition.notify()
+
+    def _wakeup_set(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _time_to_next(self, now):
+        """
+        Tempo até o próximo deadline, descartando tarefas canceladas do topo da heap. Deve ser chamado com o lock.
+        """
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - now)
+
+    def _pop_due(self, now):
+        """
+        Remove da heap todas as tarefas vencidas. Deve ser chamado com o lock.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, job = heapq.heappop(self._heap)
+            if not job.cancelled:
+                due.append(job)
+        return due
+
+    def _fire(self, due):
+        """
+        Dispara um lote de tarefas vencidas e reagenda as que não foram canceladas.
+        """
+        fired_at = time.monotonic()
+        lateness = max(fired_at - job.deadline for job in due)
+
+        for job in due:
+            if job.cancelled:
+                continue
+            try:
+                job.callback()
+            except Exception as e:
+                Colors.error(f"Error running scheduled job {job.name}: {e}")
+
+        now = time.monotonic()
+        with self._lock:
+            self._ticks += 1
+            self._jitter.append(lateness)
+            self._jitter_max = max(self._jitter_max, lateness)
+
+            for job in due:
+                if job.cancelled:
+                    continue
+                # O próximo deadline parte do deadline anterior; ciclos perdidos são pulados sem acumular atraso
+                deadline = job.deadline + job.interval
+                if deadline <= now:
+                    deadline += math.ceil((now - deadline) / job.interval) * job.interval
+                job.deadline = deadline
+                heapq.heappush(self._heap, (deadline, next(self._counter), job))
+
+    def _run(self):
+        while self.running:
+            with self._condition:
+                timeout = self._time_to_next(time.monotonic())
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+                due = self._pop_due(time.monotonic())
+            if due:
+                self._fire(due)
+
+    async def _run_async(self):
+        self._wakeup = asyncio.Event()
+        while self.running:
+            with self._lock:
+                timeout = self._time_to_next(time.monotonic())
+                due = self._pop_due(time.monotonic()) if timeout == 0 else []
+
+            if due:
+                self._fire(due)
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -1,9 +1,13 @@
 from ConnectionManager import ConnectionManager
 import socket
 import threading
+import time
 from Colors import Colors
+from Stats import ServerStats
+from OutboundQueue import OutboundQueue, QueueAction
 from datetime import datetime
 import json
+from functools import partial
 
 class ServerManager(ConnectionManager):
     """ 
@@ -11,11 +15,149 @@ class ServerManager(ConnectionManager):
     """
     def __init__(self, host='0.0.0.0', port=8000):
         super().__init__(host=host, port=port)
+        self.stats = ServerStats()
 
-    def set_connection_limits(self, connection_limits):
+        # Fila de saída e thread escritora de cada cliente, com os limites usados para criá-las
+        self.outbound = {}
+        self.queue_limits = {}
+        self.connection_semaphore = None
+
+        # Detecção de clientes mortos: heartbeat, tempo máximo sem receber nada e TCP keepalive (desligados por padrão)
+        self.heartbeat = 0
+        self.idle_timeout = 0
+        self.keepalive = None
+        # Conexão -> [último frame recebido, último heartbeat enviado], em time.monotonic()
+        self._liveness = {}
+
+    def set_connection_limits(self, connection_limits, shared_semaphore=None):
+        """
+        Define o limite de conexões simultâneas.
+
+        :param connection_limits: Quantidade máxima de conexões.
+        :param shared_semaphore: Semáforo compartilhado entre processos (modo com workers), para que
+            o limite valha para o servidor todo e não para cada processo.
+        """
         if connection_limits <= 0:
             raise ValueError("Connection Limits must be greather than 0")
         self.connection_limits = connection_limits
+        self.connection_semaphore = shared_semaphore
+
+    def enable_reuse_port(self):
+        """
+        Permite que vários processos escutem na mesma porta (SO_REUSEPORT); o kernel distribui
+        as novas conexões entre eles.
+        """
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise OSError("SO_REUSEPORT is not supported on this platform")
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    def set_queue_limits(self, max_messages=1024, max_bytes=4 * 1024 * 1024, policy="drop_oldest"):
+        """
+        Define os limites e a política de estouro das filas de saída dos clientes.
+        """
+        if policy not in OutboundQueue.POLICIES:
+            raise ValueError(f"Queue policy must be in {list(OutboundQueue.POLICIES)}")
+        if max_messages <= 0 or max_bytes <= 0:
+            raise ValueError("Queue limits must be greater than 0")
+        self.queue_limits = {"max_messages": max_messages, "max_bytes": max_bytes, "policy": policy}
+
+    def set_liveness(self, heartbeat=0, idle_timeout=0, keepalive=None):
+        """
+        Configura a detecção de clientes que sumiram sem fechar a conexão (sem FIN), que deixariam
+        a leitura bloqueada e o slot de conexão ocupado para sempre.
+
+        :param heartbeat: Segundos de silêncio do cliente depois dos quais o servidor envia um heartbeat
+            (o cliente responde com /pong); 0 desliga.
+        :param idle_timeout: Segundos sem receber nenhum frame do cliente depois dos quais a conexão é
+            derrubada, liberando o slot e encerrando os monitores; 0 desliga.
+        :param keepalive: (idle, interval, count) do TCP keepalive de cada conexão, em segundos, ou None.
+        """
+        if heartbeat < 0 or idle_timeout < 0:
+            raise ValueError("Heartbeat and idle timeout must not be negative")
+        if heartbeat and idle_timeout and idle_timeout <= heartbeat:
+            raise ValueError("Idle timeout must be greater than the heartbeat interval")
+        if keepalive is not None and (len(keepalive) != 3 or min(keepalive) <= 0):
+            raise ValueError("Keepalive must be (idle, interval, count), all greater than 0")
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+
+    @staticmethod
+    def tune_keepalive(sock, idle, interval, count):
+        """
+        Liga o TCP keepalive do socket com tempos curtos: o kernel detecta o par morto depois de
+        idle + interval * count segundos sem resposta. No Linux, o TCP_USER_TIMEOUT com o mesmo prazo
+        também derruba a conexão quando dados enviados ficam sem confirmação (escritor travado).
+        """
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # As opções abaixo não existem em todas as plataformas
+        for option, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+        if hasattr(socket, "TCP_USER_TIMEOUT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, (idle + interval * count) * 1000)
+
+    def track_liveness(self, connection, sock):
+        """
+        Passa a acompanhar a atividade de uma conexão aceita e aplica o TCP keepalive configurado.
+
+        :param connection: Chave da conexão (socket, ou AsyncConnection no motor asyncio).
+        :param sock: Socket da conexão, para as opções de keepalive.
+        """
+        if self.keepalive is not None and sock is not None:
+            try:
+                self.tune_keepalive(sock, *self.keepalive)
+            except OSError as e:
+                Colors.warning(f"Could not set TCP keepalive: {e}")
+        now = time.monotonic()
+        self._liveness[connection] = [now, now]
+
+    def mark_alive(self, connection):
+        """
+        Registra que um frame acabou de chegar da conexão.
+        """
+        entry = self._liveness.get(connection)
+        if entry is not None:
+            entry[0] = time.monotonic()
+
+    def _watch_liveness(self):
+        """
+        Thread que envia heartbeats para clientes em silêncio e derruba as conexões que passaram do
+        tempo máximo sem enviar nada. Derrubar a conexão acorda a leitura bloqueada do cliente, que
+        encerra a sessão (todos os monitores de uma vez) e libera o slot.
+        """
+        limits = [value for value in (self.heartbeat, self.idle_timeout) if value]
+        tick = min(1.0, min(limits) / 4)
+        while self.running:
+            time.sleep(tick)
+            now = time.monotonic()
+            for connection, entry in list(self._liveness.items()):
+                last_seen, last_heartbeat = entry
+                if self.idle_timeout and now - last_seen >= self.idle_timeout:
+                    self._liveness.pop(connection, None)
+                    self.stats.record_timeout()
+                    Colors.warning(f"Closing connection {self.peer_name(connection)}: nothing received for {now - last_seen:.1f}s")
+                    self.abort_connection(connection)
+                elif self.heartbeat and now - last_seen >= self.heartbeat and now - last_heartbeat >= self.heartbeat:
+                    entry[1] = now
+                    self.send_data(json.dumps({"status": "heartbeat", "timestamp": time.time()}), connection)
+
+    @staticmethod
+    def peer_name(connection):
+        try:
+            return connection.getpeername()
+        except OSError:
+            return "(closed)"
+
+    def abort_connection(self, connection):
+        """
+        Derruba uma conexão sem esperar pela fila de saída. O shutdown acorda a thread bloqueada
+        no recv (que recebe EOF) e o escritor bloqueado no envio.
+        """
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
     def start(self, target_function, args=()):
         """
@@ -33,7 +175,8 @@ class ServerManager(ConnectionManager):
             Colors.error("Connection Limits must exists")
             return
         
-        self.connection_semaphore = threading.Semaphore(self.connection_limits)
+        if self.connection_semaphore is None:
+            self.connection_semaphore = threading.Semaphore(self.connection_limits)
 
         # Define a execução
         host = (self.host, self.port)
@@ -47,6 +190,16 @@ class ServerManager(ConnectionManager):
         thread = threading.Thread(target=self._accept_connections, args=(target_function, args))
         thread.daemon = True
         thread.start()
+        self.start_liveness()
+
+    def start_liveness(self):
+        """
+        Inicia a thread de heartbeats e timeouts, se algum dos dois estiver ligado.
+        """
+        if self.heartbeat or self.idle_timeout:
+            thread = threading.Thread(target=self._watch_liveness, name="Liveness")
+            thread.daemon = True
+            thread.start()
 
     def _accept_connections(self, target_function, args):
         """
@@ -60,7 +213,8 @@ class ServerManager(ConnectionManager):
             try:
                 client_socket, client_address = self.socket.accept()
 
-                if not self.connection_semaphore.acquire(blocking=False):
+                if not self.connection_semaphore.acquire(False):
+                    self.stats.record_reject()
                     Colors.error(f"Rejected connection from {client_address}: too many connections")
 
                     # Envia mensagem de erro pro client
@@ -69,9 +223,11 @@ class ServerManager(ConnectionManager):
                     response = json.dumps({"status": "error", "message": message})
                     self.send_data(response, client_socket)
 
+                    self.forget_socket(client_socket)
                     client_socket.close()
                     continue
 
+                self.stats.record_accept()
                 new_args = (target_function, client_socket, client_address,) + args
                 thread = threading.Thread(target=self.client_wrapper, args=new_args)
                 thread.start()
@@ -89,19 +245,117 @@ class ServerManager(ConnectionManager):
         :param addr: Endereço do cliente.
         :param args: Argumentos adicionais para a função alvo.
         """
+        writer = self.create_outbound(sock)
+        self.track_liveness(sock, sock)
         try:
             target_function(sock, addr, *args)
         except Exception as e:
             Colors.error(f"An error occurred on connection address {addr}: {e}")
         finally:
+            self._liveness.pop(sock, None)
             self.connection_semaphore.release()
+
+            # Deixa o escritor enviar o que ainda está na fila antes de fechar o socket
+            self.outbound[sock].close()
+            writer.join(timeout=1)
+            self.outbound.pop(sock, None)
             try:
                 sock.shutdown(socket.SHUT_RDWR)
             except:
                 pass
 
+            self.forget_socket(sock)
             sock.close()
 
+    def create_outbound(self, sock):
+        """
+        Cria a fila de saída de um cliente e a thread que é a única a escrever no seu socket.
+        Uma conexão lenta enche apenas a própria fila, sem segurar quem produz as mensagens.
+
+        :param sock: Socket do cliente.
+        :return: Thread escritora.
+        """
+        queue = OutboundQueue(**self.queue_limits)
+        self.outbound[sock] = queue
+        if self.stats is not None:
+            self.stats.attach_queue(sock, queue)
+        writer = threading.Thread(target=self._write_loop, args=(sock, queue), name=f"Writer-{sock.fileno()}")
+        writer.daemon = True
+        writer.start()
+        return writer
+
+    def _write_loop(self, sock, queue):
+        """
+        Escritor da conexão: retira todas as mensagens pendentes e as envia com uma única chamada.
+        """
+        while True:
+            batch = queue.get_batch()
+            if batch is None:
+                return
+
+            pending = []
+            for payload in batch:
+                if isinstance(payload, QueueAction):
+                    # Ações rodam na ordem da fila, depois de enviar o que veio antes delas
+                    if pending and not super().send_batch(pending, sock):
+                        queue.discard()
+                        return
+                    pending = []
+                    payload.callback()
+                    continue
+                if callable(payload):
+                    try:
+                        payload = payload()
+                    except Exception as e:
+                        Colors.error(f"Error encoding message: {e}")
+                        continue
+                    if payload is None:
+                        continue
+                pending.append(payload)
+
+            if pending and not super().send_batch(pending, sock):
+                queue.discard()
+                return
+
+    def receive_data(self, target_socket=None):
+        """
+        Recebe o próximo frame de um cliente, registrando a atividade para o controle de timeouts.
+        """
+        frame = super().receive_data(target_socket)
+        if frame:
+            self.mark_alive(target_socket)
+        return frame
+
+    def send_data(self, message, target_socket=None, key=None):
+        """
+        Envia uma mensagem para um cliente pela sua fila de saída (ou diretamente, se ele não tiver uma).
+
+        :param message: Mensagem a ser enviada, ou função que a gera no momento do envio.
+        :param target_socket: Socket do cliente.
+        :param key: Chave do monitor, para amostras; None para mensagens de controle.
+        :return: True se a mensagem foi enfileirada ou enviada, False caso contrário.
+        """
+        queue = self.outbound.get(target_socket)
+        if queue is None:
+            return super().send_batch([message], target_socket)
+        return queue.put(message, key=key)
+
+    def send_batch(self, messages, target_socket=None):
+        queue = self.outbound.get(target_socket)
+        if queue is None:
+            return super().send_batch(messages, target_socket)
+        return all([queue.put(message) for message in messages])
+
+    def enable_compression(self, announcement, target_socket=None, level=6):
+        """
+        Ativa a compressão pela fila de saída: o escritor envia o anúncio e instala o compressor
+        na ordem em que as mensagens foram enfileiradas.
+        """
+        queue = self.outbound.get(target_socket)
+        if queue is None:
+            return super().enable_compression(announcement, target_socket, level)
+        return queue.put_action(partial(ConnectionManager.enable_compression, self, announcement, target_socket, level))
+
     def list_active_threads(self):
         """
         Lista as threads ativas no servidor.
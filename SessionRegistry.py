@@ -0,0 +1,310 @@
+import secrets
+import threading
+import time
+from collections import deque
+
+class Monitor:
+    """
+    Monitor de um cliente: uma inscrição no sampler com as opções de envio.
+    """
+    __slots__ = ("task_id", "metric", "interval", "type", "mode", "batch", "flush",
+                 "pending", "pending_since", "pending_encoding", "filter", "delta")
+
+    def __init__(self, task_id, metric, interval, monitor_type, mode, batch, flush, sample_filter=None):
+        """
+        :param task_id: ID do monitor, único na sessão.
+        :param metric: Nome da métrica, ou tupla de métricas de uma assinatura.
+        :param interval: Intervalo entre as coletas, em segundos.
+        :param monitor_type: Descrição do monitor exibida ao cliente.
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :param batch: Amostras por mensagem (-b=).
+        :param flush: Espera máxima do lote, em segundos (-f=), ou 0.
+        :param sample_filter: Filtro de entrega (SampleFilter), ou None.
+        """
+        self.task_id = task_id
+        self.metric = metric
+        self.interval = interval
+        self.type = monitor_type
+        self.mode = mode
+        self.batch = batch
+        self.flush = flush
+        self.filter = sample_filter
+
+        # Lote em formação: itens, instante da primeira amostra e codificação (formato, delta) dos itens
+        self.pending = []
+        self.pending_since = 0.0
+        self.pending_encoding = None
+        # Estado do delta por métrica: {métrica: [amostras enviadas, último vetor]}, ou None até o primeiro envio
+        self.delta = None
+
+
+class Session:
+    """
+    Sessão de um cliente conectado: monitores, formato e opções de stream.
+
+    Os monitores ficam em um dicionário por ID, então busca e remoção são O(1). Leituras (ex.: a entrega
+    das amostras) não usam lock; o lock da sessão só protege as alterações, e nunca é segurado durante
+    uma chamada de rede.
+
+    Quando a conexão cai, a sessão pode ficar desconectada (connection None) por um período de graça,
+    guardando no backlog as mensagens geradas enquanto isso, até ser retomada pelo token (/resume).
+    """
+    __slots__ = ("client_id", "token", "connection", "monitors", "monitors_count", "format", "stream", "replay",
+                 "backlog", "deadline", "lock")
+
+    # Mensagens guardadas, no máximo, enquanto a sessão está desconectada (as mais antigas são descartadas)
+    BACKLOG = 1024
+
+    def __init__(self, client_id, connection, lock=None):
+        """
+        :param client_id: ID do cliente ('host:porta').
+        :param connection: Socket do cliente (ou AsyncConnection no motor asyncio).
+        :param lock: Lock da sessão; por padrão, um threading.Lock.
+        """
+        self.client_id = client_id
+        # Identifica a sessão entre conexões: é o que o cliente informa no /resume
+        self.token = secrets.token_urlsafe(16)
+        self.connection = connection
+        self.monitors = {}
+        self.monitors_count = 0
+        self.format = "text"
+        # Substituído inteiro a cada /stream, para que quem lê veja sempre um conjunto consistente
+        self.stream = {"delta": False, "resync": 30, "zlib": False}
+        self.replay = None
+        self.backlog = None
+        self.deadline = None
+        self.lock = lock or threading.Lock()
+
+    def add_monitor(self, metric, interval, monitor_type, mode, batch, flush, sample_filter=None):
+        """
+        Cria um monitor com o próximo ID da sessão.
+
+        :rtype: Monitor
+        """
+        with self.lock:
+            task_id = f"{self.monitors_count}"
+            self.monitors_count += 1
+            monitor = Monitor(task_id, metric, interval, monitor_type, mode, batch, flush, sample_filter)
+            self.monitors[task_id] = monitor
+        return monitor
+
+    def remove_monitor(self, task_id):
+        """
+        Remove um monitor.
+
+        :return: O monitor removido, ou None se não existia.
+        :rtype: Monitor | None
+        """
+        with self.lock:
+            return self.monitors.pop(task_id, None)
+
+    def take_monitors(self):
+        """
+        Remove e retorna todos os monitores de uma vez (encerramento da sessão).
+
+        :rtype: list[Monitor]
+        """
+        with self.lock:
+            monitors = list(self.monitors.values())
+            self.monitors = {}
+        return monitors
+
+    def buffer(self, message, key=None):
+        """
+        Guarda uma mensagem no backlog se a sessão estiver desconectada.
+
+        :return: A conexão atual, se a mensagem deve ser enviada por ela; None se a mensagem foi guardada.
+        """
+        connection = self.connection
+        if connection is not None:
+            return connection
+        with self.lock:
+            if self.connection is None:
+                self.backlog.append((message, key))
+                return None
+            return self.connection
+
+    def take_backlog(self):
+        """
+        Retira as mensagens guardadas de uma sessão desconectada. A sessão continua desconectada: as
+        mensagens geradas enquanto isso vão para um backlog novo, retirado depois por attach().
+
+        :rtype: collections.deque
+        """
+        with self.lock:
+            backlog = self.backlog
+            self.backlog = deque(maxlen=self.BACKLOG)
+        return backlog
+
+    def attach(self, connection):
+        """
+        Publica a conexão de uma sessão retomada, se nada chegou ao backlog desde a última retirada.
+        Senão, retira as mensagens novas e deixa a conexão para a próxima chamada, para que elas
+        sejam enfileiradas, fora do lock, antes de qualquer amostra enviada direto pela conexão.
+
+        :return: None se a conexão foi publicada; senão, as mensagens que chegaram nesse meio-tempo.
+        :rtype: collections.deque | None
+        """
+        with self.lock:
+            if self.backlog:
+                backlog = self.backlog
+                self.backlog = deque(maxlen=self.BACKLOG)
+                return backlog
+            self.backlog = None
+            self.connection = connection
+        return None
+
+    def swap_replay(self, expected, replay):
+        """
+        Troca a reprodução do log em andamento, se ela ainda for 'expected'.
+
+        :return: True se a troca foi feita.
+        :rtype: bool
+        """
+        with self.lock:
+            if self.replay is not expected:
+                return False
+            self.replay = replay
+            return True
+
+
+class SessionRegistry:
+    """
+    Registro das sessões dos clientes, dividido em shards por ID de cliente. Cada shard tem o seu
+    próprio lock, então conexões e desconexões de clientes diferentes raramente disputam o mesmo mutex,
+    e a busca por ID não usa lock.
+    """
+    SHARDS = 16
+
+    def __init__(self, shards=SHARDS, lock_factory=threading.Lock):
+        """
+        :param shards: Quantidade de shards.
+        :param lock_factory: Cria os locks dos shards e das sessões (ex.: InstrumentedLock, para medir a espera).
+        """
+        if shards <= 0:
+            raise ValueError("Shards must be greater than 0")
+        self.lock_factory = lock_factory
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [lock_factory() for _ in range(shards)]
+        # Sessões registradas pelo token, para a retomada de uma sessão cuja queda o servidor ainda não percebeu
+        self._tokens = {}
+
+        # Sessões desconectadas esperando /resume: {token: sessão}
+        self._detached = {}
+        self._detached_lock = threading.Lock()
+
+    def _index(self, client_id):
+        return hash(client_id) % len(self._shards)
+
+    def create(self, client_id, connection):
+        """
+        Registra uma nova sessão.
+
+        :rtype: Session
+        """
+        session = Session(client_id, connection, self.lock_factory())
+        self.add(session)
+        return session
+
+    def add(self, session):
+        """
+        Registra uma sessão pelo seu client_id.
+        """
+        index = self._index(session.client_id)
+        with self._locks[index]:
+            self._shards[index][session.client_id] = session
+            self._tokens[session.token] = session
+
+    def get(self, client_id):
+        """
+        Busca uma sessão pelo ID do cliente, sem lock.
+
+        :rtype: Session | None
+        """
+        return self._shards[self._index(client_id)].get(client_id)
+
+    def remove(self, client_id):
+        """
+        Remove uma sessão do registro.
+
+        :return: A sessão removida, ou None se ela não existia.
+        :rtype: Session | None
+        """
+        index = self._index(client_id)
+        with self._locks[index]:
+            session = self._shards[index].pop(client_id, None)
+            if session is not None and self._tokens.get(session.token) is session:
+                del self._tokens[session.token]
+            return session
+
+    def find_token(self, token):
+        """
+        Busca uma sessão registrada (com conexão) pelo token, sem lock.
+
+        :rtype: Session | None
+        """
+        return self._tokens.get(token)
+
+    def detach(self, client_id, grace):
+        """
+        Tira uma sessão do registro sem encerrar os monitores: ela fica guardada pelo token por 'grace'
+        segundos, acumulando as mensagens no backlog, até ser retomada ou expirar.
+
+        :return: A sessão desconectada, ou None se ela não existia.
+        :rtype: Session | None
+        """
+        session = self.remove(client_id)
+        if session is None:
+            return None
+        with session.lock:
+            session.connection = None
+            session.backlog = deque(maxlen=Session.BACKLOG)
+            session.deadline = time.monotonic() + grace
+        with self._detached_lock:
+            self._detached[session.token] = session
+        return session
+
+    def take_detached(self, token):
+        """
+        Retira uma sessão desconectada pelo token, se ela ainda não expirou.
+
+        :rtype: Session | None
+        """
+        with self._detached_lock:
+            session = self._detached.get(token)
+            if session is None or session.deadline <= time.monotonic():
+                return None
+            del self._detached[token]
+        session.deadline = None
+        return session
+
+    def expire(self):
+        """
+        Retira as sessões desconectadas cujo período de graça acabou.
+
+        :rtype: list[Session]
+        """
+        now = time.monotonic()
+        with self._detached_lock:
+            expired = [session for session in self._detached.values() if session.deadline <= now]
+            for session in expired:
+                del self._detached[session.token]
+        return expired
+
+    def detached_count(self):
+        return len(self._detached)
+
+    def sessions(self):
+        """
+        Cópia das sessões registradas, para percorrer sem segurar nenhum lock.
+
+        :rtype: list[Session]
+        """
+        sessions = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                sessions.extend(shard.values())
+        return sessions
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
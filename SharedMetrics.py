@@ -0,0 +1,220 @@
+import mmap
+import os
+import struct
+import time
+from functools import partial
+from MetricHistory import MetricHistory
+
+class SharedMetricsWriter:
+    """
+    Publica as amostras do sampler em um segmento de memória compartilhada (arquivo mapeado com mmap,
+    por padrão em /dev/shm), para que processos locais leiam as métricas sem passar pelo socket.
+
+    Layout (little-endian):
+    - Cabeçalho: magic, versão, quantidade de métricas, capacidade do histórico e tamanho do segmento.
+    - Diretório: uma entrada por métrica, com nome, campos, tamanho do slot, offset dos slots
+      e o total de amostras gravadas.
+    - Slots: histórico circular de 'capacity' slots por métrica, cada um com
+      (sequência, timestamp, valores dos campos).
+
+    Cada slot é protegido por um seqlock: a sequência fica ímpar enquanto o slot é escrito e volta a ser
+    par no fim. O leitor copia o slot e confere se a sequência é par e não mudou; senão, lê de novo.
+    Há um único escritor por segmento, então o escritor nunca espera pelos leitores.
+    """
+    MAGIC = b"SMSH"
+    VERSION = 1
+    HEADER = struct.Struct("<4sIIIQ")
+    # nome, campos separados por vírgula, quantidade de campos, tamanho do slot, offset dos slots, amostras gravadas
+    ENTRY = struct.Struct("<16s192sIIQQ")
+    WRITTEN = struct.Struct("<Q")
+    WRITTEN_OFFSET = ENTRY.size - WRITTEN.size
+    SEQUENCE = struct.Struct("<Q")
+
+    DEFAULT_PATH = "/dev/shm/system-monitor" if os.path.isdir("/dev/shm") else "system-monitor.shm"
+
+    def __init__(self, path=DEFAULT_PATH, capacity=60, fields=MetricHistory.FIELDS):
+        """
+        :param path: Arquivo do segmento; é criado (ou recriado) com o tamanho do layout.
+        :param capacity: Amostras guardadas por métrica.
+        :param fields: Métricas e seus campos publicados.
+        """
+        if capacity <= 0:
+            raise ValueError("Capacity must be greater than 0")
+        self.path = path
+        self.capacity = capacity
+
+        # métrica -> [offset da entrada, offset dos slots, struct do slot, amostras gravadas]
+        self._metrics = {}
+        offset = self.HEADER.size + self.ENTRY.size * len(fields)
+        entries = []
+        for index, (metric, names) in enumerate(fields.items()):
+            slot = struct.Struct(f"<Qd{len(names)}d")
+            entry_offset = self.HEADER.size + self.ENTRY.size * index
+            self._metrics[metric] = [entry_offset, offset, slot, 0]
+            entries.append((entry_offset, metric, names, slot, offset))
+            offset += slot.size * capacity
+        self.size = offset
+
+        # Cria o arquivo com outro nome e renomeia no fim, para que um leitor nunca veja o segmento pela metade
+        temporary = f"{path}.{os.getpid()}.tmp"
+        descriptor = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(descriptor, self.size)
+            self.buffer = mmap.mmap(descriptor, self.size)
+        finally:
+            os.close(descriptor)
+
+        self.HEADER.pack_into(self.buffer, 0, self.MAGIC, self.VERSION, len(fields), capacity, self.size)
+        for entry_offset, metric, names, slot, slots_offset in entries:
+            self.ENTRY.pack_into(
+                self.buffer, entry_offset,
+                metric.encode("ascii"), ",".join(names).encode("ascii"), len(names), slot.size, slots_offset, 0
+            )
+        os.replace(temporary, path)
+
+    def append(self, metric, timestamp, values):
+        """
+        Grava uma amostra no próximo slot da métrica, protegida pelo seqlock do slot.
+        """
+        state = self._metrics[metric]
+        entry_offset, slots_offset, slot, written = state
+        position = slots_offset + slot.size * (written % self.capacity)
+
+        sequence = self.SEQUENCE.unpack_from(self.buffer, position)[0]
+        self.SEQUENCE.pack_into(self.buffer, position, sequence + 1)
+        slot.pack_into(self.buffer, position, sequence + 1, timestamp, *values)
+        self.SEQUENCE.pack_into(self.buffer, position, sequence + 2)
+
+        # O total só avança depois que o slot está completo
+        state[3] = written + 1
+        self.WRITTEN.pack_into(self.buffer, entry_offset + self.WRITTEN_OFFSET, written + 1)
+
+    def record(self, metric, sample):
+        """
+        Callback do sampler: publica os campos de MetricHistory.FIELDS da amostra.
+        """
+        self.append(metric, sample["timestamp"], MetricHistory.values(metric, sample))
+
+    def subscribe(self, sampler, interval):
+        """
+        Inscreve o segmento no sampler para todas as métricas publicadas.
+        """
+        for metric in self._metrics:
+            sampler.subscribe(metric, interval, ("shared", metric), partial(self.record, metric))
+
+    def close(self, unlink=True):
+        self.buffer.close()
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class SharedMetricsReader:
+    """
+    Leitor do segmento publicado por SharedMetricsWriter. Depois do mmap, cada leitura é só acesso
+    à memória: nenhuma chamada de sistema e nenhuma cópia além da desserialização do slot.
+
+    Exemplo:
+        reader = SharedMetricsReader()
+        reader.latest("cpu")         # {"timestamp": ..., "cpu_percent": ..., "load_1m": ...}
+        reader.history("mem", 10)    # últimas 10 amostras, da mais antiga para a mais recente
+    """
+    RETRIES = 1000
+
+    def __init__(self, path=SharedMetricsWriter.DEFAULT_PATH):
+        with open(path, "rb") as segment:
+            self.buffer = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, self.capacity, _ = SharedMetricsWriter.HEADER.unpack_from(self.buffer, 0)
+        if magic != SharedMetricsWriter.MAGIC or version != SharedMetricsWriter.VERSION:
+            self.buffer.close()
+            raise ValueError(f"'{path}' is not a System Monitor shared segment")
+
+        # métrica -> (offset da entrada, offset dos slots, struct do slot, campos)
+        self._metrics = {}
+        for index in range(count):
+            entry_offset = SharedMetricsWriter.HEADER.size + SharedMetricsWriter.ENTRY.size * index
+            name, fields, field_count, _, slots_offset, _ = SharedMetricsWriter.ENTRY.unpack_from(self.buffer, entry_offset)
+            fields = tuple(fields.rstrip(b"\0").decode("ascii").split(","))
+            self._metrics[name.rstrip(b"\0").decode("ascii")] = (entry_offset, slots_offset, struct.Struct(f"<Qd{field_count}d"), fields)
+
+    @property
+    def metrics(self):
+        return {metric: info[3] for metric, info in self._metrics.items()}
+
+    def written(self, metric):
+        """
+        Total de amostras já publicadas para a métrica.
+        """
+        entry_offset = self._metrics[metric][0]
+        return SharedMetricsWriter.WRITTEN.unpack_from(self.buffer, entry_offset + SharedMetricsWriter.WRITTEN_OFFSET)[0]
+
+    def _read_slot(self, metric, index):
+        """
+        Lê o slot da amostra de número 'index' com o protocolo do seqlock.
+
+        :return: (timestamp, valores) ou None se o slot já foi sobrescrito por uma amostra mais nova.
+        """
+        _, slots_offset, slot, _ = self._metrics[metric]
+        position = slots_offset + slot.size * (index % self.capacity)
+        # A sequência de um slot completo é 2 * (quantas vezes o slot foi escrito)
+        expected = 2 * (index // self.capacity + 1)
+
+        for _ in range(self.RETRIES):
+            sequence, timestamp, *values = slot.unpack_from(self.buffer, position)
+            if sequence & 1:
+                continue
+            if SharedMetricsWriter.SEQUENCE.unpack_from(self.buffer, position)[0] != sequence:
+                continue
+            if sequence != expected:
+                return None
+            return timestamp, values
+        return None
+
+    def latest(self, metric):
+        """
+        Amostra mais recente da métrica.
+
+        :return: Dicionário com 'timestamp' e os campos, ou None se ainda não há amostras.
+        :rtype: dict | None
+        """
+        fields = self._metrics[metric][3]
+        while True:
+            written = self.written(metric)
+            if not written:
+                return None
+            result = self._read_slot(metric, written - 1)
+            if result is not None:
+                timestamp, values = result
+                return {"timestamp": timestamp, **dict(zip(fields, values))}
+
+    def history(self, metric, count=None):
+        """
+        Últimas 'count' amostras da métrica (no máximo a capacidade do segmento), da mais antiga para a mais recente.
+
+        :rtype: list
+        """
+        fields = self._metrics[metric][3]
+        written = self.written(metric)
+        count = min(count or self.capacity, self.capacity, written)
+
+        samples = []
+        for index in range(written - count, written):
+            result = self._read_slot(metric, index)
+            # Slots sobrescritos durante a leitura são ignorados
+            if result is not None:
+                timestamp, values = result
+                samples.append({"timestamp": timestamp, **dict(zip(fields, values))})
+        return samples
+
+    def age(self, metric):
+        """
+        Idade da amostra mais recente, em segundos (None se não há amostras).
+        """
+        sample = self.latest(metric)
+        return None if sample is None else time.time() - sample["timestamp"]
+
+    def close(self):
+        self.buffer.close()
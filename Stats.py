@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import deque
+
+class LatencyHistogram:
+    """
+    Histograma de latências com buckets em potências de 2 (em microssegundos).
+    Registrar um valor custa um incremento em uma lista de tamanho fixo.
+    """
+    BUCKETS = 32
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        microseconds = int(seconds * 1_000_000)
+        bucket = min(microseconds.bit_length(), self.BUCKETS - 1)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, fraction):
+        """
+        Estimativa do percentil, em segundos (limite superior do bucket).
+        """
+        with self._lock:
+            target = self.count * fraction
+            seen = 0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if count and seen >= target:
+                    return min((1 << bucket) / 1_000_000, self.max)
+        return 0.0
+
+    def summary(self):
+        """
+        Resumo do histograma em milissegundos.
+        """
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count * 1000,
+            "p50": self.percentile(0.50) * 1000,
+            "p99": self.percentile(0.99) * 1000,
+            "max": self.max * 1000,
+        }
+
+
+class InstrumentedLock:
+    """
+    Lock que mede o tempo de espera para ser adquirido. Pode ser usado no lugar de threading.Lock.
+    """
+    def __init__(self, histogram):
+        self._lock = threading.Lock()
+        self.histogram = histogram
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self.histogram.record(time.perf_counter() - started)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ClientCounters:
+    """
+    Contadores de envio de um cliente.
+    """
+    __slots__ = ("client_id", "bytes_sent", "messages_sent")
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.bytes_sent = 0
+        self.messages_sent = 0
+
+
+class ServerStats:
+    """
+    Instrumentação do servidor: contadores e histogramas baratos o bastante para ficarem sempre ligados.
+    """
+    ACCEPT_WINDOW = 10
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.accepted = 0
+        self.rejected = 0
+        # Conexões derrubadas por ficarem tempo demais sem enviar nada (cliente morto)
+        self.timed_out = 0
+        self._recent_accepts = deque(maxlen=4096)
+
+        # Contadores por conexão (chave: socket ou AsyncConnection)
+        self.clients = {}
+        self.queues = {}
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        # Frames de amostras montados uma vez por disparo (built) e reaproveitados por outros inscritos (shared)
+        self.frames_built = 0
+        self.frames_shared = 0
+
+        self.send_latency = LatencyHistogram()
+        self.lock_wait = LatencyHistogram()
+        self.sampling = {}
+        self._lock = threading.Lock()
+
+    def record_accept(self):
+        self.accepted += 1
+        self._recent_accepts.append(time.monotonic())
+
+    def record_reject(self):
+        self.rejected += 1
+
+    def record_timeout(self):
+        self.timed_out += 1
+
+    def record_shared_frame(self, reused):
+        if reused:
+            self.frames_shared += 1
+        else:
+            self.frames_built += 1
+
+    def register_client(self, connection, client_id):
+        with self._lock:
+            self.clients[connection] = ClientCounters(client_id)
+
+    def attach_queue(self, connection, queue):
+        """
+        Associa a fila de saída (OutboundQueue) de uma conexão, para expor profundidade e descartes.
+        """
+        with self._lock:
+            self.queues[connection] = queue
+
+    def forget_client(self, connection):
+        with self._lock:
+            self.clients.pop(connection, None)
+            self.queues.pop(connection, None)
+
+    def record_send(self, connection, size, messages, seconds):
+        """
+        Registra uma chamada de envio: bytes, mensagens e duração.
+        """
+        self.send_latency.record(seconds)
+        with self._lock:
+            self.bytes_sent += size
+            self.messages_sent += messages
+            counters = self.clients.get(connection)
+            if counters is not None:
+                counters.bytes_sent += size
+                counters.messages_sent += messages
+
+    def record_sampling(self, metric, seconds):
+        """
+        Registra a duração de uma coleta do sampler.
+        """
+        histogram = self.sampling.get(metric)
+        if histogram is None:
+            with self._lock:
+                histogram = self.sampling.setdefault(metric, LatencyHistogram())
+        histogram.record(seconds)
+
+    def accept_rate(self):
+        """
+        Conexões aceitas por segundo: média desde o início e nos últimos ACCEPT_WINDOW segundos.
+        """
+        now = time.monotonic()
+        uptime = max(now - self.started, 1e-9)
+        recent = sum(1 for accepted_at in list(self._recent_accepts) if now - accepted_at <= self.ACCEPT_WINDOW)
+        return self.accepted / uptime, recent / self.ACCEPT_WINDOW
+
+    def snapshot(self):
+        """
+        Retorna todas as estatísticas em um dicionário serializável.
+        """
+        average_rate, recent_rate = self.accept_rate()
+        with self._lock:
+            clients = {}
+            for connection, counters in self.clients.items():
+                clients[counters.client_id] = {"bytes_sent": counters.bytes_sent, "messages_sent": counters.messages_sent}
+                queue = self.queues.get(connection)
+                if queue is not None:
+                    clients[counters.client_id]["queue"] = queue.snapshot()
+            bytes_sent = self.bytes_sent
+            messages_sent = self.messages_sent
+            sampling = dict(self.sampling)
+
+        return {
+            "uptime_s": time.monotonic() - self.started,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "accept_rate": {"average": average_rate, "recent": recent_rate},
+            "bytes_sent": bytes_sent,
+            "messages_sent": messages_sent,
+            "frames": {"built": self.frames_built, "shared": self.frames_shared},
+            "clients": clients,
+            "send_latency_ms": self.send_latency.summary(),
+            "lock_wait_ms": self.lock_wait.summary(),
+            "sampling_ms": {metric: histogram.summary() for metric, histogram in sampling.items()},
+        }
+
+    @staticmethod
+    def format_histogram(name, summary):
+        if not summary.get("count"):
+            return f"{name}: no data"
+        return (
+            f"{name}: n={summary['count']}, mean={summary['mean']:.3f}ms, "
+            f"p50={summary['p50']:.3f}ms, p99={summary['p99']:.3f}ms, max={summary['max']:.3f}ms"
+        )
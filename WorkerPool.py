@@ -0,0 +1,283 @@
+import multiprocessing
+import pickle
+import threading
+import time
+from functools import partial
+from Colors import Colors
+from OutboundQueue import OutboundQueue
+
+class SamplerHub:
+    """
+    Lado do processo principal no modo com workers: roda o único Sampler do servidor e publica
+    cada amostra uma vez para todos os workers interessados no grupo (métrica, intervalo).
+    Cada worker tem uma fila limitada e uma thread escritora, então um worker lento não atrasa a coleta.
+    """
+    JITTER_PERIOD = 1.0
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self._links = []
+        # (métrica, intervalo) -> índices dos workers inscritos
+        self._demand = {}
+        self.lock = threading.Lock()
+        self.running = False
+
+    def add_worker(self, connection):
+        """
+        Registra a ponta do pipe de um worker e inicia as threads que atendem esse worker.
+        """
+        link = {"connection": connection, "queue": OutboundQueue(max_messages=4096, policy="drop_oldest")}
+        index = len(self._links)
+        self._links.append(link)
+
+        for target, name in ((self._serve, "Hub-reader"), (self._write, "Hub-writer")):
+            thread = threading.Thread(target=target, args=(index, link), name=f"{name}-{index}")
+            thread.daemon = True
+            thread.start()
+
+    def start(self):
+        """
+        Inicia a publicação periódica das estatísticas do agendador para os workers.
+        """
+        self.running = True
+        thread = threading.Thread(target=self._publish_jitter, name="Hub-jitter")
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """
+        Pede para todos os workers encerrarem.
+        """
+        self.running = False
+        message = pickle.dumps(("stop",), pickle.HIGHEST_PROTOCOL)
+        for link in self._links:
+            link["queue"].put(message)
+            link["queue"].close()
+
+    def _serve(self, index, link):
+        """
+        Recebe as inscrições de um worker. O sampler só é inscrito no primeiro pedido de cada grupo
+        e cancelado quando nenhum worker precisa mais dele.
+        """
+        try:
+            while True:
+                operation, metric, interval = link["connection"].recv()
+                with self.lock:
+                    if operation == "subscribe":
+                        self._add_demand(index, metric, interval)
+                    elif operation == "unsubscribe":
+                        self._remove_demand(index, metric, interval)
+        except (EOFError, OSError):
+            pass
+
+        # Worker encerrado: remove todas as inscrições dele
+        with self.lock:
+            for metric, interval in list(self._demand):
+                self._remove_demand(index, metric, interval)
+        link["queue"].discard()
+
+    def _add_demand(self, index, metric, interval):
+        workers = self._demand.get((metric, interval))
+        if workers is None:
+            workers = self._demand[(metric, interval)] = set()
+            self.sampler.subscribe(metric, interval, ("hub",), partial(self._publish, metric, interval))
+        workers.add(index)
+
+    def _remove_demand(self, index, metric, interval):
+        workers = self._demand.get((metric, interval))
+        if workers is None:
+            return
+        workers.discard(index)
+        if not workers:
+            del self._demand[(metric, interval)]
+            self.sampler.unsubscribe(metric, interval, ("hub",))
+
+    def _publish(self, metric, interval, sample):
+        """
+        Callback do sampler: serializa a amostra uma única vez e a enfileira para cada worker inscrito.
+        """
+        payload = pickle.dumps(("sample", metric, interval, sample), pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            workers = list(self._demand.get((metric, interval), ()))
+        for index in workers:
+            self._links[index]["queue"].put(payload, key=(metric, interval))
+
+    def _write(self, index, link):
+        """
+        Escritor do pipe de um worker.
+        """
+        connection = link["connection"]
+        while True:
+            batch = link["queue"].get_batch()
+            if batch is None:
+                return
+            try:
+                for payload in batch:
+                    connection.send_bytes(payload)
+            except (OSError, ValueError):
+                link["queue"].discard()
+                return
+
+    def _publish_jitter(self):
+        while self.running:
+            time.sleep(self.JITTER_PERIOD)
+            message = pickle.dumps(("jitter", self.sampler.scheduler.jitter_stats()), pickle.HIGHEST_PROTOCOL)
+            for link in self._links:
+                link["queue"].put(message)
+
+
+class RemoteJitter:
+    """
+    Últimas estatísticas de jitter do agendador do processo principal, vistas por um worker.
+    """
+    def __init__(self):
+        self.stats = {"ticks": 0, "last": 0.0, "mean": 0.0, "p99": 0.0, "max": 0.0}
+
+    def jitter_stats(self):
+        return dict(self.stats)
+
+
+class RemoteSampler:
+    """
+    Sampler de um worker: tem a mesma API do Sampler, mas as coletas acontecem no processo principal
+    (SamplerHub). O worker inscreve cada grupo uma única vez e distribui as amostras recebidas
+    para os seus próprios inscritos.
+    """
+    def __init__(self, connection, collectors):
+        self.connection = connection
+        self.collectors = dict.fromkeys(collectors)
+        self.scheduler = RemoteJitter()
+
+        # (métrica, intervalo) -> {chave: callback}
+        self._groups = {}
+        self.lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="RemoteSampler")
+        thread.daemon = True
+        thread.start()
+
+    def attach_loop(self, loop):
+        """
+        As amostras chegam pela thread do pipe; o motor asyncio aceita envios de outras threads.
+        """
+
+    def _send(self, message):
+        with self._send_lock:
+            self.connection.send(message)
+
+    def subscribe(self, metric, interval, key, callback):
+        names = metric if isinstance(metric, tuple) else (metric,)
+        for name in names:
+            if name not in self.collectors:
+                raise ValueError(f"Unknown metric '{name}'")
+
+        with self.lock:
+            group = self._groups.get((metric, interval))
+            if group is None:
+                group = self._groups[(metric, interval)] = {}
+                self._send(("subscribe", metric, interval))
+            group[key] = callback
+
+    def unsubscribe(self, metric, interval, key):
+        with self.lock:
+            group = self._groups.get((metric, interval))
+            if group is None or key not in group:
+                return False
+            del group[key]
+            if not group:
+                del self._groups[(metric, interval)]
+                self._send(("unsubscribe", metric, interval))
+            return True
+
+    def active_groups(self):
+        with self.lock:
+            return {group_key: len(group) for group_key, group in self._groups.items()}
+
+    def _run(self):
+        """
+        Lê as mensagens do processo principal: amostras, estatísticas do agendador e o pedido de parada.
+        """
+        try:
+            while True:
+                message = pickle.loads(self.connection.recv_bytes())
+                if message[0] == "sample":
+                    _, metric, interval, sample = message
+                    with self.lock:
+                        subscribers = list(self._groups.get((metric, interval), {}).values())
+                    for callback in subscribers:
+                        try:
+                            callback(sample)
+                        except Exception as e:
+                            Colors.error(f"Error delivering {metric} sample: {e}")
+                elif message[0] == "jitter":
+                    self.scheduler.stats = message[1]
+                elif message[0] == "stop":
+                    break
+        except (EOFError, OSError):
+            pass
+        self.stopped.set()
+
+
+class WorkerPool:
+    """
+    Pool de processos do servidor. Cada worker escuta na mesma porta com SO_REUSEPORT e atende
+    as suas conexões com o motor escolhido; o processo principal roda o sampler compartilhado
+    e guarda o semáforo que aplica o limite de conexões no servidor todo.
+    """
+    def __init__(self, workers, sampler, target, args=()):
+        """
+        :param workers: Quantidade de processos.
+        :param sampler: Sampler do processo principal.
+        :param target: Função de entrada do worker, chamada com (índice, pipe, semáforo, nomes das métricas, *args).
+        :param args: Argumentos adicionais para a função de entrada.
+        """
+        if workers <= 0:
+            raise ValueError("Workers must be greater than 0")
+        self.workers = workers
+        self.hub = SamplerHub(sampler)
+        self.target = target
+        self.args = args
+        self.processes = []
+
+    def start(self, connection_limits):
+        """
+        Cria o semáforo global de conexões e inicia os workers.
+        """
+        semaphore = multiprocessing.BoundedSemaphore(connection_limits)
+        collectors = list(self.hub.sampler.collectors)
+
+        for index in range(self.workers):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=self.target,
+                args=(index, child_connection, semaphore, collectors) + tuple(self.args),
+                name=f"Worker-{index}"
+            )
+            process.daemon = True
+            process.start()
+            child_connection.close()
+            self.hub.add_worker(parent_connection)
+            self.processes.append(process)
+
+        self.hub.start()
+
+    def stop(self, timeout=3):
+        """
+        Encerra os workers, esperando cada um terminar as suas conexões.
+        """
+        self.hub.stop()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def list_workers(self):
+        """
+        Lista os processos do pool.
+        """
+        for process in self.processes:
+            state = "alive" if process.is_alive() else f"exited ({process.exitcode})"
+            Colors.info(f" - {process.name} (pid {process.pid}): {state}")
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+import psutil
+from Colors import Colors
+from Collectors import PsutilBackend, ProcBackend
+from FrameDecoder import FrameDecoder
+from SampleCodec import SampleCodec
+
+class Benchmark:
+    """
+    Gerador de carga e medidor de latência do servidor. Sobe um server.py local em um processo
+    separado e conecta N clientes sintéticos (coroutines), cada um com M monitores.
+    Todos os resultados são salvos em JSON para comparação entre versões.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.server_process = None
+
+        # Medições brutas, em segundos
+        self.setup_times = []
+        self.command_rtts = []
+        self.delivery_latencies = []
+        self.jitters = []
+        self.samples = 0
+        self.bytes_received = 0
+        self.failed_clients = 0
+        self.ready_clients = 0
+        self.measure_started = None
+
+        self.server_rss = []
+        self.server_threads = []
+
+    @staticmethod
+    def percentiles(values):
+        """
+        Resumo de uma lista de medições em milissegundos (p50, p99, p999, média e máximo).
+        """
+        if not values:
+            return {"count": 0}
+
+        ordered = sorted(values)
+
+        def at(fraction):
+            return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * fraction) - 1)] * 1000
+
+        return {
+            "count": len(ordered),
+            "p50": at(0.50),
+            "p99": at(0.99),
+            "p999": at(0.999),
+            "mean": sum(ordered) / len(ordered) * 1000,
+            "max": ordered[-1] * 1000,
+        }
+
+    def start_server(self):
+        """
+        Inicia o servidor em um processo separado e espera a porta aceitar conexões.
+        """
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+                   "--host", "127.0.0.1", "--port", str(self.args.port), "--engine", self.args.engine,
+                   # Os clientes sintéticos só leem durante a medição e não respondem aos heartbeats
+                   "--idle-timeout", "0"]
+        self.server_process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True)
+
+        # Limite de conexões pedido pelo servidor na inicialização (com folga para os clientes do benchmark)
+        self.server_process.stdin.write(f"{self.args.clients + 10}\n")
+        self.server_process.stdin.flush()
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.args.port), timeout=0.5):
+                    pass
+                # Conexão de teste fecha na hora; dá tempo para o servidor liberar o slot
+                time.sleep(0.2)
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("Server did not start")
+
+    def stop_server(self):
+        if self.server_process is None:
+            return
+        try:
+            self.server_process.stdin.write("exit\n")
+            self.server_process.stdin.flush()
+            self.server_process.wait(timeout=3)
+        except Exception:
+            self.server_process.kill()
+
+    async def watch_server(self, stop_event):
+        """
+        Mede RSS e quantidade de threads do processo do servidor uma vez por segundo.
+        """
+        process = psutil.Process(self.server_process.pid)
+        while not stop_event.is_set():
+            try:
+                self.server_rss.append(process.memory_info().rss)
+                self.server_threads.append(process.num_threads())
+            except psutil.Error:
+                return
+            try:
+                await asyncio.wait_for(stop_event.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_client(self, index, start_barrier):
+        """
+        Cliente sintético: conecta, negocia o formato binário, abre M monitores e mede as amostras recebidas.
+        """
+        args = self.args
+        decoder = FrameDecoder()
+
+        try:
+            started = time.perf_counter()
+            reader, writer = await asyncio.open_connection("127.0.0.1", args.port)
+
+            async def read_frame():
+                while not decoder.has_frames():
+                    data = await reader.read(65536)
+                    if not data:
+                        raise ConnectionError("Server closed the connection")
+                    self.bytes_received += len(data)
+                    decoder.feed(data)
+                return decoder.next_frame()
+
+            async def command(text, expected):
+                # Envia um comando e espera a resposta que contém 'expected', ignorando amostras no meio do caminho
+                sent = time.perf_counter()
+                writer.write(FrameDecoder.encode(text))
+                await writer.drain()
+                while True:
+                    frame = await read_frame()
+                    if not SampleCodec.is_binary(frame) and expected in frame.decode("utf-8", "replace"):
+                        self.command_rtts.append(time.perf_counter() - sent)
+                        return
+
+            # Mensagem de boas-vindas e ajuda
+            await read_frame()
+            self.setup_times.append(time.perf_counter() - started)
+            await read_frame()
+
+            await command("/format binary", "Sample format set")
+            metrics = args.metrics.split(",")
+            for monitor in range(args.monitors):
+                metric = metrics[monitor % len(metrics)]
+                batching = f" -b={args.batch}" if args.batch > 1 else ""
+                await command(f"/{metric} -t={args.interval:g} -m={args.mode}{batching}", "monitoring started")
+            self.ready_clients += 1
+        except (OSError, ConnectionError) as e:
+            self.failed_clients += 1
+            Colors.error(f"Client {index} failed during setup: {e}")
+            return
+
+        await start_barrier.wait()
+
+        last_arrival = {}
+        next_probe = time.perf_counter() + 1
+        probe_sent = None
+        deadline = time.perf_counter() + args.duration
+        try:
+            while time.perf_counter() < deadline:
+                # Sonda de RTT durante a carga: um /monitors por segundo, com no máximo um pendente
+                if probe_sent is None and time.perf_counter() >= next_probe:
+                    probe_sent = time.perf_counter()
+                    writer.write(FrameDecoder.encode("/monitors"))
+
+                try:
+                    frame = await asyncio.wait_for(read_frame(), max(0.01, deadline - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    break
+
+                received = time.time()
+                if SampleCodec.is_binary(frame):
+                    records = SampleCodec.split_batch(frame) if frame[0] == SampleCodec.BATCH_MAGIC else [frame]
+                    arrival = time.perf_counter()
+                    for record in records:
+                        _, _, _, _, monitor_id, timestamp = SampleCodec.HEADER.unpack_from(record, 0)
+                        if timestamp < self.measure_started:
+                            # Amostra coletada antes do início da medição (ficou no buffer durante o setup)
+                            continue
+                        self.samples += 1
+                        self.delivery_latencies.append(max(0.0, received - timestamp))
+
+                    # Jitter entre mensagens do mesmo monitor (com lotes, o período esperado é interval * batch)
+                    previous = last_arrival.get(monitor_id)
+                    if previous is not None:
+                        self.jitters.append(abs((arrival - previous) - args.interval * args.batch))
+                    last_arrival[monitor_id] = arrival
+                elif probe_sent is not None and b"Active monitors" in frame:
+                    self.command_rtts.append(time.perf_counter() - probe_sent)
+                    probe_sent = None
+                    next_probe = time.perf_counter() + 1
+        except (OSError, ConnectionError) as e:
+            Colors.error(f"Client {index} disconnected: {e}")
+        finally:
+            writer.close()
+
+    async def run(self):
+        args = self.args
+        stop_event = asyncio.Event()
+        watcher = asyncio.create_task(self.watch_server(stop_event))
+
+        # Todos os clientes começam a medir ao mesmo tempo, depois que todos terminaram o setup
+        start_barrier = asyncio.Event()
+        setup_started = time.perf_counter()
+        clients = [asyncio.create_task(self.run_client(index, start_barrier)) for index in range(args.clients)]
+
+        while self.ready_clients + self.failed_clients < args.clients and time.perf_counter() - setup_started < 60:
+            await asyncio.sleep(0.05)
+        setup_duration = time.perf_counter() - setup_started
+
+        self.bytes_received = 0
+        self.measure_started = time.time()
+        measure_started = time.perf_counter()
+        start_barrier.set()
+        await asyncio.gather(*clients)
+        measured = time.perf_counter() - measure_started
+
+        stop_event.set()
+        await watcher
+        return setup_duration, measured
+
+    def report(self, setup_duration, measured):
+        args = self.args
+        results = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "config": {
+                "clients": args.clients,
+                "monitors_per_client": args.monitors,
+                "interval": args.interval,
+                "batch": args.batch,
+                "metrics": args.metrics,
+                "mode": args.mode,
+                "duration": args.duration,
+                "engine": args.engine,
+            },
+            "failed_clients": self.failed_clients,
+            "setup_duration_s": setup_duration,
+            "connection_setup_ms": self.percentiles(self.setup_times),
+            "command_rtt_ms": self.percentiles(self.command_rtts),
+            "delivery_latency_ms": self.percentiles(self.delivery_latencies),
+            "delivery_jitter_ms": self.percentiles(self.jitters),
+            "samples": self.samples,
+            "samples_per_s": self.samples / measured if measured else 0,
+            "bytes_per_s": self.bytes_received / measured if measured else 0,
+            "server_rss_max_mb": max(self.server_rss, default=0) / (1024**2),
+            "server_threads_max": max(self.server_threads, default=0),
+        }
+
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+        Colors.header("Benchmark results")
+        for key in ("connection_setup_ms", "command_rtt_ms", "delivery_latency_ms", "delivery_jitter_ms"):
+            stats = results[key]
+            if stats["count"]:
+                print(f"{key}: p50={stats['p50']:.3f} p99={stats['p99']:.3f} p999={stats['p999']:.3f} max={stats['max']:.3f} (n={stats['count']})")
+        print(f"samples/s: {results['samples_per_s']:.1f}, bytes/s: {results['bytes_per_s']:.0f}")
+        print(f"server RSS: {results['server_rss_max_mb']:.1f} MB, threads: {results['server_threads_max']}")
+        if self.failed_clients:
+            Colors.warning(f"Failed clients: {self.failed_clients}")
+        Colors.success(f"Results saved to {args.output}")
+        return results
+
+    @staticmethod
+    def collectors(iterations, output):
+        """
+        Microbenchmark dos backends de coleta: mede o custo de cada chamada de cpu e mem,
+        no mesmo processo, sem servidor nem rede.
+        """
+        backends = [PsutilBackend()]
+        try:
+            backends.append(ProcBackend())
+        except (OSError, AttributeError) as e:
+            Colors.warning(f"proc backend unavailable: {e}")
+
+        results = {"date": datetime.now().isoformat(timespec="seconds"), "iterations": iterations, "backends": {}}
+        Colors.header("Collector backends")
+        for backend in backends:
+            results["backends"][backend.name] = {}
+            for metric in ("cpu", "mem"):
+                collect = getattr(backend, metric)
+                state = {}
+                collect(state)
+                durations = []
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    collect(state)
+                    durations.append(time.perf_counter() - started)
+                stats = Benchmark.percentiles(durations)
+                results["backends"][backend.name][metric] = stats
+                print(f"{backend.name:<7} {metric}: mean={stats['mean'] * 1000:.1f}us p50={stats['p50'] * 1000:.1f}us p99={stats['p99'] * 1000:.1f}us")
+            backend.close()
+
+        if len(results["backends"]) > 1:
+            for metric in ("cpu", "mem"):
+                speedup = results["backends"]["psutil"][metric]["mean"] / results["backends"]["proc"][metric]["mean"]
+                Colors.info(f"{metric}: proc is {speedup:.1f}x faster than psutil")
+
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        Colors.success(f"Results saved to {output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load generator and latency benchmark for the System Monitor server")
+    parser.add_argument("--clients", type=int, default=10, help="Number of synthetic clients")
+    parser.add_argument("--monitors", type=int, default=2, help="Monitors per client")
+    parser.add_argument("--interval", type=float, default=1, help="Monitor interval in seconds (-t), e.g. 0.01")
+    parser.add_argument("--batch", type=int, default=1, help="Samples per message (-b)")
+    parser.add_argument("--metrics", default="cpu,mem", help="Metrics used by the monitors, round-robin")
+    parser.add_argument("--mode", choices=["basic", "advanced"], default="basic")
+    parser.add_argument("--duration", type=float, default=10, help="Measurement duration in seconds")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--collectors", type=int, metavar="N", help="Only microbenchmark the collector backends (N calls per metric) and exit")
+    parser.add_argument("--output", default=f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    cli_args = parser.parse_args()
+
+    if cli_args.collectors:
+        Benchmark.collectors(cli_args.collectors, cli_args.output)
+        sys.exit(0)
+
+    benchmark = Benchmark(cli_args)
+    benchmark.start_server()
+    try:
+        setup_duration, measured = asyncio.run(benchmark.run())
+        benchmark.report(setup_duration, measured)
+    except KeyboardInterrupt:
+        Colors.warning("Interrupted by user")
+    finally:
+        benchmark.stop_server()
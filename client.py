@@ -1,19 +1,57 @@
 import threading
+import argparse
+import itertools
 import json
+import re
+import struct
 from Colors import Colors
 from ClientManager import ClientManager
+from CommandParser import CommandParser
+from SampleCodec import SampleCodec
+from SampleFormatter import SampleFormatter
 import time 
 
 class Client:
     """
     Classe que representa o cliente do sistema de monitoramento.
     """
-    def __init__(self,host='127.0.0.1', port=8000):
+    # Comandos que iniciam monitores: são lembrados para serem refeitos se a sessão não puder ser retomada
+    MONITOR_COMMANDS = {"/cpu", "/mem", "/disk", "/net", "/top", "/subscribe"}
+    # IDs de pedido usados pelo próprio cliente (não são exibidos nas respostas)
+    RESUME_REQUEST = "resume"
+    INTERNAL_PREFIX = "auto-"
+    STARTED = re.compile(r"monitoring started with ID: (\S+)$")
+    STOPPED = re.compile(r"^Stopped monitoring \((\S+)\)")
+
+    def __init__(self,host='127.0.0.1', port=8000, sample_format="text", stream_options="", script=None):
         self.connection = ClientManager(host,port)
         self._stop_event = threading.Event()
         self._receiver_thread = None
         self._connection_lock = threading.Lock()
 
+        # Formato das amostras pedido ao servidor e schema recebido na negociação do formato binário
+        self.sample_format = sample_format
+        self.schema = None
+
+        # Opções de stream (/stream) pedidas na conexão e último vetor recebido por monitor no modo delta
+        self.stream_options = stream_options
+        self._delta_state = {}
+
+        # Comandos enviados de uma vez, em um único frame, logo depois da conexão (--script)
+        self.script = script
+
+        # Token da sessão e período de graça informados pelo servidor: se a conexão cair, o cliente
+        # reconecta e retoma a sessão (/resume) com os mesmos monitores
+        self.session_token = None
+        self.resume_grace = 0
+        # Token da sessão nova aberta na reconexão, usado se o /resume for recusado
+        self._fresh_session_token = None
+
+        # Monitores ativos ({ID no servidor: comando}) e comandos de monitor esperando a confirmação ({ID do pedido: comando})
+        self._monitor_commands = {}
+        self._pending_monitors = {}
+        self._request_ids = itertools.count()
+
 
     def start(self):
         """
@@ -31,11 +69,138 @@ class Client:
         self._receiver_thread = threading.Thread(target=self.handle_response)
         self._receiver_thread.start()
 
+        # Os comandos iniciais vão juntos em um único frame, um por linha
+        commands = self.connection_commands()
+        if self.script:
+            commands.append(self.track_commands(self.script))
+        if commands:
+            self.send_message("\n".join(commands))
+
         time.sleep(0.2)
         # Delay de 20ms para que a mensagem inicial de ajuda não seja cortada pelo client
         self.run_client()
         
 
+    def connection_commands(self):
+        """
+        Comandos que configuram cada conexão (formato e opções de stream), enviados na conexão e na retomada.
+
+        :rtype: list[str]
+        """
+        commands = []
+        if self.sample_format != "text":
+            commands.append(f"/format {self.sample_format}")
+        if self.stream_options:
+            commands.append(f"/stream {self.stream_options}")
+        return commands
+
+    def reconnect(self):
+        """
+        Reconecta depois de uma queda e retoma a sessão anterior. O /resume e os comandos da conexão vão
+        em um único frame, então os monitores voltam em uma única ida e volta, seguidos das amostras
+        guardadas pelo servidor durante a queda.
+
+        :return: True se a nova conexão foi estabelecida, False caso contrário.
+        :rtype: bool
+        """
+        deadline = time.monotonic() + self.resume_grace
+        delay = 0.1
+        while not self._stop_event.is_set() and time.monotonic() < deadline:
+            Colors.warning("Connection lost, reconnecting...")
+            connection = ClientManager(self.connection.host, self.connection.port)
+            if connection.connect():
+                # Boas-vindas e ajuda já foram exibidas na primeira conexão; das boas-vindas só interessa
+                # o token da sessão nova, usado se o /resume for recusado
+                welcome = connection.receive_data()
+                if welcome and connection.receive_data():
+                    try:
+                        self._fresh_session_token = json.loads(welcome.decode("utf-8")).get("session")
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        self._fresh_session_token = None
+                    with self._connection_lock:
+                        if self._stop_event.is_set():
+                            connection.close()
+                            return False
+                        # A conexão caída é fechada antes da troca, para não vazar o socket nem ficar marcada como ativa
+                        self.connection.close()
+                        self.connection = connection
+                    # A cadeia de deltas recomeça com um keyframe de cada monitor, e as respostas dos
+                    # comandos enviados antes da queda não vão chegar
+                    self._delta_state = {}
+                    self._pending_monitors = {}
+                    self.send_message("\n".join([f"#{self.RESUME_REQUEST} /resume {self.session_token}"] + self.connection_commands()))
+                    return True
+                connection.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+        return False
+
+    def track_commands(self, text):
+        """
+        Marca os comandos de monitor de um frame com um ID de pedido, para associar cada um ao ID do
+        monitor criado no servidor. Comandos que já têm um ID usam o do usuário.
+
+        :param text: Comandos, um por linha.
+        :type text: str
+        :return: Os comandos, prontos para envio.
+        :rtype: str
+        """
+        lines = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            command = CommandParser.parse(line)
+            if command.error is None and command.name in self.MONITOR_COMMANDS:
+                request_id = command.request_id
+                if request_id is None:
+                    request_id = f"{self.INTERNAL_PREFIX}{next(self._request_ids)}"
+                    line = f"#{request_id} {line.strip()}"
+                self._pending_monitors[request_id] = command.text
+            lines.append(line.strip())
+        return "\n".join(lines)
+
+    def track_response(self, response):
+        """
+        Atualiza os monitores conhecidos com uma resposta do servidor e trata a resposta do /resume.
+
+        :param response: Resposta JSON do servidor.
+        :type response: dict
+        :return: True se a resposta é de um pedido do próprio cliente (o ID não é exibido).
+        :rtype: bool
+        """
+        request_id = response.get("request_id")
+        message = response.get("message", "")
+        success = response.get("status") == "success"
+
+        stopped = self.STOPPED.match(message)
+        if success and stopped:
+            self._monitor_commands.pop(stopped.group(1), None)
+
+        if request_id == self.RESUME_REQUEST:
+            if not success:
+                self.restore_monitors()
+            return True
+
+        command_text = self._pending_monitors.pop(request_id, None) if request_id is not None else None
+        started = self.STARTED.search(message)
+        if command_text is not None and success and started:
+            self._monitor_commands[started.group(1)] = command_text
+        return request_id is not None and request_id.startswith(self.INTERNAL_PREFIX)
+
+    def restore_monitors(self):
+        """
+        A sessão não pôde ser retomada (expirou ou o servidor foi reiniciado): passa a usar a sessão
+        nova da conexão e inicia de novo os monitores que estavam ativos. Os IDs podem mudar.
+        """
+        self.session_token = self._fresh_session_token
+        commands = list(self._monitor_commands.values())
+        self._monitor_commands = {}
+        if not commands:
+            Colors.warning("Session could not be resumed: continuing with a new session.")
+            return
+        Colors.warning(f"Session could not be resumed: starting {len(commands)} monitors again (monitor IDs may change).")
+        self.send_message(self.track_commands("\n".join(commands)))
+
     def header(self):
         """ 
         Exibe o cabeçalho do cliente. 
@@ -72,6 +237,8 @@ class Client:
                 return
 
             self._stop_event.set()
+            # Com /exit o servidor encerra a sessão na hora, em vez de guardá-la esperando um /resume
+            self.send_message("/exit")
             self.connection.running = False
             try:
                 self.connection.shutdown()
@@ -98,17 +265,38 @@ class Client:
                 response = self.connection.receive_data()
 
                 if not response:
+                    if not self._stop_event.is_set() and self.session_token and self.reconnect():
+                        continue
                     print("Server closed the connection.")
                     self.connection.running = False
                     self._stop_event.set()
                     return
 
+                if SampleCodec.is_binary(response):
+                    self.render_sample(response)
+                    continue
+
                 response = response.decode("utf-8")
                 try:
                     response_json = json.loads(response)
                     if isinstance(response_json, dict):
                         status = response_json.get("status", "error")
+                        if status == "heartbeat":
+                            # Heartbeat do servidor: a resposta mostra que o cliente continua vivo
+                            self.connection.send_data("/pong")
+                            continue
                         message = response_json.get("message", "")
+                        internal = self.track_response(response_json)
+                        if "request_id" in response_json and not internal:
+                            message = f"#{response_json['request_id']} {message}"
+                        if "session" in response_json:
+                            self.session_token = response_json["session"]
+                            self.resume_grace = response_json.get("resume_grace", self.resume_grace)
+                        if "schema" in response_json:
+                            self.schema = response_json["schema"]
+                        if response_json.get("compression") == "zlib":
+                            # Todos os frames seguintes chegam comprimidos
+                            self.connection.enable_decompression()
                         if status == "info":
                             print(f"Server > {message}")
                         elif status == "warning":
@@ -142,6 +330,30 @@ class Client:
 
 
 
+    def render_sample(self, payload):
+        """
+        Decodifica e exibe uma amostra recebida no formato binário.
+
+        :param payload: Registro binário recebido do servidor.
+        :type payload: bytes
+        """
+        try:
+            if payload[0] == SampleCodec.BATCH_MAGIC:
+                # Lote de amostras de um monitor: cada registro é exibido em ordem
+                records = [SampleCodec.decode(record, self._delta_state) for record in SampleCodec.split_batch(payload)]
+            else:
+                records = [SampleCodec.decode(payload, self._delta_state)]
+        except (ValueError, KeyError, IndexError, struct.error) as e:
+            Colors.error(f"Server > Invalid binary sample: {e}")
+            return
+
+        for record in records:
+            if record is None:
+                # Delta sem keyframe anterior: a amostra é descartada até a próxima ressincronização
+                continue
+
+            print(f"Server > [{record['monitor_id']}] " + SampleFormatter.format(record["metric"], record["sample"], record["mode"]))
+
     def run_client(self):
             """
             Loop principal do cliente para enviar mensagens ao servidor.
@@ -159,7 +371,7 @@ class Client:
                     if msg.lower() == "/exit":
                         break
 
-                    self.send_message(msg)
+                    self.send_message(self.track_commands(msg))
 
             except ConnectionResetError:
                 Colors.error("Connection ended by server (reset).")
@@ -174,7 +386,32 @@ class Client:
 
 
 if __name__ == '__main__': 
-    client = Client()
+    parser = argparse.ArgumentParser(description="System Monitor client")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--format", choices=["text", "binary"], help="Sample format requested from the server (default: text, or binary with --delta)")
+    parser.add_argument("--delta", action="store_true", help="Request delta-encoded binary samples (implies --format binary)")
+    parser.add_argument("--zlib", action="store_true", help="Request zlib stream compression")
+    parser.add_argument("--script", help="File with commands (one per line, optionally '#<id> /cmd ...') sent in a single message after connecting")
+    cli_args = parser.parse_args()
+
+    script = None
+    if cli_args.script:
+        with open(cli_args.script) as script_file:
+            script = script_file.read()
+
+    # O delta só existe no formato binário: o servidor recusaria o /stream inteiro (e o zlib junto) no texto
+    if cli_args.delta and cli_args.format == "text":
+        parser.error("--delta requires --format binary")
+    sample_format = cli_args.format or ("binary" if cli_args.delta else "text")
+
+    stream_options = []
+    if cli_args.delta:
+        stream_options.append("-delta=on")
+    if cli_args.zlib:
+        stream_options.append("-zlib=on")
+
+    client = Client(cli_args.host, cli_args.port, sample_format=sample_format, stream_options=" ".join(stream_options), script=script)
     try:
         client.start()
     except KeyboardInterrupt:
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import sys
+import time
+from datetime import datetime
+from Colors import Colors
+from FrameDecoder import FrameDecoder
+from SampleCodec import SampleCodec
+from SampleFormatter import SampleFormatter
+
+class Collector:
+    """
+    Coletor de frota: mantém conexões simultâneas com muitos servidores em um único event loop
+    (sem uma thread por host), envia a mesma inscrição para todos e junta as amostras recebidas
+    em uma única saída ordenada pelo timestamp da coleta, em tabela ou JSONL.
+    """
+    def __init__(self, targets, command, output="table", window=0.5, connect_timeout=5.0, stream=sys.stdout):
+        """
+        :param targets: Lista de (host, porta).
+        :param command: Inscrição enviada a todos os servidores (ex.: '/subscribe cpu,mem -t=1').
+        :param output: 'table' ou 'jsonl'.
+        :param window: Tempo, em segundos, que uma amostra espera por amostras mais antigas de outros hosts antes de ser escrita.
+        :param connect_timeout: Tempo máximo para conectar e negociar com cada servidor.
+        """
+        self.targets = targets
+        self.command = command
+        self.output = output
+        self.window = window
+        self.connect_timeout = connect_timeout
+        self.stream = stream
+
+        # Heap de (timestamp, desempate, host, registro) aguardando a janela de reordenação
+        self._pending = []
+        self._counter = itertools.count()
+        self._connected = {}
+        self.failed = {}
+        self.samples = 0
+        self._table_header = False
+
+    @staticmethod
+    def parse_targets(values):
+        """
+        Converte 'host:porta' (separados por vírgula ou em itens separados) em uma lista de (host, porta).
+        """
+        targets = []
+        for value in values:
+            for target in value.split(","):
+                target = target.strip()
+                if not target or target.startswith("#"):
+                    continue
+                host, _, port = target.rpartition(":")
+                if not host or not port.isdigit():
+                    raise ValueError(f"Invalid target '{target}', expected host:port")
+                targets.append((host, int(port)))
+        return targets
+
+    async def connect(self, host, port):
+        """
+        Conecta a um servidor, negocia o formato binário e envia a inscrição.
+
+        :return: (reader, writer, decoder)
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        decoder = FrameDecoder()
+
+        async def read_frame():
+            while not decoder.has_frames():
+                data = await reader.read(65536)
+                if not data:
+                    raise ConnectionError("Server closed the connection")
+                decoder.feed(data)
+            return decoder.next_frame()
+
+        async def command(text, expected):
+            writer.write(FrameDecoder.encode(text))
+            await writer.drain()
+            while True:
+                frame = await read_frame()
+                if SampleCodec.is_binary(frame):
+                    continue
+                response = json.loads(frame.decode("utf-8"))
+                if response.get("status") == "error":
+                    raise ConnectionError(response.get("message", "Command failed"))
+                if expected in response.get("message", ""):
+                    return
+
+        # Boas-vindas e ajuda
+        await read_frame()
+        await read_frame()
+        await command("/format binary", "Sample format set")
+        await command(self.command, "monitoring started")
+        return reader, writer, decoder
+
+    async def run_target(self, host, port, ready):
+        """
+        Atende um servidor da frota: conecta e lê as amostras até a conexão cair ou o coletor parar.
+        """
+        name = f"{host}:{port}"
+        try:
+            reader, writer, decoder = await asyncio.wait_for(self.connect(host, port), self.connect_timeout)
+        except (OSError, ConnectionError, asyncio.TimeoutError, ValueError) as e:
+            self.failed[name] = str(e) or type(e).__name__
+            ready.release()
+            return
+
+        self._connected[name] = writer
+        ready.release()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                decoder.feed(data)
+                while decoder.has_frames():
+                    frame = decoder.next_frame()
+                    if SampleCodec.is_binary(frame):
+                        self.enqueue(name, frame)
+                    elif json.loads(frame.decode("utf-8")).get("status") == "heartbeat":
+                        # O servidor derruba conexões que ficam em silêncio: responde aos heartbeats
+                        writer.write(FrameDecoder.encode("/pong"))
+        except (OSError, ConnectionError, ValueError) as e:
+            Colors.error(f"{name}: {e}")
+        finally:
+            self._connected.pop(name, None)
+            writer.close()
+
+    def enqueue(self, host, frame):
+        """
+        Decodifica um frame binário (registro ou lote) e coloca as amostras na janela de reordenação.
+        """
+        records = SampleCodec.split_batch(frame) if frame[0] == SampleCodec.BATCH_MAGIC else [frame]
+        for record in records:
+            decoded = SampleCodec.decode(record)
+            heapq.heappush(self._pending, (decoded["timestamp"], next(self._counter), host, decoded))
+
+    def flush(self, everything=False):
+        """
+        Escreve, em ordem de timestamp, as amostras que já passaram da janela de reordenação.
+        """
+        limit = float("inf") if everything else time.time() - self.window
+        while self._pending and self._pending[0][0] <= limit:
+            _, _, host, record = heapq.heappop(self._pending)
+            self.samples += 1
+            if self.output == "jsonl":
+                self.stream.write(json.dumps(self.to_json(host, record)) + "\n")
+            else:
+                self.write_row(host, record)
+        self.stream.flush()
+
+    @staticmethod
+    def to_json(host, record):
+        """
+        Converte uma amostra decodificada em um objeto JSON plano. Métricas sem conversão própria
+        levam só os campos numéricos da amostra.
+        """
+        sample = record["sample"]
+        metric = record["metric"]
+        values = {"host": host, "timestamp": record["timestamp"], "metric": metric, "monitor_id": record["monitor_id"]}
+        if metric == "cpu":
+            values["cpu_percent"] = round(sample["cpu_percent"], 1)
+            if record["mode"] == 1:
+                values["load_avg"] = [round(load, 2) for load in sample["load_avg"]]
+                values["cpu_times_per_core"] = [{field: round(value, 2) for field, value in core._asdict().items()} for core in sample["cpu_times_per_core"]]
+        elif metric == "mem":
+            values["memory"] = sample["memory"]._asdict()
+            values["memory"]["percent"] = round(values["memory"]["percent"], 1)
+            if record["mode"] == 1:
+                values["swap"] = sample["swap"]._asdict()
+        elif metric in ("disk", "net"):
+            # Taxas por segundo; as listas por disco e por interface só vêm no modo avançado
+            values.update({field: round(value, 1) for field, value in sample.items() if isinstance(value, (int, float))})
+            devices = "disks" if metric == "disk" else "interfaces"
+            if record["mode"] == 1:
+                values[devices] = [
+                    {field: round(value, 1) if isinstance(value, float) else value for field, value in device._asdict().items()}
+                    for device in sample[devices]
+                ]
+        elif metric == "top":
+            values["total"] = sample["total"]
+            values["processes"] = [
+                {"pid": process.pid, "name": process.name, "cpu_percent": round(process.cpu_percent, 1), "rss": process.rss}
+                for process in sample["processes"]
+            ]
+        else:
+            values.update({field: value for field, value in sample.items() if isinstance(value, (int, float, str))})
+        return values
+
+    def write_row(self, host, record):
+        if not self._table_header:
+            self.stream.write(f"{'time':<23} {'host':<24} {'id':>3} {'metric':<6} value\n")
+            self._table_header = True
+
+        sample = record["sample"]
+        metric = record["metric"]
+        rate = SampleFormatter.format_rate
+        if metric == "cpu":
+            value = f"{sample['cpu_percent']:5.1f}%"
+            if record["mode"] == 1:
+                value += f"  load {sample['load_avg'][0]:.2f} {sample['load_avg'][1]:.2f} {sample['load_avg'][2]:.2f}"
+        elif metric == "mem":
+            memory = sample["memory"]
+            value = f"{memory.percent:5.1f}%  used {memory.used / (1024**3):.2f} GB  available {memory.available / (1024**3):.2f} GB"
+        elif metric == "disk":
+            value = f"{sample['busy_percent']:5.1f}%  read {rate(sample['read_bytes'])}  write {rate(sample['write_bytes'])}"
+        elif metric == "net":
+            value = f"sent {rate(sample['bytes_sent'])}  received {rate(sample['bytes_recv'])}  errors {sample['errors']:.1f}/s"
+        elif metric == "top":
+            processes = sample["processes"]
+            value = f"{len(processes)} of {sample['total']} processes"
+            if processes:
+                value += f"  top {processes[0].name[:20]} {processes[0].cpu_percent:.1f}%"
+        else:
+            value = "  ".join(f"{field}={value}" for field, value in sample.items() if isinstance(value, (int, float, str)))
+
+        moment = datetime.fromtimestamp(record["timestamp"]).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        self.stream.write(f"{moment:<23} {host:<24} {record['monitor_id']:>3} {record['metric']:<6} {value}\n")
+
+    async def run(self, duration=None):
+        """
+        Conecta a todos os servidores em paralelo e escreve as amostras até 'duration' segundos
+        (ou até todas as conexões caírem).
+        """
+        ready = asyncio.Semaphore(0)
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(self.run_target(host, port, ready)) for host, port in self.targets]
+
+        # Espera todas as conexões terminarem a negociação (com sucesso ou não)
+        for _ in tasks:
+            await ready.acquire()
+        Colors.info(f"Connected to {len(self._connected)}/{len(self.targets)} servers in {time.perf_counter() - started:.2f}s")
+        for name, error in self.failed.items():
+            Colors.error(f"{name}: {error}")
+
+        deadline = time.perf_counter() + duration if duration else None
+        try:
+            while any(not task.done() for task in tasks):
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                await asyncio.sleep(min(self.window, 0.1) or 0.1)
+                self.flush()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.flush(everything=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="System Monitor fleet collector: one subscription on many servers, merged into one stream")
+    parser.add_argument("targets", nargs="*", help="Servers as host:port (also accepts comma-separated lists)")
+    parser.add_argument("--targets-file", help="File with one host:port per line")
+    parser.add_argument("--command", default="/subscribe cpu,mem -t=1", help="Subscription sent to every server")
+    parser.add_argument("--output", choices=["table", "jsonl"], default="table")
+    parser.add_argument("--window", type=float, default=0.5, help="Reordering window in seconds")
+    parser.add_argument("--connect-timeout", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--file", help="Write the merged stream to this file instead of the terminal")
+    cli_args = parser.parse_args()
+
+    values = list(cli_args.targets)
+    if cli_args.targets_file:
+        with open(cli_args.targets_file) as targets_file:
+            values.extend(line.strip() for line in targets_file)
+
+    try:
+        fleet = Collector.parse_targets(values)
+    except ValueError as e:
+        Colors.error(e)
+        sys.exit(1)
+    if not fleet:
+        Colors.error("No targets given")
+        sys.exit(1)
+
+    output_stream = open(cli_args.file, "w") if cli_args.file else sys.stdout
+    collector = Collector(fleet, cli_args.command, cli_args.output, cli_args.window, cli_args.connect_timeout, output_stream)
+    try:
+        asyncio.run(collector.run(cli_args.duration))
+    except KeyboardInterrupt:
+        Colors.warning("Interrupted by user")
+    finally:
+        if cli_args.file:
+            output_stream.close()
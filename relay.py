@@ -0,0 +1,721 @@
+import argparse
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import partial
+from typing import Literal
+from ClientManager import ClientManager
+from ServerManager import ServerManager
+from SampleCodec import SampleCodec
+from SampleFormatter import SampleFormatter
+from CommandParser import CommandParser
+from server import Server
+from Colors import Colors
+
+class Relay:
+    """
+    Relay de fan-out: aceita clientes como se fosse o servidor, junta as inscrições iguais e mantém
+    uma única conexão com o servidor monitorado. Cada amostra recebida do servidor é repassada
+    localmente para todos os clientes inscritos, então a carga no host monitorado não depende
+    da quantidade de pessoas assistindo.
+
+    Se a conexão com o servidor cai, o relay reconecta com backoff e retoma a sessão (/resume) com o
+    token recebido nas boas-vindas; se a sessão já expirou, os feeds ativos são inscritos de novo.
+    """
+    # Espera máxima entre as tentativas de reconexão com o servidor, em segundos
+    MAX_RECONNECT_DELAY = 10.0
+
+    def __init__(self, upstream_host, upstream_port, host='0.0.0.0', port=8001, upstream_zlib=False):
+        self.upstream = ClientManager(upstream_host, upstream_port)
+        self.upstream_zlib = upstream_zlib
+        self.manager = ServerManager(host, port)
+
+        self.modes = ["basic", "advanced"]
+        self.formats = ["text", "binary"]
+
+        # Clientes locais: {client_id: {"socket", "format", "monitor": {id local: chave do feed}, "monitors_count"}}
+        self._clients = {}
+
+        # Feeds: uma inscrição no servidor compartilhada por todos os clientes com o mesmo comando
+        # {chave: {"command", "type", "upstream_id", "subscribers": {(client_id, id local): socket}, "waiting": [...]}}
+        self._feeds = {}
+        self._feeds_by_upstream_id = {}
+        self.lock = threading.Lock()
+
+        # O servidor responde os comandos de uma conexão em ordem: cada comando enviado ao servidor
+        # deixa na fila a função que vai tratar a sua resposta
+        self._responses = deque()
+        self._upstream_lock = threading.Lock()
+        # Token da sessão no servidor, usado no /resume depois de uma queda, e IDs de feeds encerrados
+        # enquanto o servidor estava fora do ar
+        self.upstream_session = None
+        self._stale_upstream_ids = []
+
+    def send_message(self, client_socket, message, status: Literal["info", "warning", "error", "success"], request_id=None):
+        """
+        Envia uma mensagem JSON para um cliente local, no mesmo formato do servidor
+        (com o 'request_id' do comando respondido, quando o cliente informou um).
+        """
+        response = {"status": status, "message": message}
+        if request_id is not None:
+            response["request_id"] = request_id
+        self.manager.send_data(json.dumps(response), client_socket)
+
+    def send_upstream(self, command, on_response=None):
+        """
+        Envia um comando para o servidor monitorado.
+
+        :param command: Comando, no mesmo formato usado pelo cliente.
+        :param on_response: Função chamada com a resposta JSON do servidor (dict). Se None, a resposta é ignorada.
+        :return: True se o comando foi enviado, False caso contrário.
+        """
+        with self._upstream_lock:
+            self._responses.append(on_response)
+            if not self.upstream.send_data(command):
+                self._responses.pop()
+                return False
+        return True
+
+    def open_upstream(self):
+        """
+        Abre uma nova conexão com o servidor monitorado e lê as mensagens iniciais.
+
+        :return: Tupla (conexão, token da sessão no servidor), ou None se a conexão falhou.
+        :rtype: tuple | None
+        """
+        connection = ClientManager(self.upstream.host, self.upstream.port)
+        if not connection.connect():
+            return None
+
+        # Boas-vindas (com o token da sessão) e ajuda do servidor
+        welcome = connection.receive_data()
+        if not welcome or not connection.receive_data():
+            connection.close()
+            return None
+        try:
+            token = json.loads(welcome.decode("utf-8")).get("session")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            token = None
+        return connection, token
+
+    def _swap_upstream(self, connection, resume=None):
+        """
+        Troca a conexão com o servidor e a configura (/resume, formato binário e zlib) com um único frame,
+        enviado sob o lock de envio, para que nenhum comando de um cliente local chegue ao servidor antes.
+
+        :param resume: Token da sessão a ser retomada, ou None.
+        :return: True se a configuração foi enviada, False caso contrário.
+        """
+        commands = []
+        if resume is not None:
+            commands.append((f"/resume {resume}", self._on_upstream_resumed))
+        commands.append(("/format binary", None))
+        if self.upstream_zlib:
+            # A compressão é da conexão: não sobrevive a uma reconexão, nem com a sessão retomada
+            commands.append(("/stream -zlib=on", None))
+
+        with self._upstream_lock:
+            self.upstream.close()
+            self.upstream = connection
+            self._responses.extend(on_response for _, on_response in commands)
+            if not connection.send_data("\n".join(command for command, _ in commands)):
+                self._responses.clear()
+                return False
+        return True
+
+    def connect_upstream(self):
+        """
+        Conecta ao servidor monitorado, descarta as mensagens iniciais e negocia o formato binário.
+
+        :return: True se a conexão foi estabelecida, False caso contrário.
+        """
+        opened = self.open_upstream()
+        if opened is None:
+            return False
+        connection, self.upstream_session = opened
+        if not self._swap_upstream(connection):
+            return False
+
+        thread = threading.Thread(target=self.run_upstream, name="Upstream")
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def run_upstream(self):
+        """
+        Thread da conexão com o servidor: lê as mensagens e, quando a conexão cai, reconecta.
+        """
+        while True:
+            self.handle_upstream()
+            # A thread começa antes do servidor local; depois que ele é encerrado, não há por que reconectar
+            if not self.manager.running:
+                break
+            self._upstream_lost()
+            if not self.reconnect_upstream():
+                break
+
+    def _upstream_lost(self):
+        """
+        Avisa os clientes locais da queda e recusa os comandos que ficaram sem resposta do servidor.
+        """
+        Colors.error("Upstream connection lost, reconnecting...")
+        with self._upstream_lock:
+            self.upstream.running = False
+            pending = list(self._responses)
+            self._responses.clear()
+
+        lost = {"status": "error", "message": "Upstream server connection lost."}
+        for on_response in pending:
+            if on_response is not None:
+                try:
+                    on_response(dict(lost))
+                except Exception as e:
+                    Colors.error(f"Error handling upstream response: {e}")
+
+        with self.lock:
+            sockets = [client_data["socket"] for client_data in self._clients.values()]
+        for client_socket in sockets:
+            self.send_message(client_socket, "Upstream server connection lost, reconnecting...", "warning")
+
+    def reconnect_upstream(self):
+        """
+        Reconecta ao servidor com backoff exponencial e retoma a sessão anterior. As amostras
+        guardadas pelo servidor durante a queda chegam logo depois da confirmação do /resume.
+
+        :return: True se reconectou, False se o relay foi encerrado antes disso.
+        :rtype: bool
+        """
+        delay = 0.5
+        while self.manager.running:
+            opened = self.open_upstream()
+            if opened is not None:
+                connection, token = opened
+                previous = self.upstream_session
+                if self._swap_upstream(connection, previous):
+                    # Se o /resume der certo, o token volta a ser o da sessão retomada
+                    self.upstream_session = token
+                    if previous is None:
+                        self._restore_feeds()
+                    Colors.ok(f"Reconnected to upstream server {self.upstream.host}:{self.upstream.port}")
+                    return True
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+        return False
+
+    def _on_upstream_resumed(self, response):
+        """
+        Resposta do /resume: com a sessão retomada, os feeds continuam com os mesmos IDs no servidor, e os
+        feeds encerrados durante a queda são cancelados agora; senão (sessão expirada ou servidor reiniciado),
+        os feeds são inscritos de novo na sessão nova.
+        """
+        if response.get("status") != "success":
+            Colors.warning(f"Upstream session not resumed ({response.get('message', '')}), subscribing feeds again")
+            with self.lock:
+                self._stale_upstream_ids = []
+            self._restore_feeds()
+            return
+
+        self.upstream_session = response.get("session", self.upstream_session)
+        Colors.ok(f"Upstream session resumed: {response.get('message', '')}")
+        with self.lock:
+            stale = self._stale_upstream_ids
+            self._stale_upstream_ids = []
+        for upstream_id in stale:
+            self._quit_upstream(upstream_id)
+
+    def _restore_feeds(self):
+        """
+        Inscreve de novo, na sessão nova do servidor, todos os feeds confirmados. Os clientes locais
+        mantêm os seus IDs; só o ID do feed no servidor muda.
+        """
+        with self.lock:
+            keys = []
+            for key, feed in self._feeds.items():
+                if feed["upstream_id"] is None:
+                    continue
+                self._feeds_by_upstream_id.pop(feed["upstream_id"], None)
+                feed["upstream_id"] = None
+                keys.append(key)
+        for key in keys:
+            if not self.send_upstream(key, partial(self._on_feed_started, key)):
+                self._on_feed_started(key, {"status": "error", "message": "Upstream server is not available."})
+
+    def handle_upstream(self):
+        """
+        Lê tudo o que chega do servidor monitorado: amostras são repassadas aos inscritos e
+        respostas JSON são entregues, em ordem, para quem enviou o comando.
+        """
+        while self.upstream.running:
+            frame = self.upstream.receive_data()
+            if not frame:
+                break
+
+            if SampleCodec.is_binary(frame):
+                self.fan_out(frame)
+                continue
+
+            try:
+                response = json.loads(frame.decode("utf-8"))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                Colors.warning(f"Upstream > {frame[:80]}")
+                continue
+
+            if response.get("compression") == "zlib":
+                # Todos os frames seguintes do servidor chegam comprimidos
+                self.upstream.enable_decompression()
+
+            if response.get("status") == "heartbeat":
+                # Heartbeat do servidor: /pong não tem resposta, então não entra na fila de respostas
+                self.upstream.send_data("/pong")
+                continue
+
+            if "alert" in response:
+                # Alertas de monitores com filtro não são respostas de comandos
+                self.fan_out_alert(response)
+                continue
+
+            with self._upstream_lock:
+                on_response = self._responses.popleft() if self._responses else None
+            if on_response is not None:
+                try:
+                    on_response(response)
+                except Exception as e:
+                    Colors.error(f"Error handling upstream response: {e}")
+
+    def fan_out(self, frame):
+        """
+        Repassa uma amostra do servidor para todos os clientes inscritos no feed, no formato de cada um.
+        O texto é formatado uma única vez por amostra; no formato binário só o ID do monitor é trocado.
+        """
+        try:
+            upstream_id = str(SampleCodec.monitor_id(frame))
+        except (ValueError, IndexError):
+            return
+
+        with self.lock:
+            key = self._feeds_by_upstream_id.get(upstream_id)
+            feed = self._feeds.get(key)
+            if feed is None:
+                return
+            subscribers = list(feed["subscribers"].items())
+
+        text = None
+        for (client_id, local_id), client_socket in subscribers:
+            client_data = self._clients.get(client_id)
+            if client_data is None:
+                continue
+
+            if client_data["format"] == "binary":
+                message = SampleCodec.retag(frame, local_id)
+            else:
+                if text is None:
+                    records = SampleCodec.split_batch(frame) if frame[0] == SampleCodec.BATCH_MAGIC else [frame]
+                    lines = []
+                    for record in records:
+                        decoded = SampleCodec.decode(record)
+                        lines.append(SampleFormatter.format(decoded["metric"], decoded["sample"], decoded["mode"]))
+                    text = json.dumps({"status": "info", "message": "\n".join(lines)})
+                message = text
+
+            self.manager.send_data(message, client_socket, key=local_id)
+
+    def fan_out_alert(self, response):
+        """
+        Repassa um alerta do servidor para os inscritos no feed, com o ID do monitor local de cada um.
+        """
+        alert = response["alert"]
+        with self.lock:
+            key = self._feeds_by_upstream_id.get(str(alert.get("monitor")))
+            feed = self._feeds.get(key)
+            if feed is None:
+                return
+            subscribers = list(feed["subscribers"].items())
+
+        prefix = f"[{alert['monitor']}] "
+        message = response.get("message", "").removeprefix(prefix)
+        for (_, local_id), client_socket in subscribers:
+            local = dict(response, message=f"[{local_id}] {message}", alert=dict(alert, monitor=local_id))
+            self.manager.send_data(json.dumps(local), client_socket)
+
+    @staticmethod
+    def feed_key(request):
+        """
+        Chave que identifica inscrições iguais: o comando com as métricas em ordem e os parâmetros ordenados.
+
+        :param request: Comando de monitor (/cpu, /mem, /disk, /net, /top) ou /subscribe.
+        :type request: str
+        :rtype: str
+        """
+        parts = [part for part in request.strip().split(" ") if part]
+        command = parts[0].lower()
+        arguments = parts[1:]
+        if command == "/subscribe" and arguments and not arguments[0].startswith("-"):
+            metrics = sorted({name.strip().lower() for name in arguments[0].split(",") if name.strip()})
+            command += " " + ",".join(metrics)
+            arguments = arguments[1:]
+        return " ".join([command] + sorted(arguments))
+
+    def subscribe(self, client_id, client_socket, request, request_id=None):
+        """
+        Inscreve um cliente local em um feed, criando a inscrição no servidor se ela ainda não existe.
+
+        :param request_id: ID do comando no cliente local, devolvido na confirmação.
+        """
+        key = self.feed_key(request)
+
+        with self.lock:
+            client_data = self._clients[client_id]
+            local_id = f"{client_data['monitors_count']}"
+            client_data["monitors_count"] += 1
+            client_data["monitor"][local_id] = key
+
+            feed = self._feeds.get(key)
+            created = feed is None
+            if created:
+                feed = self._feeds[key] = {"command": key, "type": None, "upstream_id": None, "subscribers": {}, "waiting": []}
+            feed["subscribers"][(client_id, local_id)] = client_socket
+
+            if feed["upstream_id"] is None:
+                # O servidor ainda não confirmou a inscrição: a resposta é dada quando ela chegar
+                feed["waiting"].append((client_id, local_id, client_socket, request_id))
+                monitor_type = None
+            else:
+                monitor_type = feed["type"]
+
+        if created:
+            if not self.send_upstream(key, partial(self._on_feed_started, key)):
+                self._on_feed_started(key, {"status": "error", "message": "Upstream server is not available."})
+        elif monitor_type is not None:
+            Colors.ok(f"Joined {monitor_type} feed ({key}) for {client_id}")
+            self.send_message(client_socket, f"{monitor_type} monitoring started with ID: {local_id}", "success", request_id)
+
+    def _on_feed_started(self, key, response):
+        """
+        Resposta do servidor para a criação (ou reinscrição, depois de uma queda) de um feed: confirma ou
+        recusa para os clientes que estavam esperando. Se uma reinscrição é recusada, os inscritos que já
+        recebiam o feed são avisados de que o monitor foi encerrado.
+        """
+        match = re.match(r"(.+) monitoring started with ID: (\d+)", response.get("message", ""))
+        success = response.get("status") == "success" and match is not None
+
+        dropped = None
+        stopped = []
+        with self.lock:
+            feed = self._feeds.get(key)
+            if feed is None:
+                return
+            waiting = feed["waiting"]
+            feed["waiting"] = []
+
+            if not success:
+                # Comando recusado pelo servidor (ex.: intervalo inválido): desfaz as inscrições locais
+                answered = {(client_id, local_id) for client_id, local_id, _, _ in waiting}
+                for (client_id, local_id), client_socket in feed["subscribers"].items():
+                    self._clients.get(client_id, {}).get("monitor", {}).pop(local_id, None)
+                    if (client_id, local_id) not in answered:
+                        stopped.append((local_id, client_socket))
+                del self._feeds[key]
+            else:
+                feed["type"] = match.group(1)
+                feed["upstream_id"] = match.group(2)
+                self._feeds_by_upstream_id[feed["upstream_id"]] = key
+                if not feed["subscribers"]:
+                    # Todos desistiram antes da confirmação
+                    dropped = self._drop_feed(key)
+        self._quit_upstream(dropped)
+
+        for client_id, local_id, client_socket, request_id in waiting:
+            if not success:
+                self.send_message(client_socket, response.get("message", "Upstream error"), response.get("status", "error"), request_id)
+            else:
+                Colors.ok(f"Started {match.group(1)} feed ({key}) for {client_id}")
+                self.send_message(client_socket, f"{match.group(1)} monitoring started with ID: {local_id}", "success", request_id)
+        for local_id, client_socket in stopped:
+            self.send_message(client_socket, f"[{local_id}] Monitor stopped: {response.get('message', 'Upstream error')}", "error")
+
+    def _drop_feed(self, key):
+        """
+        Remove um feed sem inscritos. Deve ser chamado com o lock; o /quit no servidor é enviado depois,
+        fora do lock (_quit_upstream), para que um servidor lento não trave os clientes locais.
+
+        :return: ID do monitor no servidor a ser encerrado, ou None se o feed não foi removido.
+        :rtype: str | None
+        """
+        feed = self._feeds.get(key)
+        if feed is None or feed["subscribers"] or feed["upstream_id"] is None:
+            return None
+        del self._feeds[key]
+        self._feeds_by_upstream_id.pop(feed["upstream_id"], None)
+        Colors.success(f"Stopped feed ({key})")
+        return feed["upstream_id"]
+
+    def _quit_upstream(self, upstream_id):
+        """
+        Cancela no servidor a inscrição de um feed removido por _drop_feed. Deve ser chamado sem o lock.
+        """
+        if upstream_id is not None and not self.send_upstream(f"/quit {upstream_id}"):
+            # Servidor fora do ar: o monitor continua na sessão guardada e é cancelado depois do /resume
+            with self.lock:
+                self._stale_upstream_ids.append(upstream_id)
+
+    def unsubscribe(self, client_id, local_id):
+        """
+        Remove a inscrição de um cliente local. O feed é encerrado no servidor quando fica sem inscritos.
+
+        :return: True se o monitor existia, False caso contrário.
+        :rtype: bool
+        """
+        dropped = None
+        with self.lock:
+            key = self._clients.get(client_id, {}).get("monitor", {}).pop(local_id, None)
+            if key is None:
+                return False
+            feed = self._feeds.get(key)
+            if feed is not None:
+                feed["subscribers"].pop((client_id, local_id), None)
+                dropped = self._drop_feed(key)
+        self._quit_upstream(dropped)
+        return True
+
+    def help(self):
+        """
+        Retorna a mensagem de ajuda com os comandos disponíveis no relay.
+        """
+        return (
+            "Available commands (relay):\n"
+            "/help - Show this help message\n"
+            "/exit - Close the connection\n"
+            "/cpu -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start CPU monitoring\n"
+            "/mem -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start Memory monitoring\n"
+            "/disk -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start Disk I/O monitoring\n"
+            "/net -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start Network monitoring\n"
+            "/top -t=<seconds|ms> [-b=<n>] [-f=<ms>] - Start monitoring the processes using most CPU\n"
+            "/subscribe <cpu,mem,disk,net,top> -t=<seconds|ms> -m=<mode> - One stream with all metrics sampled together\n"
+            "/quit <id> - Stop monitoring by ID\n"
+            "/monitors - Show all monitoring views\n"
+            "/stats - Show relay statistics\n"
+            "/ping - Check that the relay is alive (clients answer the relay's heartbeats with /pong)\n"
+            "/history <cpu|mem> -s=<seconds> -r=<resolution> - Show min/avg/max history (from the upstream server)\n"
+            "/format <text|binary> - Set the sample output format\n"
+            "Modes: basic, advanced\n"
+        )
+
+    def stats_report(self):
+        """
+        Relatório do relay: feeds no servidor, inscritos locais e contadores de envio.
+
+        :return: Tupla (mensagem, dados).
+        :rtype: tuple
+        """
+        data = self.manager.stats.snapshot()
+        with self.lock:
+            feeds = {key: len(feed["subscribers"]) for key, feed in self._feeds.items()}
+        data["feeds"] = feeds
+        data["upstream"] = f"{self.upstream.host}:{self.upstream.port}"
+
+        lines = [
+            f"Upstream: {data['upstream']} ({'connected' if self.upstream.running else 'disconnected'})",
+            f"Downstream clients: {len(data['clients'])}",
+            f"Upstream feeds: {len(feeds)}, local subscriptions: {sum(feeds.values())}",
+            f"Sent: {data['messages_sent']} messages, {data['bytes_sent']} bytes",
+        ]
+        for key, count in feeds.items():
+            lines.append(f" - {key}: {count} subscribers")
+        return "\n".join(lines), data
+
+    def handle_request(self, client_id, client_socket, request):
+        """
+        Processa um frame de comandos de um cliente local. Como no servidor, o frame pode trazer
+        vários comandos, um por linha, cada um com um ID opcional ('#<id>') devolvido nas respostas.
+
+        :return: False se a conexão deve ser encerrada, True caso contrário.
+        :rtype: bool
+        """
+        for command in CommandParser.parse_frame(request):
+            if not self.handle_command(client_id, client_socket, command):
+                return False
+        return True
+
+    def handle_command(self, client_id, client_socket, command):
+        """
+        Processa um comando de um cliente local.
+
+        :return: False se a conexão deve ser encerrada, True caso contrário.
+        :rtype: bool
+        """
+        request_id = command.request_id
+        req = command.text
+        command_name = command.name
+
+        if command.error is not None:
+            self.send_message(client_socket, command.error, "error", request_id)
+
+        elif command_name == "/exit":
+            self.send_message(client_socket, "Connection ended", "success", request_id)
+            return False
+
+        elif command_name == "/help":
+            self.send_message(client_socket, self.help(), "info", request_id)
+
+        elif command_name in {"/cpu", "/mem", "/disk", "/net", "/top", "/subscribe"}:
+            try:
+                # Validado aqui, com as regras do servidor: um comando inválido nunca chega à conexão
+                # compartilhada, onde um erro afetaria todos os clientes do relay
+                Server.check_monitor_command(command)
+            except ValueError as e:
+                self.send_message(client_socket, str(e), "error", request_id)
+                return True
+            if not self.upstream.running:
+                self.send_message(client_socket, "Upstream server is not available.", "error", request_id)
+            else:
+                self.subscribe(client_id, client_socket, req, request_id)
+
+        elif command_name == "/quit":
+            if not command.arguments:
+                self.send_message(client_socket, "Please specify a monitor ID to quit.", "error", request_id)
+                return True
+            local_id = command.arguments[0]
+            if self.unsubscribe(client_id, local_id):
+                self.send_message(client_socket, f"Stopped monitoring ({local_id}) for {client_id}", "success", request_id)
+            else:
+                self.send_message(client_socket, f"Monitor ID '{local_id}' not found.", "error", request_id)
+
+        elif command_name == "/monitors":
+            with self.lock:
+                monitors = [
+                    f" - {local_id}: {self._feeds[key]['type'] or key}"
+                    for local_id, key in self._clients[client_id]["monitor"].items() if key in self._feeds
+                ]
+            if monitors:
+                self.send_message(client_socket, "Active monitors:\n" + "\n".join(monitors), "info", request_id)
+            else:
+                self.send_message(client_socket, "No active monitors.", "error", request_id)
+
+        elif command_name == "/format":
+            if not command.arguments or command.arguments[0].lower() not in self.formats:
+                self.send_message(client_socket, f"Format must be in {self.formats}.", "error", request_id)
+                return True
+            sample_format = command.arguments[0].lower()
+            self._clients[client_id]["format"] = sample_format
+            response = {"status": "success", "message": f"Sample format set to {sample_format}"}
+            if sample_format == "binary":
+                response["schema"] = SampleCodec.schema()
+            self._forward_response(client_socket, request_id, response)
+
+        elif command_name == "/history":
+            # O histórico fica no servidor: o comando é repassado e a resposta volta para quem pediu
+            if not self.send_upstream(req, partial(self._forward_response, client_socket, request_id)):
+                self.send_message(client_socket, "Upstream server is not available.", "error", request_id)
+
+        elif command_name == "/stats":
+            message, data = self.stats_report()
+            self._forward_response(client_socket, request_id, {"status": "info", "message": message, "stats": data})
+
+        elif command_name == "/stream":
+            self.send_message(client_socket, "Stream options are not supported by the relay.", "error", request_id)
+
+        elif command_name == "/ping":
+            self._forward_response(client_socket, request_id, {"status": "success", "message": "pong", "timestamp": time.time()})
+
+        elif command_name == "/pong":
+            # Resposta a um heartbeat do relay: só a chegada do frame importa
+            pass
+
+        else:
+            self.send_message(client_socket, "Unknown command. Use /help to see available commands.", "error", request_id)
+
+        return True
+
+    def _forward_response(self, client_socket, request_id, response):
+        if request_id is not None:
+            response["request_id"] = request_id
+        self.manager.send_data(json.dumps(response), client_socket)
+
+    def handle_client(self, client_socket, client_address):
+        """
+        Atende um cliente local (uma thread por cliente, como no servidor).
+        """
+        client_id = f"{client_address[0]}:{client_address[1]}"
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Accepted connection from {client_id}")
+        self.manager.stats.register_client(client_socket, client_id)
+        with self.lock:
+            self._clients[client_id] = {"socket": client_socket, "format": "text", "monitor": {}, "monitors_count": 0}
+        self.send_message(client_socket, f"Connected to relay for {self.upstream.host}:{self.upstream.port} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", "info")
+        self.send_message(client_socket, self.help(), "info")
+
+        try:
+            while self.manager.running:
+                data = self.manager.receive_data(client_socket)
+                if not data:
+                    break
+                if not self.handle_request(client_id, client_socket, data.decode("utf-8", "replace")):
+                    break
+        finally:
+            with self.lock:
+                local_ids = list(self._clients.get(client_id, {}).get("monitor", {}))
+            for local_id in local_ids:
+                self.unsubscribe(client_id, local_id)
+            with self.lock:
+                self._clients.pop(client_id, None)
+            Colors.success(f"Connection to {client_address} closed")
+
+    def start(self, connection_limits):
+        """
+        Conecta ao servidor monitorado e começa a aceitar clientes locais.
+        """
+        Colors.header("System Monitor Relay")
+        if not self.connect_upstream():
+            Colors.error("Could not connect to the upstream server")
+            return
+
+        self.manager.set_connection_limits(connection_limits)
+        self.manager.start(target_function=self.handle_client)
+        self.handle_server()
+
+    def handle_server(self):
+        """
+        Lê comandos do terminal para controle do relay.
+        Comandos:
+        - exit: encerra o relay
+        - stats: mostra os feeds e os contadores do relay
+        """
+        while self.manager.running:
+            command = input("Enter command: ").strip().lower()
+            if command == "exit":
+                self.manager.running = False
+                self.manager.shutdown()
+                self.manager.close()
+                self.upstream.close()
+                Colors.ok("Relay ending...")
+            elif command == "stats":
+                message, _ = self.stats_report()
+                Colors.info(message)
+            else:
+                Colors.error("Unknown command")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="System Monitor relay: one upstream connection shared by many clients")
+    parser.add_argument("--upstream-host", default="127.0.0.1", help="Monitored server host")
+    parser.add_argument("--upstream-port", type=int, default=8000, help="Monitored server port")
+    parser.add_argument("--upstream-zlib", action="store_true", help="Compress the upstream stream with zlib")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--connections", type=int, default=100, help="Maximum downstream connections")
+    parser.add_argument("--heartbeat", type=float, default=3, help="Seconds of client silence before the relay sends a heartbeat (0 disables)")
+    parser.add_argument("--idle-timeout", type=float, default=10, help="Seconds without any frame from a client before its connection is closed (0 disables)")
+    cli_args = parser.parse_args()
+
+    relay = Relay(cli_args.upstream_host, cli_args.upstream_port, cli_args.host, cli_args.port, cli_args.upstream_zlib)
+    try:
+        relay.manager.set_liveness(cli_args.heartbeat, cli_args.idle_timeout)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        relay.start(cli_args.connections)
+    except KeyboardInterrupt:
+        Colors.ok('\nInterrupted')
+        relay.manager.running = False
@@ -1,28 +1,92 @@
 import threading
 import time
-import psutil
 from datetime import datetime
+from functools import partial
 from typing import Literal
+import argparse
 import json
+import math
+import os
 from ServerManager import ServerManager
+from AsyncServerManager import AsyncServerManager
+from Sampler import Sampler
+from Collectors import BACKENDS, create_backend
+from WorkerPool import RemoteSampler, WorkerPool
+from MetricHistory import MetricHistory
+from SharedMetrics import SharedMetricsWriter
+from MetricLog import LogReplay, MetricLogReader, MetricLogWriter
+from SampleCodec import SampleCodec
+from SampleFormatter import SampleFormatter
+from SampleFilter import SampleFilter
+from SessionRegistry import SessionRegistry
+from CommandParser import CommandParser
+from FrameDecoder import EncodedFrame
+from Stats import InstrumentedLock, ServerStats
 from Colors import Colors
 
 class Server:
     """
     Classe principal do servidor, responsável por gerenciar conexões, comandos e monitoramentos.
     """
-    def __init__(self, host='0.0.0.0', port=8000):
-        # Inicializa o servidor com host, porta e variáveis de controle
-        self._clients = {}  # dicionário para armazenar informações dos clientes e suas threads/monitors ativas
-        self.lock = threading.Lock()
+    # Menor e maior intervalo aceitos em -t= (um dia) e maior quantidade de amostras por lote em -b=
+    MIN_INTERVAL_MS = 10
+    MAX_INTERVAL_MS = 24 * 60 * 60 * 1000
+    MAX_BATCH = 1000
+
+    # Comando de cada métrica (/cpu, /mem, ...) e a descrição do monitor exibida ao cliente
+    MONITOR_TYPES = {"cpu": "CPU", "mem": "Memory", "disk": "Disk", "net": "Network", "top": "Top processes"}
+    # Opções aceitas pelos comandos de monitor e pelo /subscribe
+    MONITOR_OPTIONS = {"t", "m", "b", "f", "on-change", "deadband", "alert", "heartbeat"}
+    MODES = ["basic", "advanced"]
 
-        self.modes = ["basic", "advanced"]
+    def __init__(self, host='0.0.0.0', port=8000, engine="threads", sampler=None, backend="auto"):
+        # Inicializa o servidor com host, porta e variáveis de controle
+        self.modes = list(self.MODES)
+        self.formats = ["text", "binary"]
         self.timer = 10
         self.mode = 0
 
-        self.manager = ServerManager()
+        # Motor de conexões: "threads" (uma thread por cliente) ou "asyncio" (event loop único)
+        if engine not in {"threads", "asyncio"}:
+            raise ValueError("engine must be 'threads' or 'asyncio'")
+        self.engine = engine
+        self.manager = AsyncServerManager(host, port) if engine == "asyncio" else ServerManager(host, port)
+
+        # Sessões dos clientes em shards; os locks dos shards e das sessões medem o próprio tempo de espera
+        self.stats = self.manager.stats
+        self.sessions = SessionRegistry(lock_factory=partial(InstrumentedLock, self.stats.lock_wait))
+
+        # No modo com workers, o sampler é o RemoteSampler alimentado pelo processo principal
+        self.sampler = sampler or Sampler(stats=self.stats, backend=create_backend(backend))
+        self.history = MetricHistory()
+        self.shared = None
+        # Segundos em que a sessão de uma conexão que caiu fica guardada esperando /resume (0 desliga)
+        self.resume_grace = 30
+        # Leitor do log persistente (None quando o servidor roda sem --log-dir)
+        self.log = None
 
-    def send_message(self, client_socket, message, status: Literal["info", "warning", "error", "success"]):
+        # Tabela de comandos: nome -> (handler, opções aceitas). O handler recebe (client_id, client_socket, command)
+        # e retorna False quando a conexão deve ser encerrada.
+        monitor_options = self.MONITOR_OPTIONS
+        self.commands = {
+            "/exit": (self.command_exit, set()),
+            "/help": (self.command_help, set()),
+            "/monitors": (self.command_monitors, set()),
+            "/subscribe": (self.command_subscribe, monitor_options),
+            "/quit": (self.command_quit, set()),
+            "/format": (self.set_format, set()),
+            "/stream": (self.set_stream, {"delta", "resync", "zlib"}),
+            "/history": (self.command_history, {"s", "r"}),
+            "/replay": (self.replay, {"s", "d", "x"}),
+            "/stats": (self.command_stats, set()),
+            "/ping": (self.command_ping, set()),
+            "/pong": (self.command_pong, set()),
+            "/resume": (self.command_resume, set()),
+        }
+        for metric, monitor_type in self.MONITOR_TYPES.items():
+            self.commands[f"/{metric}"] = (partial(self.command_monitor, metric, monitor_type), monitor_options)
+
+    def send_message(self, client_socket, message, status: Literal["info", "warning", "error", "success"], request_id=None):
         """
         Padroniza o formato de envio de mensagens JSON para o socket.
 
@@ -32,30 +96,327 @@ class Server:
         :type message: str
         :param status: O status da mensagem ('info', 'warning', 'error', 'success').
         :type status: str
+        :param request_id: ID do comando respondido, escolhido pelo cliente (None se o comando não tinha ID).
+        :type request_id: str | None
         """
         if status not in {"info", "warning", "error", "success"}:
             raise ValueError("status must be 'info', 'warning', 'error' or 'success'")
 
         try:
-            response = json.dumps({"status": status, "message": message})
-            self.manager.send_data(response, client_socket)
+            response = {"status": status, "message": message}
+            if request_id is not None:
+                response["request_id"] = request_id
+            self.manager.send_data(json.dumps(response), client_socket)
         except Exception as e:
             Colors.error(f"Error sending message to {client_socket.getpeername()}: {str(e)}")
 
-    def create_thread(self, target, args, stop_event):
+    def reply(self, client_socket, command, message, status: Literal["info", "warning", "error", "success"]):
         """
-        Cria e inicia uma thread para monitoramento.
+        Responde a um comando, devolvendo o ID do pedido quando o cliente informou um.
+
+        :param command: O comando respondido.
+        :type command: CommandParser.Command
         """
+        self.send_message(client_socket, message, status, command.request_id)
 
-        # Adiciona o stop_event da thread dentro do argumento da funcão que será executada para poder ser finalizada depois
-        full_args = args + (stop_event,)
-        
-        thread = threading.Thread(target=target, args=full_args)
-        thread.daemon = True
-        thread.start()
-        
-        return thread
-    
+    def respond(self, client_socket, command, response):
+        """
+        Envia uma resposta com campos extras (ex.: schema, stats) a um comando, com o ID do pedido.
+
+        :param response: Resposta com 'status', 'message' e os campos extras.
+        :type response: dict
+        """
+        if command.request_id is not None:
+            response["request_id"] = command.request_id
+        self.manager.send_data(json.dumps(response), client_socket)
+
+    def send_to_session(self, session, message, key=None):
+        """
+        Envia uma mensagem pela conexão atual da sessão. Enquanto a sessão está desconectada, esperando
+        um /resume, a mensagem fica no backlog da sessão.
+
+        :param session: Sessão de destino.
+        :type session: SessionRegistry.Session
+        :param key: Chave do monitor, para amostras; None para mensagens de controle.
+        """
+        connection = session.buffer(message, key)
+        if connection is not None:
+            self.manager.send_data(message, connection, key=key)
+
+    def deliver_sample(self, session, task_id, metric, mode, sample):
+        """
+        Envia uma amostra do sampler compartilhado ao cliente inscrito, no formato negociado por ele.
+        Em uma assinatura com várias métricas (/subscribe), todas as métricas do disparo vão em um único frame.
+        Monitores com agrupamento (-b= / -f=) acumulam as amostras e enviam o lote em uma única mensagem.
+        Monitores com filtro (-on-change, -deadband=, -alert) descartam a amostra antes de formatá-la.
+        Sem lote nem delta, a mensagem é montada uma única vez por disparo e o mesmo frame é enviado
+        a todos os inscritos com o mesmo formato e modo.
+
+        :param session: A sessão do cliente (a amostra vai pela conexão atual dela, ou para o backlog).
+        :type session: SessionRegistry.Session
+        :param task_id: O ID do monitor.
+        :type task_id: str
+        :param metric: Nome da métrica (ex.: 'cpu', 'mem', 'top'), ou tupla de métricas de uma assinatura.
+        :type metric: str | tuple
+        :param mode: Modo de operação (0 = básico, 1 = avançado).
+        :type mode: int
+        :param sample: Amostra coletada pelo sampler.
+        :type sample: dict
+        """
+        monitor = session.monitors.get(task_id)
+        if monitor is None:
+            return
+        output_format = session.format
+
+        # Assinaturas trazem uma amostra por métrica, todas com o timestamp do disparo
+        metrics = metric if isinstance(metric, tuple) else (metric,)
+        # Métricas sem vetor fixo (ex.: /top) seguem como registros absolutos mesmo com delta ligado, assim
+        # como as amostras guardadas enquanto a sessão está desconectada (a cadeia de deltas recomeça no /resume)
+        delta = (
+            output_format == "binary" and session.stream["delta"] and session.connection is not None
+            and all(SampleCodec.supports_delta(name, mode) for name in metrics)
+        )
+        samples = sample["metrics"] if isinstance(metric, tuple) else {metric: sample}
+
+        sample_filter = monitor.filter
+        if sample_filter is not None:
+            alerts = sample_filter.evaluate(sample["timestamp"], samples)
+            if alerts is None:
+                return
+            for alert in alerts:
+                # Alertas são mensagens de controle: nunca são descartadas nem substituídas na fila
+                name, operator, limit, value, above = alert
+                self.send_to_session(session, json.dumps({
+                    "status": "warning",
+                    "message": f"[{task_id}] {SampleFilter.describe_alert(alert)}",
+                    "alert": {"monitor": task_id, "metric": name, "operator": operator, "limit": limit, "value": value, "active": above, "timestamp": sample["timestamp"]},
+                }))
+
+        if delta:
+            # Modo delta: a diferença é calculada só no envio, pelo escritor da conexão, para que
+            # amostras descartadas ou substituídas na fila de saída não quebrem a cadeia de deltas
+            item = (sample["timestamp"], [(name, SampleCodec.to_vector(name, mode, samples[name])) for name in metrics])
+        elif monitor.batch == 1:
+            self.send_to_session(session, self._shared_frame(output_format, mode, task_id, metrics, sample, samples), key=task_id)
+            return
+        elif output_format == "binary":
+            item = [self._encode_record(name, mode, task_id, samples[name]) for name in metrics]
+        else:
+            item = self._format_text(mode, metrics, sample, samples)
+
+        if monitor.batch > 1:
+            # Agrupamento: acumula até -b= amostras ou até a mais antiga esperar -f= milissegundos
+            pending = monitor.pending
+            encoding = (output_format, delta)
+            if pending and monitor.pending_encoding != encoding:
+                # O formato mudou no meio do lote (/format ou /stream): as amostras antigas são descartadas
+                pending.clear()
+            if not pending:
+                monitor.pending_since = time.monotonic()
+                monitor.pending_encoding = encoding
+            pending.append(item)
+            expired = monitor.flush and time.monotonic() - monitor.pending_since >= monitor.flush
+            if len(pending) < monitor.batch and not expired:
+                return
+            monitor.pending = []
+            items = pending
+        else:
+            items = [item]
+
+        if delta:
+            message = partial(self._encode_delta_batch, session, task_id, mode, items)
+        elif output_format == "binary":
+            # Vários registros (métricas de uma assinatura ou amostras de um lote) vão em um registro de lote
+            records = [record for item in items for record in item]
+            message = records[0] if len(records) == 1 else SampleCodec.encode_batch(records)
+        else:
+            response = {"status": "info", "message": "\n".join(items)}
+            if len(metrics) > 1 and len(items) == 1:
+                response["timestamp"] = sample["timestamp"]
+            message = json.dumps(response)
+
+        self.send_to_session(session, message, key=task_id)
+
+    def _shared_frame(self, output_format, mode, task_id, metrics, sample, samples):
+        """
+        Frame de uma amostra sem lote nem delta, montado uma vez por disparo e guardado na própria amostra,
+        que o sampler entrega a todos os inscritos do grupo. O mesmo buffer imutável segue para a fila
+        de todos eles, sem cópia nem nova serialização. No binário, o cabeçalho traz o ID do monitor,
+        então o frame é compartilhado entre os monitores com o mesmo ID (ex.: o primeiro de cada cliente).
+
+        :rtype: EncodedFrame
+        """
+        frames = sample.setdefault("frames", {})
+        key = (output_format, mode, task_id if output_format == "binary" else None)
+        frame = frames.get(key)
+        if frame is not None:
+            self.stats.record_shared_frame(True)
+            return frame
+
+        if output_format == "binary":
+            records = [self._encode_record(name, mode, task_id, samples[name]) for name in metrics]
+            message = records[0] if len(records) == 1 else SampleCodec.encode_batch(records)
+        else:
+            response = {"status": "info", "message": self._format_text(mode, metrics, sample, samples)}
+            if len(metrics) > 1:
+                response["timestamp"] = sample["timestamp"]
+            message = json.dumps(response)
+        frame = frames[key] = EncodedFrame(message)
+        self.stats.record_shared_frame(False)
+        return frame
+
+    @staticmethod
+    def _format_text(mode, metrics, sample, samples):
+        """
+        Texto de uma amostra, formatado uma vez por disparo e modo e reaproveitado pelos outros inscritos.
+        """
+        texts = sample.setdefault("text", {})
+        text = texts.get(mode)
+        if text is None:
+            text = texts[mode] = "\n".join(SampleFormatter.format(name, samples[name], mode) for name in metrics)
+        return text
+
+    @staticmethod
+    def _encode_record(metric, mode, task_id, sample):
+        """
+        Registro binário absoluto de uma amostra. O corpo é empacotado uma vez por amostra e modo,
+        e reaproveitado pelos outros inscritos.
+        """
+        encoded = sample.setdefault("encoded", {})
+        body = encoded.get(mode)
+        if body is None:
+            body = encoded[mode] = SampleCodec.encode_body(metric, mode, sample)
+        return SampleCodec.encode_header(metric, mode, task_id, sample["timestamp"]) + body
+
+    def _encode_delta(self, session, task_id, metric, mode, timestamp, vector):
+        """
+        Codifica uma amostra delta contra a última enviada ao monitor para a mesma métrica: keyframe
+        no início e a cada 'resync' amostras, diferenças no resto. Chamado no momento do envio.
+
+        :return: Registro binário, ou None se o monitor já foi encerrado.
+        :rtype: bytes
+        """
+        monitor = session.monitors.get(task_id)
+        if monitor is None:
+            return None
+
+        # Estado do delta por métrica: [amostras enviadas, último vetor]
+        if monitor.delta is None:
+            monitor.delta = {}
+        state = monitor.delta.setdefault(metric, [0, None])
+        previous = state[1]
+        if state[0] % session.stream["resync"] == 0:
+            previous = None
+        record = SampleCodec.encode_delta(metric, mode, task_id, timestamp, vector, previous)
+        state[0] += 1
+        state[1] = vector
+        return record
+
+    def _encode_delta_batch(self, session, task_id, mode, items):
+        """
+        Codifica amostras delta, em ordem, no momento do envio.
+
+        :param items: Lista de (timestamp, [(métrica, vetor), ...]).
+        :return: Registro binário (ou lote, se houver mais de um), ou None se o monitor já foi encerrado.
+        :rtype: bytes
+        """
+        records = []
+        for timestamp, vectors in items:
+            for metric, vector in vectors:
+                record = self._encode_delta(session, task_id, metric, mode, timestamp, vector)
+                if record is None:
+                    return None
+                records.append(record)
+        return records[0] if len(records) == 1 else SampleCodec.encode_batch(records)
+
+    def set_format(self, client_id, client_socket, command):
+        """
+        Negocia o formato de envio das amostras ('text' ou 'binary'). No formato binário,
+        o schema dos registros é enviado junto com a confirmação.
+
+        :param client_id: O ID do cliente.
+        :type client_id: str
+        :param client_socket: O socket do cliente.
+        :type client_socket: socket.socket
+        :param command: O comando recebido.
+        :type command: CommandParser.Command
+        """
+        if not command.arguments:
+            self.reply(client_socket, command, "Please specify a format: text or binary.", "error")
+            return
+
+        output_format = command.arguments[0].lower()
+        if output_format not in self.formats:
+            self.reply(client_socket, command, f"Format must be in {self.formats}.", "error")
+            return
+
+        self.sessions.get(client_id).format = output_format
+
+        response = {"status": "success", "message": f"Sample format set to {output_format}"}
+        if output_format == "binary":
+            response["schema"] = SampleCodec.schema()
+        self.respond(client_socket, command, response)
+
+    def set_stream(self, client_id, client_socket, command):
+        """
+        Negocia as opções de stream do cliente: codificação delta das amostras binárias
+        (-delta=on|off, -resync=<amostras>) e compressão zlib da conexão (-zlib=on).
+
+        :param client_id: O ID do cliente.
+        :type client_id: str
+        :param client_socket: O socket do cliente.
+        :type client_socket: socket.socket
+        :param command: O comando recebido.
+        :type command: CommandParser.Command
+        """
+        if not command.options or any(value is True for value in command.options.values()):
+            self.reply(client_socket, command, "Usage: /stream -delta=<on|off> -resync=<samples> -zlib=on", "error")
+            return
+        options = {key: value.lower() for key, value in command.options.items()}
+
+        for key in ("delta", "zlib"):
+            if key in options and options[key] not in {"on", "off"}:
+                self.reply(client_socket, command, f"Value of -{key} must be 'on' or 'off'.", "error")
+                return
+
+        session = self.sessions.get(client_id)
+        stream = dict(session.stream)
+
+        if "resync" in options:
+            if not options["resync"].isdigit() or int(options["resync"]) <= 0:
+                self.reply(client_socket, command, "Value of -resync must be a positive integer.", "error")
+                return
+            stream["resync"] = int(options["resync"])
+
+        if "delta" in options:
+            if options["delta"] == "on" and session.format != "binary":
+                self.reply(client_socket, command, "Delta encoding requires the binary format (/format binary).", "error")
+                return
+            stream["delta"] = options["delta"] == "on"
+
+        if options.get("zlib") == "off" and stream["zlib"]:
+            self.reply(client_socket, command, "Compression cannot be disabled once enabled.", "error")
+            return
+
+        enable_zlib = options.get("zlib") == "on" and not stream["zlib"]
+        stream["zlib"] = stream["zlib"] or enable_zlib
+
+        with session.lock:
+            session.stream = stream
+            # Reinicia o estado delta dos monitores: o próximo envio de cada um é um keyframe
+            for monitor in session.monitors.values():
+                monitor.delta = None
+
+        message = f"Stream options: delta={'on' if stream['delta'] else 'off'}, resync={stream['resync']}, zlib={'on' if stream['zlib'] else 'off'}"
+        response = {"status": "success", "message": message}
+        if command.request_id is not None:
+            response["request_id"] = command.request_id
+        if enable_zlib:
+            # O anúncio vai sem compressão; tudo o que vier depois dele é comprimido
+            response["compression"] = "zlib"
+            self.manager.enable_compression(json.dumps(response), client_socket)
+        else:
+            self.manager.send_data(json.dumps(response), client_socket)
 
     def help(self):
         """
@@ -65,39 +426,334 @@ class Server:
                     "Available commands:\n"
                     "/help - Show this help message\n"
                     "/exit - Close the connection\n"
-                    "/cpu -t=<seconds> -m=<mode> - Start CPU monitoring\n"
-                    "/mem -t=<seconds> -m=<mode> - Start Memory monitoring\n"
+                    "/cpu -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start CPU monitoring\n"
+                    "/mem -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start Memory monitoring\n"
+                    "/disk -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start Disk I/O monitoring\n"
+                    "/net -t=<seconds|ms> -m=<mode> [-b=<n>] [-f=<ms>] - Start Network monitoring\n"
+                    "/top -t=<seconds|ms> [-b=<n>] [-f=<ms>] - Start monitoring the processes using most CPU\n"
+                    "/subscribe <cpu,mem,disk,net,top> -t=<seconds|ms> -m=<mode> - One stream with all metrics sampled together\n"
                     "/quit <id> - Stop monitoring by ID\n"
                     "/monitors - Show all monitoring views\n"
+                    "/stats - Show server statistics\n"
+                    "/resume <token> - Resume a dropped session (its monitors and the samples buffered meanwhile)\n"
+                    "/ping - Check that the server is alive (clients answer the server's heartbeats with /pong)\n"
+                    "/history <cpu|mem> -s=<seconds> -r=<resolution> - Show min/avg/max history\n"
+                    "/replay <cpu|mem> -s=<seconds ago> -d=<seconds> -x=<speed> - Replay the persistent log (/replay stop)\n"
+                    "/format <text|binary> - Set the sample output format\n"
+                    "/stream -delta=<on|off> -resync=<samples> -zlib=on - Set stream encoding and compression\n"
                     "Modes: basic, advanced\n"
+                    "Intervals: -t=2, -t=0.5 or -t=100ms (minimum 10ms)\n"
+                    "Batching: -b=<n> sends n samples per message, -f=<ms> flushes a batch after at most ms\n"
+                    "Filters (cpu and mem): -on-change, -deadband=<points>%, -alert>90, -alert=mem<10, -heartbeat=<seconds>\n"
+                    "Pipelining: send several commands in one message, one per line; '#<id> /cpu ...' echoes <id> as request_id in the replies\n"
                 )
         return help_msg
 
-    def _validate_and_format_request(self, request):
+    @staticmethod
+    def _parse_interval(value):
         """
-        Valida e extrai os parâmetros de tempo e modo de um comando recebido.
+        Converte o valor de -t= em segundos. Aceita segundos (ex.: 2, 0.5) ou milissegundos (ex.: 100ms).
 
-        :param request: O comando recebido do cliente.
-        :type request: str
+        :param value: Valor informado pelo cliente.
+        :type value: str
+        :return: Intervalo em segundos, arredondado para milissegundos.
+        :rtype: int | float
+        """
+        try:
+            if value.lower().endswith("ms"):
+                milliseconds = float(value[:-2])
+            else:
+                milliseconds = float(value) * 1000
+        except ValueError:
+            milliseconds = math.nan
+        # inf, nan e valores como 1e400 não são intervalos (e round() falharia com OverflowError)
+        if not math.isfinite(milliseconds):
+            raise ValueError("Interval must be a number of seconds (e.g. 2, 0.5) or milliseconds (e.g. 100ms).")
+        milliseconds = round(milliseconds)
+
+        if milliseconds < Server.MIN_INTERVAL_MS:
+            raise ValueError(f"Interval must be at least {Server.MIN_INTERVAL_MS}ms.")
+        if milliseconds > Server.MAX_INTERVAL_MS:
+            raise ValueError(f"Interval must be at most {Server.MAX_INTERVAL_MS // 1000}s.")
+
+        # Intervalos inteiros continuam inteiros, para que monitores "-t=1" e "-t=1000ms" dividam o mesmo grupo
+        if milliseconds % 1000 == 0:
+            return milliseconds // 1000
+        return milliseconds / 1000
+
+    def _validate_and_format_request(self, command):
+        """
+        Valida e extrai os parâmetros de tempo, modo e agrupamento de um comando recebido,
+        com o intervalo e o modo padrão do servidor.
+
+        :rtype: tuple
+        """
+        return self.parse_monitor_request(command, self.timer, self.mode)
+
+    @staticmethod
+    def parse_monitor_request(command, default_timer=10, default_mode=0):
+        """
+        Valida e extrai os parâmetros de tempo, modo e agrupamento de um comando de monitor.
+
+        :param command: O comando recebido do cliente.
+        :type command: CommandParser.Command
+        :param default_timer: Intervalo usado sem -t=, em segundos.
+        :param default_mode: Modo usado sem -m=.
+        :return: Tupla (intervalo em segundos, modo, amostras por lote, espera máxima do lote em segundos).
+        :rtype: tuple
         """
-        if "-t=" in request:
-            input_timer = request.split("-t=")[1].split(" ")[0]
-            if not input_timer.isdigit():
-                raise ValueError("Value must be an integer.")
-            timer = int(input_timer)
+        input_timer = command.option("t")
+        timer = Server._parse_interval(input_timer) if input_timer is not None else default_timer
+
+        mode_string = command.option("m")
+        if mode_string is not None:
+            if mode_string not in Server.MODES:
+                raise ValueError(f"Mode must be in {Server.MODES}.")
+            mode = Server.MODES.index(mode_string)
         else:
-            timer = self.timer
+            mode = default_mode
+
+        batch = 1
+        input_batch = command.option("b")
+        if input_batch is not None:
+            if not input_batch.isdigit() or not 1 <= int(input_batch) <= Server.MAX_BATCH:
+                raise ValueError(f"Batch size must be an integer between 1 and {Server.MAX_BATCH}.")
+            batch = int(input_batch)
+
+        flush = 0
+        input_flush = command.option("f")
+        if input_flush is not None:
+            input_flush = input_flush.lower().removesuffix("ms")
+            if not input_flush.isdigit() or int(input_flush) <= 0:
+                raise ValueError("Flush interval must be a positive integer of milliseconds.")
+            flush = int(input_flush) / 1000
+            if batch == 1:
+                # Só com -f=, o lote é limitado pelo tempo (e pelo tamanho máximo)
+                batch = Server.MAX_BATCH
+
+        return timer, mode, batch, flush
+
+    @staticmethod
+    def check_monitor_command(command):
+        """
+        Valida um comando de monitor (/cpu, /mem, /disk, /net, /top) ou /subscribe sem iniciá-lo: opções,
+        métricas, intervalo, modo, agrupamento e filtro. Usada pelo relay para recusar um comando inválido
+        antes de repassá-lo na conexão compartilhada com o servidor.
+
+        :param command: O comando interpretado.
+        :type command: CommandParser.Command
+        :raises ValueError: Com a mensagem de erro que o servidor devolveria.
+        """
+        unknown = [name for name in command.options if name not in Server.MONITOR_OPTIONS]
+        if unknown:
+            raise ValueError(f"Unknown option -{unknown[0]} for {command.name}. Use /help to see available commands.")
 
-        if "-m=" in request:
-            mode_string = request.split("-m=")[1].split(" ")[0]
-            if mode_string not in self.modes:
-                raise ValueError(f"Mode must be in {self.modes}.")
-            mode = self.modes.index(mode_string)
+        if command.name == "/subscribe":
+            if not command.arguments:
+                raise ValueError("Usage: /subscribe <metric,metric,...> -t=<interval> -m=<mode>")
+            metrics = [name.strip().lower() for name in command.arguments[0].split(",") if name.strip()]
+            if not metrics or any(name not in Server.MONITOR_TYPES for name in metrics):
+                raise ValueError(f"Metrics must be in {list(Server.MONITOR_TYPES)}.")
         else:
-            mode = self.mode
+            metrics = [command.name.removeprefix("/")]
+            if metrics[0] not in Server.MONITOR_TYPES:
+                raise ValueError("Unknown command. Use /help to see available commands.")
+
+        Server.parse_monitor_request(command)
+        SampleFilter.from_request(command.tokens, metrics)
+
+    def history_report(self, command):
+        """
+        Consulta o histórico de uma métrica: /history <metric> -s=<seconds> -r=<resolution>.
+
+        :param command: O comando recebido do cliente.
+        :type command: CommandParser.Command
+        :return: Tupla (sucesso, mensagem, dados). Os dados são os buckets com min/max/avg por campo.
+        :rtype: tuple
+        """
+        if not command.arguments or command.arguments[0].lower() not in self.history.FIELDS:
+            return False, f"Usage: /history <{'|'.join(self.history.FIELDS)}> -s=<seconds> -r=<resolution>", None
+        metric = command.arguments[0].lower()
+
+        values = {"s": 60, "r": 10}
+        for flag in values:
+            if flag in command.options:
+                value = command.options[flag]
+                if value is True or not value.isdigit() or int(value) <= 0:
+                    return False, "Values of -s and -r must be positive integers.", None
+                values[flag] = int(value)
+
+        seconds = min(values["s"], self.history.retention())
+        resolution = max(values["r"], self.history.interval)
+        data = self.history.query(metric, time.time() - seconds, resolution)
+
+        if not data["buckets"]:
+            return False, f"No history for {metric} yet.", None
+
+        lines = [f"{metric.upper()} history (last {seconds}s, {resolution}s buckets) - min/avg/max:"]
+        for bucket in data["buckets"]:
+            start = datetime.fromtimestamp(bucket["start"]).strftime('%H:%M:%S')
+            columns = [
+                f"{field}={self._format_history_value(field, low)}/{self._format_history_value(field, avg)}/{self._format_history_value(field, high)}"
+                for field, low, avg, high in zip(data["fields"], bucket["min"], bucket["avg"], bucket["max"])
+            ]
+            lines.append(f" {start} " + ", ".join(columns))
+        return True, "\n".join(lines), data
+
+    def replay(self, client_id, client_socket, command):
+        """
+        Reproduz um intervalo do log persistente: /replay <metric> -s=<segundos atrás> -d=<duração> -x=<velocidade>.
+        As amostras chegam com o espaçamento original dividido pela velocidade. '/replay stop' interrompe.
+
+        :param command: O comando recebido do cliente.
+        :type command: CommandParser.Command
+        """
+        argument = command.arguments[0].lower() if command.arguments else None
+        session = self.sessions.get(client_id)
+        if argument == "stop":
+            current = session.replay
+            if current is None:
+                self.reply(client_socket, command, "No replay running.", "error")
+            else:
+                current.stop()
+            return
+
+        if self.log is None:
+            self.reply(client_socket, command, "The persistent log is disabled on this server.", "error")
+            return
+        if argument not in self.log.fields:
+            self.reply(client_socket, command, f"Usage: /replay <{'|'.join(self.log.fields)}> -s=<seconds ago> -d=<seconds> -x=<speed>", "error")
+            return
+        metric = argument
+
+        values = {"s": 300.0, "d": None, "x": 1.0}
+        for flag in values:
+            if flag in command.options:
+                try:
+                    values[flag] = float(command.options[flag])
+                except (TypeError, ValueError):
+                    values[flag] = 0
+                if values[flag] <= 0:
+                    self.reply(client_socket, command, "Values of -s, -d and -x must be positive numbers.", "error")
+                    return
+
+        since = time.time() - values["s"]
+        until = since + values["d"] if values["d"] else time.time()
+        fields = self.log.fields[metric]
+
+        def send(records):
+            lines = [
+                f"[replay] {metric.upper()} {datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} "
+                + ", ".join(f"{field}={self._format_history_value(field, value)}" for field, value in zip(fields, record))
+                for timestamp, record in records
+            ]
+            data = {"metric": metric, "fields": list(fields), "records": [[timestamp] + list(record) for timestamp, record in records]}
+            self.manager.send_data(json.dumps({"status": "info", "message": "\n".join(lines), "replay": data}), client_socket)
+
+        def done(sent, stopped):
+            if not session.swap_replay(replay, None):
+                return
+            if not sent and not stopped:
+                self.reply(client_socket, command, f"No logged {metric} samples in that range.", "warning")
+            else:
+                self.reply(client_socket, command, f"Replay {'stopped' if stopped else 'finished'}: {sent} samples", "success")
+
+        replay = LogReplay(self.log.read(metric, since, until), values["x"], send, done)
+        if not session.swap_replay(None, replay):
+            self.reply(client_socket, command, "A replay is already running. Use /replay stop first.", "error")
+            return
+
+        self.reply(client_socket, command, f"Replaying {metric} from {datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M:%S')} at {values['x']:g}x", "success")
+        replay.start()
+
+    @staticmethod
+    def _format_history_value(field, value):
+        if field in {"used", "available"}:
+            return f"{value / (1024**3):.2f}GB"
+        return f"{value:.1f}"
+
+    def stats_report(self):
+        """
+        Monta o relatório de instrumentação do servidor, usado por /stats e pelo comando 'stats' do console.
+
+        :return: Tupla (mensagem, dados).
+        :rtype: tuple
+        """
+        data = self.stats.snapshot()
+
+        # Monitores ativos por tipo e modo
+        active_monitors = {}
+        for session in self.sessions.sessions():
+            for monitor in list(session.monitors.values()):
+                key = f"{monitor.type}/{self.modes[monitor.mode]}"
+                active_monitors[key] = active_monitors.get(key, 0) + 1
+        data["active_monitors"] = active_monitors
+        data["sampler_groups"] = {
+            f"{'+'.join(metric) if isinstance(metric, tuple) else metric}/{interval}": count
+            for (metric, interval), count in self.sampler.active_groups().items()
+        }
+        data["scheduler_jitter_ms"] = self.sampler.scheduler.jitter_stats()
+        data["detached_sessions"] = self.sessions.detached_count()
+
+        lines = [
+            f"Uptime: {data['uptime_s']:.0f}s",
+            f"Connections: accepted={data['accepted']}, rejected={data['rejected']}, timed out={data['timed_out']}, "
+            f"rate={data['accept_rate']['average']:.2f}/s (last {ServerStats.ACCEPT_WINDOW}s: {data['accept_rate']['recent']:.2f}/s)",
+            f"Sent: {data['messages_sent']} messages, {data['bytes_sent']} bytes "
+            f"(sample frames: {data['frames']['built']} built, {data['frames']['shared']} shared)",
+            ServerStats.format_histogram("Send latency", data["send_latency_ms"]),
+            ServerStats.format_histogram("Lock wait (sessions)", data["lock_wait_ms"]),
+        ]
+        for metric, summary in data["sampling_ms"].items():
+            lines.append(ServerStats.format_histogram(f"Sampling {metric}", summary))
+        lines.append("Active monitors: " + (", ".join(f"{key}={count}" for key, count in active_monitors.items()) or "none"))
+        lines.append(f"Detached sessions (waiting for /resume): {data['detached_sessions']}")
+        lines.append("Clients:")
+        for client_id, counters in data["clients"].items():
+            line = f" - {client_id}: {counters['messages_sent']} messages, {counters['bytes_sent']} bytes"
+            queue = counters.get("queue")
+            if queue is not None:
+                line += (
+                    f", queue={queue['depth']} ({queue['bytes']} bytes, {queue['policy']}), "
+                    f"dropped={queue['dropped']}, coalesced={queue['coalesced']}"
+                )
+            lines.append(line)
+        return "\n".join(lines), data
+
+    def start_monitor(self, client_id, client_socket, metric, monitor_type, command):
+        """
+        Registra um monitor do cliente e o inscreve no sampler compartilhado.
+
+        :param client_id: O ID do cliente.
+        :type client_id: str
+        :param client_socket: O socket do cliente (ou AsyncConnection no motor asyncio).
+        :param metric: Nome da métrica, ou tupla de métricas de uma assinatura.
+        :type metric: str | tuple
+        :param monitor_type: Descrição do monitor exibida ao cliente.
+        :type monitor_type: str
+        :param command: O comando recebido, com os parâmetros -t=, -m=, -b=, -f= e as opções de filtro.
+        :type command: CommandParser.Command
+        """
+        try:
+            timer, mode, batch, flush = self._validate_and_format_request(command)
+            sample_filter = SampleFilter.from_request(command.tokens, metric if isinstance(metric, tuple) else (metric,))
+        except ValueError as e:
+            self.reply(client_socket, command, str(e), "error")
+            return
+
+        # Registra o monitoramento na sessão do cliente
+        session = self.sessions.get(client_id)
+        monitor = session.add_monitor(metric, timer, monitor_type, mode, batch, flush, sample_filter)
+        task_id = monitor.task_id
+
+        # Inscreve o monitor no sampler compartilhado. A inscrição é da sessão (pelo token), e não da
+        # conexão, para sobreviver a uma retomada por /resume
+        callback = partial(self.deliver_sample, session, task_id, metric, mode)
+        self.sampler.subscribe(metric, timer, (session.token, task_id), callback)
+
+        Colors.ok(f"Starting {monitor_type} monitoring ({task_id}) for {client_id}")
+        self.reply(client_socket, command, f"{monitor_type} monitoring started with ID: {task_id}", "success")
 
-        return timer, mode
-    
     def monitors(self, client_id, client_socket, client_address):
         """
         Retorna a lista de monitores ativos para o cliente.
@@ -109,37 +765,305 @@ class Server:
         :param client_address: O endereço do cliente.
         :type client_address: tuple
         """
-        client_monitors = self._clients.get(client_id, {}).get("monitor", {})
+        session = self.sessions.get(client_id)
+        client_monitors = list(session.monitors.values()) if session is not None else []
         if not client_monitors:
             return False, "No active monitors."
             
         monitors_list = [
-            f" - {id}: {info['type']} in '{self.modes[info['mode']]}' mode"
-            for id, info in client_monitors.items()
+            f" - {monitor.task_id}: {monitor.type} in '{self.modes[monitor.mode]}' mode"
+            + (f" [{monitor.filter.describe()}]" if monitor.filter is not None else "")
+            for monitor in client_monitors
         ]
         response = "Active monitors:\n" + "\n".join(monitors_list)
         return True, response
 
     
-    def handle_client(self, client_socket, client_address):
+    def open_session(self, client_socket, client_address):
         """
-        Função principal de atendimento ao cliente. Processa comandos e gerencia monitores.
+        Registra um novo cliente e envia as mensagens iniciais.
 
-        :param client_socket: O socket do cliente.
-        :type client_socket: socket.socket
+        :param client_socket: O socket do cliente (ou AsyncConnection no motor asyncio).
         :param client_address: O endereço do cliente.
         :type client_address: tuple
+        :return: O ID do cliente.
+        :rtype: str
         """
-
         client_id = f"{client_address[0]}:{client_address[1]}"
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Accepted connection from {client_address[0]}:{client_address[1]}")
-        self.send_message(client_socket, f"Connected to server at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", "info")
+        self.stats.register_client(client_socket, client_id)
+        session = self.sessions.create(client_id, client_socket)
+
+        welcome = {"status": "info", "message": f"Connected to server at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"}
+        if self.resume_grace:
+            # Token para retomar a sessão (/resume) se a conexão cair
+            welcome["session"] = session.token
+            welcome["resume_grace"] = self.resume_grace
+        self.manager.send_data(json.dumps(welcome), client_socket)
         self.send_message(client_socket, self.help(), "info")
-        with self.lock:
-            self._clients[client_id] = {
-                "monitor": {},
-                "monitors_count": 0
-            }
+        return client_id
+
+    def close_session(self, client_id, resumable=False):
+        """
+        Remove o cliente e todas as inscrições dos seus monitores. Se a conexão caiu (sem /exit) e a
+        sessão tem monitores, ela fica desconectada por resume_grace segundos, esperando um /resume.
+
+        :param client_id: O ID do cliente.
+        :type client_id: str
+        :param resumable: True se a conexão terminou sem /exit.
+        :type resumable: bool
+        """
+        session = self.sessions.get(client_id)
+        if session is None:
+            return
+        if session.replay is not None:
+            session.replay.stop()
+
+        if resumable and self.resume_grace and session.monitors:
+            self.sessions.detach(client_id, self.resume_grace)
+            Colors.warning(f"Session of {client_id} detached: {len(session.monitors)} monitors kept for {self.resume_grace}s")
+            return
+
+        # Limpeza de recursos ao encerrar o atendimento ao cliente
+        Colors.success(f"Cleaning up thread and memory for {client_id}")
+        self.sessions.remove(client_id)
+        self.stop_monitors(session)
+
+    def stop_monitors(self, session):
+        """
+        Remove todas as inscrições dos monitores de uma sessão que já saiu do registro, sem segurar nenhum lock.
+
+        :type session: SessionRegistry.Session
+        """
+        for monitor in session.take_monitors():
+            self.sampler.unsubscribe(monitor.metric, monitor.interval, (session.token, monitor.task_id))
+            print(f"Stop signal for {monitor.task_id} from client {session.client_id}")
+
+    def expire_sessions(self):
+        """
+        Thread que encerra as sessões desconectadas cujo período de graça acabou sem um /resume.
+        """
+        while self.manager.running:
+            time.sleep(1)
+            for session in self.sessions.expire():
+                Colors.success(f"Session of {session.client_id} expired, cleaning up {len(session.monitors)} monitors")
+                self.stop_monitors(session)
+
+    def start_session_expiry(self):
+        """
+        Inicia a thread que expira as sessões desconectadas, se a retomada de sessões estiver ligada.
+        """
+        if self.resume_grace:
+            thread = threading.Thread(target=self.expire_sessions, name="SessionExpiry")
+            thread.daemon = True
+            thread.start()
+
+    def handle_request(self, client_id, client_socket, client_address, request):
+        """
+        Processa um frame de comandos recebido do cliente. Não bloqueia, então é usado pelos dois motores.
+
+        O frame pode trazer vários comandos, um por linha, cada um com um ID opcional ('#<id>') que volta
+        nas respostas. Os comandos são executados em ordem; depois de um /exit, o resto do frame é ignorado.
+
+        :param client_id: O ID do cliente.
+        :type client_id: str
+        :param client_socket: O socket do cliente (ou AsyncConnection no motor asyncio).
+        :param client_address: O endereço do cliente.
+        :type client_address: tuple
+        :param request: O frame recebido.
+        :type request: str
+        :return: False se a conexão deve ser encerrada, True caso contrário.
+        :rtype: bool
+        """
+        for command in CommandParser.parse_frame(request):
+            if not self.dispatch(client_id, client_socket, command):
+                return False
+        return True
+
+    def dispatch(self, client_id, client_socket, command):
+        """
+        Executa um comando pela tabela de comandos, depois de validar as opções aceitas por ele.
+
+        :param command: O comando interpretado.
+        :type command: CommandParser.Command
+        :return: False se a conexão deve ser encerrada, True caso contrário.
+        :rtype: bool
+        """
+        if command.error is not None:
+            self.reply(client_socket, command, command.error, "error")
+            return True
+
+        entry = self.commands.get(command.name)
+        if entry is None:
+            self.reply(client_socket, command, "Unknown command. Use /help to see available commands.", "error")
+            return True
+
+        handler, accepted = entry
+        unknown = [name for name in command.options if name not in accepted]
+        if unknown:
+            self.reply(client_socket, command, f"Unknown option -{unknown[0]} for {command.name}. Use /help to see available commands.", "error")
+            return True
+
+        return handler(client_id, client_socket, command) is not False
+
+    def command_exit(self, client_id, client_socket, command):
+        # Encerra a conexão com o cliente
+        self.reply(client_socket, command, "Connection ended", "success")
+        return False
+
+    def command_help(self, client_id, client_socket, command):
+        self.reply(client_socket, command, self.help(), "info")
+
+    def command_monitors(self, client_id, client_socket, command):
+        # Lista monitores ativos
+        success, response = self.monitors(client_id, client_socket, None)
+        self.reply(client_socket, command, response, "info" if success else "error")
+
+    def command_monitor(self, metric, monitor_type, client_id, client_socket, command):
+        # Inicia monitoramento de uma métrica (/cpu, /mem, /disk, /net ou /top)
+        self.start_monitor(client_id, client_socket, metric, monitor_type, command)
+
+    def command_subscribe(self, client_id, client_socket, command):
+        """
+        Assinatura de várias métricas em um único stream: /subscribe <metric,metric,...>.
+        """
+        if not command.arguments:
+            self.reply(client_socket, command, "Usage: /subscribe <metric,metric,...> -t=<interval> -m=<mode>", "error")
+            return
+
+        requested = [name.strip().lower() for name in command.arguments[0].split(",") if name.strip()]
+        unknown = [name for name in requested if name not in self.sampler.collectors]
+        if unknown or not requested:
+            self.reply(client_socket, command, f"Metrics must be in {list(self.sampler.collectors)}.", "error")
+            return
+
+        # Ordem canônica: "mem,cpu" e "cpu,mem" compartilham o mesmo grupo no sampler
+        metrics = tuple(name for name in self.sampler.collectors if name in requested)
+        self.start_monitor(client_id, client_socket, metrics, f"Subscription ({','.join(metrics)})", command)
+
+    def command_quit(self, client_id, client_socket, command):
+        """
+        Encerra um monitoramento específico: /quit <id>.
+        """
+        if not command.arguments:
+            self.reply(client_socket, command, "Please specify a monitor ID to quit.", "error")
+            return
+        task_id_to_quit = command.arguments[0]
+
+        monitor_to_quit = self.sessions.get(client_id).remove_monitor(task_id_to_quit)
+        if monitor_to_quit is None:
+            self.reply(client_socket, command, f"Monitor ID '{task_id_to_quit}' not found.", "error")
+            return
+
+        # Remove a inscrição do monitor no sampler; a resposta só é enviada depois, fora de qualquer lock
+        self.sampler.unsubscribe(monitor_to_quit.metric, monitor_to_quit.interval, (self.sessions.get(client_id).token, task_id_to_quit))
+        self.reply(client_socket, command, f"Stopped monitoring ({task_id_to_quit}) for {client_id}", "success")
+        Colors.success(f"Stopped monitoring ({task_id_to_quit}) for {client_id}")
+
+    def command_resume(self, client_id, client_socket, command):
+        """
+        Retoma uma sessão desconectada: /resume <token>. Os monitores continuam com os mesmos IDs e
+        as mensagens guardadas durante a queda são enviadas logo depois da confirmação, em ordem.
+        """
+        if not command.arguments:
+            self.reply(client_socket, command, "Usage: /resume <session token>", "error")
+            return
+
+        current = self.sessions.get(client_id)
+        if current.monitors:
+            self.reply(client_socket, command, "A session can only be resumed before starting monitors on this connection.", "error")
+            return
+
+        session = self.sessions.take_detached(command.arguments[0])
+        if session is None:
+            session = self.take_over_session(client_id, command.arguments[0])
+        if session is None:
+            self.reply(client_socket, command, "Unknown or expired session.", "error")
+            return
+
+        # A sessão retomada passa a ser a desta conexão; a sessão nova, ainda vazia, é descartada
+        self.sessions.remove(client_id)
+        session.client_id = client_id
+        # A conexão nova começa sem compressão, e a cadeia de deltas de cada monitor recomeça com um keyframe
+        session.stream = dict(session.stream, zlib=False)
+        for monitor in session.monitors.values():
+            monitor.delta = None
+        self.sessions.add(session)
+
+        # A sessão segue desconectada até o fim: amostras novas continuam indo para o backlog, e a confirmação
+        # e as mensagens guardadas são enfileiradas fora do lock, antes de qualquer amostra enviada direto
+        backlog = session.take_backlog()
+        buffered = len(backlog)
+        self.respond(client_socket, command, {
+            "status": "success",
+            "message": f"Session resumed: {len(session.monitors)} monitors, {buffered} buffered messages",
+            "session": session.token,
+            "monitors": list(session.monitors),
+        })
+        while backlog is not None:
+            for message, key in backlog:
+                self.manager.send_data(message, client_socket, key=key)
+            # Publica a conexão só quando o backlog estiver vazio; o que chegou nesse meio-tempo vai antes
+            backlog = session.attach(client_socket)
+            if backlog is not None:
+                buffered += len(backlog)
+
+        Colors.ok(f"Session resumed by {client_id}: {len(session.monitors)} monitors, {buffered} buffered messages")
+
+    def take_over_session(self, client_id, token):
+        """
+        Retoma uma sessão que ainda está conectada: o cliente reconectou antes de o servidor perceber
+        a queda da conexão antiga (ex.: antes do timeout de inatividade). A sessão é desconectada, a
+        conexão antiga é derrubada e a sessão segue o caminho normal do /resume.
+
+        :return: A sessão, já fora do registro de desconectadas, ou None se o token não é de outra conexão.
+        :rtype: SessionRegistry.Session | None
+        """
+        session = self.sessions.find_token(token)
+        if not self.resume_grace or session is None or session.client_id == client_id:
+            return None
+        previous = session.connection
+        if self.sessions.detach(session.client_id, self.resume_grace) is not session:
+            return None
+        if previous is not None:
+            # O atendimento da conexão antiga termina sem encontrar a sessão, que já mudou de client_id
+            self.manager.abort_connection(previous)
+        Colors.warning(f"Session of {session.client_id} taken over by {client_id}")
+        return self.sessions.take_detached(token)
+
+    def command_history(self, client_id, client_socket, command):
+        # Consulta o histórico agregado de uma métrica
+        success, message, data = self.history_report(command)
+        if not success:
+            self.reply(client_socket, command, message, "error")
+        else:
+            self.respond(client_socket, command, {"status": "info", "message": message, "history": data})
+
+    def command_stats(self, client_id, client_socket, command):
+        # Estatísticas de instrumentação do servidor
+        message, data = self.stats_report()
+        self.respond(client_socket, command, {"status": "info", "message": message, "stats": data})
+
+    def command_ping(self, client_id, client_socket, command):
+        # Verificação de vida iniciada pelo cliente
+        self.respond(client_socket, command, {"status": "success", "message": "pong", "timestamp": time.time()})
+
+    def command_pong(self, client_id, client_socket, command):
+        # Resposta a um heartbeat do servidor: basta ter chegado, não há o que responder
+        pass
+
+    def handle_client(self, client_socket, client_address):
+        """
+        Função principal de atendimento ao cliente no motor com threads. Processa comandos e gerencia monitores.
+
+        :param client_socket: O socket do cliente.
+        :type client_socket: socket.socket
+        :param client_address: O endereço do cliente.
+        :type client_address: tuple
+        """
+        client_id = self.open_session(client_socket, client_address)
+        # A sessão só pode ser retomada se a conexão caiu, e não quando o cliente pediu /exit
+        resumable = True
         try:
             # Loop principal de atendimento ao cliente
             while self.manager.running:
@@ -149,207 +1073,234 @@ class Server:
                     if not data:
                         # Se não houver comando, encerra a conexão
                         break
-                    request = data.decode('utf-8')
-
-                    # Separa a requisição por espaços
-                    req = request.strip(" ")  # Remove espaços extras
 
-                    # Comandos fixos sem parâmetros
-                    if request.lower() == "/exit":
-                        # Encerra a conexão com o cliente
-                        self.send_message(client_socket=client_socket, message="Connection ended", status="success")
+                    if not self.handle_request(client_id, client_socket, client_address, data.decode('utf-8')):
+                        resumable = False
                         break
 
-                    elif request.lower() == "/monitors":
-                        # Lista monitores ativos
-                        success, response = self.monitors(client_id, client_socket, client_address)
-                        if not success:
-                            self.send_message(client_socket, response, "error")
-                        else:
-                            self.send_message(client_socket, response, "info")
-                        continue
-
-                    elif request.lower() == "/help":
-                        # Envia mensagem de ajuda
-                        self.send_message(client_socket, self.help(), "info")
-                        continue
-                    
-                    elif req.lower().startswith("/cpu") or req.lower().startswith("/mem"):
-                        # Inicia monitoramento de CPU ou Memória
-                        is_cpu = req.lower().startswith("/cpu")
-                        monitor_type = "CPU" if is_cpu else "Memory"
-                        target_func = self.cpu if is_cpu else self.mem
-
-                        try:
-                            timer, mode = self._validate_and_format_request(req)
-                            
-                        except ValueError as e:
-                            self.send_message(client_socket, str(e), "error")
-                            continue
-
-                        # Cria e inicia thread de monitoramento
-                        stop_event = threading.Event()
-                        thread_args = (client_socket, timer, mode)
-                        thread = self.create_thread(
-                            target=target_func, 
-                            args=thread_args,
-                            stop_event=stop_event
-                        )
-
-                        # Registra o monitoramento no dicionário do cliente
-                        with self.lock:
-                            client_data = self._clients[client_id]
-                            task_id = f"{client_data['monitors_count']}"
-                            client_data["monitors_count"] += 1
-
-                            client_data["monitor"][task_id] = {
-                                "thread": thread,
-                                "stop_event": stop_event,
-                                "type": monitor_type,
-                                "mode": mode
-                            }
-
-                        Colors.ok(f"Starting {monitor_type} monitoring ({task_id}) for {client_id}")
-                        self.send_message(client_socket, f"{monitor_type} monitoring started with ID: {task_id}", "success")
-                        
-                    elif req.lower().startswith("/quit"):
-                        # Encerra monitoramento específico
-                        try:
-                            task_id_to_quit = req.split(" ")[1]
-                        except IndexError:
-                            self.send_message(client_socket, "Please specify a monitor ID to quit.", "error")
-                            continue
-                        
-                        with self.lock:
-                            monitor_to_quit = self._clients.get(client_id, {}).get("monitor", {}).get(task_id_to_quit)
-                            if monitor_to_quit:
-                                # Sinaliza para a thread parar
-                                monitor_to_quit["stop_event"].set()
-                                del self._clients[client_id]["monitor"][task_id_to_quit]
-                                self.send_message(client_socket, f"Stopped monitoring ({task_id_to_quit}) for {client_id}", "success")
-                                Colors.success(f"Stopped monitoring ({task_id_to_quit}) for {client_id}")
-                            else:
-                                self.send_message(message=f"Monitor ID '{task_id_to_quit}' not found.", client_socket=client_socket, status="error")
-
-                    else:
-                        # Comando desconhecido
-                        self.send_message(client_socket, "Unknown command. Use /help to see available commands.", "error")
-                        continue
-
                 except Exception as e:
                     Colors.error(f"Error handling client {client_address}: {Colors.OKBLUE}{str(e)}")
                     break
         finally:
-            # Limpeza de recursos ao encerrar o atendimento ao cliente
-            Colors.success(f"Cleaning up thread and memory for {client_id}")
-            with self.lock:
-                if client_id in self._clients:
-                    for task_id, monitor_info in self._clients[client_id]["monitor"].items():
-                        # Sinaliza para todas as threads de monitoramento pararem
-                        monitor_info["stop_event"].set()
-                        print(f"Stop signal for {task_id} from client {client_id}")
-                    del self._clients[client_id]
-
-        client_socket.close()
+            self.close_session(client_id, resumable and self.manager.running)
+
+        # O socket é fechado pelo ServerManager, depois que o escritor envia o que ainda está na fila
         Colors.success(f"Connection to {client_address} closed")
 
-    def mem(self, client_socket, seconds, mode, stop_event):
+    async def handle_client_async(self, connection, client_address):
         """
-        Função de monitoramento de memória. Envia informações periodicamente ao cliente.
-        
-        :param client_socket: O socket do cliente.
-        :type client_socket: socket.socket
-        :param seconds: Intervalo de tempo entre as verificações.
-        :type seconds: int
-        :param mode: Modo de operação (0 = básico, 1 = avançado).
-        :type mode: int
-        :param stop_event: Evento para sinalizar a parada da thread.
-        :type stop_event: threading.Event
-        """
-        while not stop_event.is_set():
-            mem = psutil.virtual_memory()
-            swap = psutil.swap_memory()
-            msg_lines = []
-            msg_lines.append(f"💾 Memory Usage: {mem.percent:.1f}%")
-            msg_lines.append(f"📊 Available: {mem.available / (1024**3):.2f} GB")
-            msg_lines.append(f"📈 Used: {mem.used / (1024**3):.2f} GB")
-            msg_lines.append(f"📉 Free: {mem.free / (1024**3):.2f} GB")
-            
-            if mode == 1:  # advanced
-                msg_lines.append(f"🔄 Swap Usage: {swap.percent:.1f}%")
-                msg_lines.append(f"↔️ Swap Total: {swap.total / (1024**3):.2f} GB")
-                msg_lines.append(f"⬆️ Swap Used: {swap.used / (1024**3):.2f} GB")
-                msg_lines.append(f"⬇️ Swap Free: {swap.free / (1024**3):.2f} GB")
-                msg_lines.append(f"🧠 Buffers: {getattr(mem, 'buffers', 0) / (1024**2):.2f} MB")
-                msg_lines.append(f"🗄️ Cached: {getattr(mem, 'cached', 0) / (1024**2):.2f} MB")
-                msg_lines.append(f"🔁 Shared: {getattr(mem, 'shared', 0) / (1024**2):.2f} MB")
+        Função principal de atendimento ao cliente no motor asyncio.
 
-            try:
-                self.send_message(client_socket, "\n".join(msg_lines), status="info")
-            except:
-                break
+        :param connection: A conexão do cliente.
+        :type connection: AsyncServerManager.AsyncConnection
+        :param client_address: O endereço do cliente.
+        :type client_address: tuple
+        """
+        client_id = self.open_session(connection, client_address)
+        # A sessão só pode ser retomada se a conexão caiu, e não quando o cliente pediu /exit
+        resumable = True
+        try:
+            # Loop principal de atendimento ao cliente
+            while self.manager.running:
+                try:
+                    # Recebe comando do cliente
+                    data = await self.manager.receive_data(connection)
+                    if not data:
+                        # Se não houver comando, encerra a conexão
+                        break
+
+                    if not self.handle_request(client_id, connection, client_address, data.decode('utf-8')):
+                        resumable = False
+                        break
 
-            time.sleep(seconds)
+                except Exception as e:
+                    Colors.error(f"Error handling client {client_address}: {Colors.OKBLUE}{str(e)}")
+                    break
+        finally:
+            self.close_session(client_id, resumable and self.manager.running)
+
+        connection.close()
+        Colors.success(f"Connection to {client_address} closed")
 
-    def cpu(self, client_socket, seconds, mode, stop_event):
+    def start(self, shared_memory=None, metric_log=None):
         """
-        Função de monitoramento de CPU. Envia informações periodicamente ao cliente.
+        Inicia o servidor e aceita conexões de clientes.
 
-        :param client_socket: O socket do cliente.
-        :type client_socket: socket.socket
-        :param seconds: Intervalo de tempo entre as verificações.
-        :type seconds: int
-        :param mode: Modo de operação (0 = básico, 1 = avançado).
-        :type mode: int
-        :param stop_event: Evento para sinalizar a parada da thread.
-        :type stop_event: threading.Event
+        :param shared_memory: Opções do segmento de memória compartilhada (path, capacity, interval), ou None.
+        :type shared_memory: dict | None
+        :param metric_log: Opções do log persistente (directory, interval, segment_seconds, retention), ou None.
+        :type metric_log: dict | None
         """
-        while not stop_event.is_set():
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_times_per_core = psutil.cpu_times(percpu=True)
-            load_avg = psutil.getloadavg()
 
-            msg_lines = []
-            msg_lines.append(f"📊 CPU Usage: {cpu_percent:.1f}%")
-            
-            if mode == 1:  # advanced
-                msg_lines.append("🖥️  CPU Times per Core:")
-                for i, core_time in enumerate(cpu_times_per_core, start=1):
-                    msg_lines.append(
-                        f"   Core {i}: user={core_time.user:.2f}s, "
-                        f"system={core_time.system:.2f}s, "
-                        f"idle={core_time.idle:.2f}s"
-                    )
-                msg_lines.append(
-                    f"📈 Load Average (1m, 5m, 15m): "
-                    f"{load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}"
-                )
+        Colors.header("System Monitor")
+        connection_limits = self.ask_connection_limits()
+        self.manager.set_connection_limits(connection_limits)
 
-            try:
-                self.send_message(client_socket, "\n".join(msg_lines), status="info")
-            except:
-                break
+        self.start_manager()
+        Colors.info(f"Collector backend: {self.sampler.backend.name}")
+        self.start_history()
+        if shared_memory:
+            self.shared = self.start_shared_memory(self.sampler, **shared_memory)
+        log_writer = None
+        if metric_log:
+            log_writer = self.start_metric_log(self.sampler, **metric_log)
+            self.log = MetricLogReader(metric_log["directory"])
 
-            time.sleep(seconds)
+        try:
+            self.handle_server()
+        finally:
+            if self.shared is not None:
+                self.shared.close()
+            if log_writer is not None:
+                log_writer.close()
 
-    def start(self):
-        """
-        Inicia o servidor e aceita conexões de clientes.
+    @staticmethod
+    def ask_connection_limits():
         """
+        Pergunta no terminal quantas conexões o servidor vai aceitar.
 
-        Colors.header("System Monitor")
-        valid_connection_limits = False
-        while valid_connection_limits == False:
+        :rtype: int
+        """
+        while True:
             try:
                 connection_limits = int(input("How many connections this server will accept? "))
-                self.manager.set_connection_limits(connection_limits)
-                valid_connection_limits = True
+                if connection_limits <= 0:
+                    raise ValueError("Connection Limits must be greather than 0")
+                return connection_limits
             except ValueError as e:
                 Colors.error(e)
-            
-        self.manager.start(target_function=self.handle_client)
-        
-        self.handle_server()
+
+    def start_manager(self):
+        """
+        Começa a aceitar conexões com o motor escolhido.
+        """
+        if self.engine == "asyncio":
+            self.sampler.attach_loop(self.manager.loop)
+            self.manager.start(target_function=self.handle_client_async)
+        else:
+            self.manager.start(target_function=self.handle_client)
+        self.start_session_expiry()
+
+    @staticmethod
+    def run_worker(index, connection, semaphore, collectors, host, port, engine, connection_limits, queue_limits, liveness, resume_grace, log_directory=None):
+        """
+        Função de entrada de um worker do modo multiprocesso. O worker escuta na porta compartilhada
+        (SO_REUSEPORT), usa o semáforo global de conexões e recebe as amostras do sampler do processo principal.
+        """
+        sampler = RemoteSampler(connection, collectors)
+        server = Server(host, port, engine=engine, sampler=sampler)
+        server.resume_grace = resume_grace
+        server.manager.set_queue_limits(**queue_limits)
+        server.manager.set_liveness(**liveness)
+        server.manager.set_connection_limits(connection_limits, semaphore)
+        server.manager.enable_reuse_port()
+        if log_directory:
+            # O log é gravado pelo processo principal; o worker só lê os segmentos para /replay
+            server.log = MetricLogReader(log_directory)
+        sampler.start()
+
+        server.start_manager()
+        server.start_history()
+        Colors.info(f"Worker {index} ready (pid {os.getpid()})")
+
+        # O worker roda até o processo principal pedir para parar (ou o pipe ser fechado)
+        sampler.stopped.wait()
+        server.manager.running = False
+        server.manager.shutdown()
+        server.manager.close()
+
+    @staticmethod
+    def start_workers(host, port, engine, workers, queue_limits, liveness, resume_grace, shared_memory=None, metric_log=None, backend="auto"):
+        """
+        Modo multiprocesso: o processo principal roda o sampler compartilhado e o console,
+        e cada worker atende as suas conexões na mesma porta.
+        """
+        Colors.header("System Monitor")
+        connection_limits = Server.ask_connection_limits()
+
+        sampler = Sampler(backend=create_backend(backend))
+        log_directory = metric_log["directory"] if metric_log else None
+        pool = WorkerPool(workers, sampler, Server.run_worker, args=(host, port, engine, connection_limits, queue_limits, liveness, resume_grace, log_directory))
+        pool.start(connection_limits)
+        # O segmento e o log são escritos pelo processo principal, que é quem coleta as amostras
+        shared = Server.start_shared_memory(sampler, **shared_memory) if shared_memory else None
+        log_writer = Server.start_metric_log(sampler, **metric_log) if metric_log else None
+        print(f"Server started with {workers} workers ({engine} engine, {sampler.backend.name} collector backend)")
+        print(f"Listening on {host}:{port}...")
+
+        try:
+            while True:
+                command = input("Enter command: ").strip().lower()
+                if command == "exit":
+                    break
+                elif command == "workers":
+                    pool.list_workers()
+                elif command == "jitter":
+                    Server.show_jitter(sampler.scheduler.jitter_stats())
+                else:
+                    Colors.error("Unknown command")
+        finally:
+            pool.stop()
+            if shared is not None:
+                shared.close()
+            if log_writer is not None:
+                log_writer.close()
+            Colors.ok("Server ending...")
+
+    @staticmethod
+    def start_shared_memory(sampler, path, capacity, interval):
+        """
+        Cria o segmento de memória compartilhada e o inscreve no sampler, para que processos locais
+        leiam as últimas amostras com SharedMetricsReader, sem conexão com o servidor.
+
+        :rtype: SharedMetricsWriter
+        """
+        shared = SharedMetricsWriter(path, capacity)
+        shared.subscribe(sampler, interval)
+        Colors.info(f"Shared memory: {path} ({shared.size / 1024:.0f} KB, {capacity} samples per metric every {interval}s)")
+        return shared
+
+    @staticmethod
+    def start_metric_log(sampler, directory, interval, segment_seconds, retention):
+        """
+        Inicia o log persistente: o sampler entrega as amostras e a thread do log grava em lotes.
+
+        :rtype: MetricLogWriter
+        """
+        log_writer = MetricLogWriter(directory, segment_seconds, retention)
+        log_writer.start()
+        log_writer.subscribe(sampler, interval)
+        Colors.info(f"Metric log: {directory} (every {interval}s, {segment_seconds}s segments, {retention}s retention)")
+        return log_writer
+
+    def start_history(self):
+        """
+        Inscreve o histórico no sampler compartilhado, para que todas as métricas sejam gravadas
+        continuamente mesmo sem nenhum monitor ativo.
+        """
+        for metric in self.history.FIELDS:
+            self.sampler.subscribe(metric, self.history.interval, ("history", metric), partial(self.history.record, metric))
+        Colors.info(f"Metric history: {self.history.retention()}s per metric, {self.history.memory_budget() / 1024:.0f} KB")
+
+    def print_jitter(self):
+        """
+        Mostra as estatísticas de atraso de disparo (jitter) do agendador de monitores.
+        """
+        Server.show_jitter(self.sampler.scheduler.jitter_stats())
+
+    @staticmethod
+    def show_jitter(stats):
+        """
+        Mostra estatísticas de jitter no console. Usada pelo console do servidor e pelo do processo principal com workers.
+
+        :param stats: Resultado de Scheduler.jitter_stats().
+        :type stats: dict
+        """
+        Colors.info(f"Scheduler ticks: {stats['ticks']}")
+        Colors.info(
+            f"Jitter (ms): last={stats['last']:.3f}, mean={stats['mean']:.3f}, "
+            f"p99={stats['p99']:.3f}, max={stats['max']:.3f}"
+        )
 
     def handle_server(self):
         """
@@ -357,6 +1308,8 @@ class Server:
         Comandos:
         - exit: encerra o servidor
         - threads: lista as threads ativas
+        - jitter: mostra o atraso de disparo do agendador de monitores
+        - stats: mostra as estatísticas de instrumentação do servidor
         """
         while self.manager.running:
             command = input("Enter command: ")
@@ -367,13 +1320,90 @@ class Server:
                 Colors.ok("Server ending...")
             elif command.strip().lower() == "threads":
                 self.manager.list_active_threads()
+            elif command.strip().lower() == "jitter":
+                self.print_jitter()
+            elif command.strip().lower() == "stats":
+                message, _ = self.stats_report()
+                Colors.info(message)
             else:
                 Colors.error("Unknown command")
 
 if __name__ == '__main__': 
-    server = Server()
-    try:
-        server.start()
-    except KeyboardInterrupt:
-        Colors.ok('\nInterrupted')
-        server.manager.running = False
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="System Monitor server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads", help="Connection engine")
+    parser.add_argument("--queue-policy", choices=["block", "drop_oldest", "coalesce"], default="drop_oldest", help="Overflow policy of the per-client outbound queues")
+    parser.add_argument("--queue-messages", type=int, default=1024, help="Maximum messages waiting in each client's outbound queue")
+    parser.add_argument("--queue-bytes", type=int, default=4 * 1024 * 1024, help="Maximum bytes waiting in each client's outbound queue")
+    parser.add_argument("--heartbeat", type=float, default=3, help="Seconds of client silence before the server sends a heartbeat (0 disables)")
+    parser.add_argument("--idle-timeout", type=float, default=10, help="Seconds without any frame from a client before its connection is closed and its monitors stopped (0 disables)")
+    parser.add_argument("--keepalive", nargs="?", const="5,2,3", help="TCP keepalive as IDLE,INTERVAL,COUNT seconds (default when given without a value: %(const)s)")
+    parser.add_argument("--resume-grace", type=float, default=30, help="Seconds a dropped client's session (monitors and buffered samples) is kept for /resume (0 disables)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes sharing the port (SO_REUSEPORT) and one sampler")
+    parser.add_argument("--collector-backend", choices=BACKENDS, default="auto", help="How metrics are read: 'proc' reads /proc directly (Linux), 'psutil' works everywhere")
+    parser.add_argument("--shm", nargs="?", const=SharedMetricsWriter.DEFAULT_PATH, help="Publish the latest samples to a shared memory segment for local readers (default path: %(const)s)")
+    parser.add_argument("--shm-capacity", type=int, default=60, help="Samples kept per metric in the shared memory segment")
+    parser.add_argument("--shm-interval", default="1", help="Sampling interval of the shared memory segment (seconds or e.g. 100ms)")
+    parser.add_argument("--log-dir", help="Persist every sample to append-only segment files in this directory (enables /replay)")
+    parser.add_argument("--log-interval", default="1", help="Sampling interval of the persistent log (seconds or e.g. 100ms)")
+    parser.add_argument("--log-segment", type=int, default=3600, help="Seconds covered by each log segment file")
+    parser.add_argument("--log-retention", type=int, default=7 * 86400, help="Seconds of log kept on disk")
+    cli_args = parser.parse_args()
+
+    if cli_args.heartbeat < 0 or cli_args.idle_timeout < 0 or cli_args.resume_grace < 0:
+        parser.error("--heartbeat, --idle-timeout and --resume-grace must not be negative")
+    if cli_args.heartbeat and cli_args.idle_timeout and cli_args.idle_timeout <= cli_args.heartbeat:
+        parser.error("--idle-timeout must be greater than --heartbeat")
+    keepalive = None
+    if cli_args.keepalive:
+        try:
+            keepalive = tuple(int(value) for value in cli_args.keepalive.split(","))
+        except ValueError:
+            keepalive = ()
+        if len(keepalive) != 3 or min(keepalive) <= 0:
+            parser.error("--keepalive must look like IDLE,INTERVAL,COUNT with positive seconds (e.g. 5,2,3)")
+    liveness = {"heartbeat": cli_args.heartbeat, "idle_timeout": cli_args.idle_timeout, "keepalive": keepalive}
+
+    shared_options = None
+    if cli_args.shm:
+        if cli_args.shm_capacity <= 0:
+            parser.error("--shm-capacity must be greater than 0")
+        try:
+            shared_options = {"path": cli_args.shm, "capacity": cli_args.shm_capacity, "interval": Server._parse_interval(cli_args.shm_interval)}
+        except ValueError as e:
+            parser.error(str(e))
+
+    log_options = None
+    if cli_args.log_dir:
+        if cli_args.log_segment <= 0 or cli_args.log_retention <= 0:
+            parser.error("--log-segment and --log-retention must be greater than 0")
+        try:
+            log_options = {
+                "directory": cli_args.log_dir,
+                "interval": Server._parse_interval(cli_args.log_interval),
+                "segment_seconds": cli_args.log_segment,
+                "retention": cli_args.log_retention,
+            }
+        except ValueError as e:
+            parser.error(str(e))
+
+    if cli_args.workers > 1:
+        queue_limits = {"max_messages": cli_args.queue_messages, "max_bytes": cli_args.queue_bytes, "policy": cli_args.queue_policy}
+        try:
+            Server.start_workers(cli_args.host, cli_args.port, cli_args.engine, cli_args.workers, queue_limits, liveness, cli_args.resume_grace, shared_options, log_options, cli_args.collector_backend)
+        except KeyboardInterrupt:
+            Colors.ok('\nInterrupted')
+    else:
+        try:
+            server = Server(cli_args.host, cli_args.port, engine=cli_args.engine, backend=cli_args.collector_backend)
+        except ValueError as e:
+            parser.error(str(e))
+        server.manager.set_queue_limits(cli_args.queue_messages, cli_args.queue_bytes, cli_args.queue_policy)
+        server.manager.set_liveness(**liveness)
+        server.resume_grace = cli_args.resume_grace
+        try:
+            server.start(shared_options, log_options)
+        except KeyboardInterrupt:
+            Colors.ok('\nInterrupted')
+            server.manager.running = False
\ No newline at end of file